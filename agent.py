@@ -1,91 +1,161 @@
 # agent.py
 
-from typing import Annotated, Sequence, TypedDict, Literal
+from typing import Annotated, Any, Dict, Optional, Sequence, TypedDict, Literal
 import operator
 import json
+import asyncio
+import threading
+import time
 
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from langchain_ollama import ChatOllama
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 
+from alert_model import alerts_from_json, dumps
+from model_router import ModelRouter
+from ollama_warmup import DEFAULT_KEEP_ALIVE
+from fake_llm import fake_llm_from_env, use_fake_llm
+from tracing import Tracer, traced_call_tool
+from resilience import UpstreamUnavailable, get_upstream
+
+tracer = Tracer("agent")
+
 # ==========================================
 # 1. Agent State Definition
 # ==========================================
 class AgentState(TypedDict):
     # 'operator.add' ensures new messages are appended to the list rather than replacing it
     messages: Annotated[Sequence[BaseMessage], operator.add]
+    # One entry per agent step: which model answered it and why (see model_router.py)
+    routing: Annotated[list, operator.add]
 
 # ==========================================
 # 2. Tool Binding (MCP Wrappers)
 # ==========================================
-def create_agent_tools(wazuh_session, mitre_session):
+def _bound_session(config: RunnableConfig, name: str):
+    """Returns the MCP session injected for the current run (see `run_config`)."""
+    session = (config or {}).get("configurable", {}).get(name)
+    if session is None:
+        raise RuntimeError(f"No '{name}' bound to this run. Pass it through run_config().")
+    return session
+
+async def _call_mcp(config: RunnableConfig, server: str, tool_name: str, arguments: Dict[str, Any]):
+    """
+    MCP tool call with retries of transient failures and a circuit breaker per server
+    (see resilience.py). UpstreamUnavailable is NOT turned into a tool message: the run
+    fails fast instead of spending an LLM turn reasoning about an outage.
     """
-    Wraps the active MCP client sessions into LangChain tools.
+    session = _bound_session(config, f"{server}_session")
+    upstream = get_upstream(f"{server}-mcp")
+    return await upstream.acall(traced_call_tool, session, tool_name, arguments, timeout=upstream.timeout[1])
+
+def _tool_error_message(e: Exception) -> str:
+    """
+    ToolNode error handler, passed explicitly because the default differs between langgraph
+    versions: a tool error becomes a message the model can react to, an outage ends the run.
+    """
+    if isinstance(e, UpstreamUnavailable):
+        raise e
+    return f"Error: {e!r}\n Please fix your mistakes."
+
+def create_agent_tools():
+    """
+    Wraps the MCP client sessions into LangChain tools.
+    The sessions are NOT captured in closures: every call resolves them from the run
+    config, so the same tools (and the compiled graph holding them) serve every run.
     """
     
     @tool
-    async def fetch_wazuh_alerts() -> str:
+    async def fetch_wazuh_alerts(config: RunnableConfig) -> str:
         """
         Fetches the latest high-severity security alerts from the Wazuh SIEM. 
         Call this FIRST to see what needs triaging and to get the MITRE technique ID from the alert.
         """
         try:
+            # An alert handed to this run (e.g. by triage_scheduler.py) is triaged as-is
+            alert = (config or {}).get("configurable", {}).get("alert")
+            if alert is not None:
+                return dumps([alert])
             # We use get_latest_alerts so that the injected mock scenarios (alert.json) are used, 
             # rather than live alerts which might be stuck on old brute force attacks from Wazuh.
-            result = await wazuh_session.call_tool("get_latest_alerts", arguments={})
+            result = await _call_mcp(config, "wazuh", "get_latest_alerts", {})
             # result = await wazuh_session.call_tool("get_real_wazuh_alerts", arguments={"limit": 5})
 
             return result.content[0].text
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             return f"Error fetching alerts: {str(e)}"
 
     @tool
-    async def get_tier1_playbook(technique_id: str) -> str:
+    async def get_tier1_playbook(technique_id: str, config: RunnableConfig) -> str:
         """
         Tier 1 (Internal Playbooks): Fetch internal SOC rules and immediate hardcoded response procedures.
         Use this first when you find an alert with a MITRE technique ID from fetch_wazuh_alerts.
         """
         try:
-            result = await mitre_session.call_tool("get_playbook", arguments={"technique_id": technique_id})
+            result = await _call_mcp(config, "mitre", "get_playbook", {"technique_id": technique_id})
             if result.isError:
                 return f"O servidor MCP devolveu um erro: {result.content}"
             return "\n".join(c.text for c in result.content if c.type == "text")
             #return result.content[0].text
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             return f"Error fetching Tier 1 playbook: {str(e)}"
 
     @tool
-    async def get_tier2_mitre_data(technique_id: str) -> str:
+    async def get_tier2_mitre_data(technique_id: str, config: RunnableConfig) -> str:
         """
         Tier 2 (MITRE Data): Fetch official context, tactics, and data sources for a given MITRE technique ID.
         Use this if Tier 1 lacks information.
         """
         try:
-            result = await mitre_session.call_tool("get_tier2_mitre_data", arguments={"technique_id": technique_id})
+            result = await _call_mcp(config, "mitre", "get_tier2_mitre_data", {"technique_id": technique_id})
             return result.content[0].text
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             return f"Error fetching Tier 2 MITRE data: {str(e)}"
 
     return [fetch_wazuh_alerts, get_tier1_playbook, get_tier2_mitre_data]
 
+def _alert_technique_ids(content) -> tuple:
+    """MITRE IDs of the alert returned by fetch_wazuh_alerts (empty if it can't be parsed)."""
+    try:
+        return alerts_from_json(content)[0].mitre_ids
+    except (ValueError, IndexError, TypeError):
+        return ()
+
 # ==========================================
 # 3 & 4. Graph Nodes and Edges
 # ==========================================
-def build_react_agent(wazuh_session, mitre_session, selected_model="llama3.2"):
-    tools = create_agent_tools(wazuh_session, mitre_session)
+def build_react_agent(selected_model="llama3.2"):
+    """
+    Compiles the triage graph for one model. Prefer `get_react_agent`, which caches the result.
+    MCP sessions are supplied per run through the config returned by `run_config`.
+    `selected_model` is the "large" model; the router may answer cheap steps with a smaller one.
+    """
+    tools = create_agent_tools()
     
-    # Initialize the LLM
-    llm = ChatOllama(model=selected_model, temperature=0.1)
+    # Per-step model selection (LLM clients are shared per model, so their HTTP pools are reused)
+    router = ModelRouter(default_model=selected_model)
     
     # Define the Agent Node with Dynamic Tool Binding to enforce logic
-    async def agent_node(state: AgentState):
+    async def agent_node(state: AgentState, config: RunnableConfig):
         messages = state["messages"]
+        configurable = config.get("configurable", {})
+        decision = router.route(messages, prefer=configurable.get("model_preference"),
+                                force=configurable.get("model_force"))
+        llm = get_llm(decision["model"])
         
         # 1. Inspect conversation history to determine what tools have been executed
         has_fetched_alerts = False
-        has_fetched_tier1 = False
+        alert_ids = ()
+        tier1_ids = []
         
         for m in messages:
             if getattr(m, "tool_calls", None):
@@ -93,7 +163,15 @@ def build_react_agent(wazuh_session, mitre_session, selected_model="llama3.2"):
                     if tc["name"] == "fetch_wazuh_alerts":
                         has_fetched_alerts = True
                     elif tc["name"] == "get_tier1_playbook":
-                        has_fetched_tier1 = True
+                        tier1_ids.append(str(tc["args"].get("technique_id", "")).strip().upper())
+            elif getattr(m, "type", None) == "tool" and m.name == "fetch_wazuh_alerts":
+                alert_ids = _alert_technique_ids(m.content)
+
+        # An alert can carry several techniques: Tier 1 stays available until every one of them
+        # was looked up (normally all in one turn). More calls than techniques means the model
+        # keeps repeating or mistyping an ID, so it moves on instead of looping.
+        looked_up_ids = set(tier1_ids)
+        has_fetched_tier1 = bool(looked_up_ids) and (set(alert_ids) <= looked_up_ids or len(tier1_ids) > len(alert_ids))
 
         # 2. Dynamically bind ONLY the tools appropriate for the current step.
         # This absolutely forces the LLM to follow the Tier 1 -> Tier 2 sequence.
@@ -103,7 +181,7 @@ def build_react_agent(wazuh_session, mitre_session, selected_model="llama3.2"):
             current_tools = [tools[0]] # index 0 is fetch_wazuh_alerts
             # tool_choice = "fetch_wazuh_alerts"  # Forces the exact tool
         elif not has_fetched_tier1:
-            # Step 2: Force it to check the Tier 1 playbook next
+            # Step 2: Force it to check the Tier 1 playbook(s) next
             current_tools = [tools[1]] # index 1 is get_tier1_playbook
             # tool_choice = "get_tier1_playbook" # Forces the exact tool
         else:
@@ -117,8 +195,19 @@ def build_react_agent(wazuh_session, mitre_session, selected_model="llama3.2"):
         # NOTE: Not using strict tool_choice="tool_name" because Ollama's bind_tools implementation
         # sometimes rejects strict forcing strings vs dicts, but drastically limiting `current_tools` 
         # usually accomplishes the same. If it still skips, we will use graph logic.
-        response = await llm_with_tools.ainvoke(messages)
-        return {"messages": [response]}
+        started = time.perf_counter()
+        # Retries / rate limit / circuit breaker shared by every run in this process (see resilience.py)
+        ollama_upstream = get_upstream("ollama")
+        with tracer.span("llm.call", model=decision["model"], step=decision["step"]) as span:
+            response = await ollama_upstream.acall(llm_with_tools.ainvoke, messages, timeout=ollama_upstream.timeout[1])
+            if not config.get("configurable", {}).get("parallel_tool_calls", True) and len(response.tool_calls) > 1:
+                # Baseline for comparison (evaluate_agent.py --sequential-lookups): one lookup per turn
+                response = response.model_copy(update={"tool_calls": response.tool_calls[:1]})
+            if span is not None:
+                meta = getattr(response, "response_metadata", None) or {}
+                span.set(prompt_tokens=meta.get("prompt_eval_count"), completion_tokens=meta.get("eval_count"),
+                         tool_calls=[tc["name"] for tc in getattr(response, "tool_calls", None) or []])
+        return {"messages": [response], "routing": [router.timed(decision, started)]}
     
     # Define the routing logic
     def should_continue(state: AgentState) -> Literal["tools", "correction", "__end__"]:
@@ -138,12 +227,21 @@ def build_react_agent(wazuh_session, mitre_session, selected_model="llama3.2"):
         warning = "System Error: You attempted to call a tool using plain text JSON. You MUST use the native tool calling API. Do not output conversational text or raw JSON blocks in your response. Invoke the tool correctly."
         return {"messages": [HumanMessage(content=warning)]}
 
+    def tool_node(node: ToolNode):
+        # Plain function around the prebuilt ToolNode so it can carry a tracing span.
+        # All tool calls of one agent turn (e.g. a Tier 1 lookup per technique) run concurrently
+        # over the shared MCP sessions, and the results come back in the order of the calls.
+        async def tools(state: AgentState, config: RunnableConfig):
+            return await node.ainvoke(state, config)
+        return tools
+
     # Build the Graph
     workflow = StateGraph(AgentState)
     
-    workflow.add_node("agent", agent_node)
-    workflow.add_node("tools", ToolNode(tools))
-    workflow.add_node("correction", correction_node)
+    # Every node execution is recorded as a span of the current triage trace (see tracing.py)
+    workflow.add_node("agent", tracer.traced_node("agent", agent_node))
+    workflow.add_node("tools", tracer.traced_node("tools", tool_node(ToolNode(tools, handle_tool_errors=_tool_error_message))))
+    workflow.add_node("correction", tracer.traced_node("correction", correction_node))
     
     workflow.set_entry_point("agent")
     
@@ -160,4 +258,74 @@ def build_react_agent(wazuh_session, mitre_session, selected_model="llama3.2"):
     workflow.add_edge("tools", "agent")
     workflow.add_edge("correction", "agent")
     
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile()
+
+# ==========================================
+# 5. Cached Agent Factory
+# ==========================================
+# Compiled graphs and LLM clients are kept alive for the lifetime of the process, keyed by
+# model name. Streamlit reruns and evaluation scenarios only pay for the graph execution itself.
+_LLM_CACHE: Dict[str, ChatOllama] = {}
+_AGENT_CACHE: Dict[str, Any] = {}
+_CACHE_LOCK = threading.Lock()
+
+def get_llm(selected_model: str) -> ChatOllama:
+    """
+    Returns the shared ChatOllama client for a model (one pooled HTTP client per model).
+    Every request carries the same keep_alive, so Ollama keeps the model (and its cached
+    system-prompt prefix) resident between runs.
+    """
+    with _CACHE_LOCK:
+        llm = _LLM_CACHE.get(selected_model)
+        if llm is None:
+            if use_fake_llm(selected_model):
+                # Deterministic offline stand-in (LLM_BACKEND=fake or a "fake:" model name)
+                llm = fake_llm_from_env(selected_model)
+            else:
+                llm = ChatOllama(model=selected_model, temperature=0.1, keep_alive=DEFAULT_KEEP_ALIVE)
+            _LLM_CACHE[selected_model] = llm
+        return llm
+
+def get_react_agent(selected_model: str = "llama3.2"):
+    """Returns the compiled triage graph for a model, compiling it on first use only."""
+    agent = _AGENT_CACHE.get(selected_model)
+    if agent is None:
+        agent = build_react_agent(selected_model)
+        with _CACHE_LOCK:
+            agent = _AGENT_CACHE.setdefault(selected_model, agent)
+    return agent
+
+def run_config(wazuh_session, mitre_session, recursion_limit: int = 15, **configurable) -> Dict[str, Any]:
+    """
+    Builds the per-run config that binds the MCP sessions to a cached graph.
+    Extra keyword arguments are passed through as additional `configurable` entries
+    (e.g. model_preference="small" | "large" as a soft preference for the routing rules,
+    model_force="small" | "large" to override them for the whole run,
+    alert={...} to triage that alert instead of fetching the latest one from Wazuh, or
+    parallel_tool_calls=False to execute only the first tool call of each agent turn).
+    """
+    return {
+        "recursion_limit": recursion_limit,
+        "configurable": {"wazuh_session": wazuh_session, "mitre_session": mitre_session, **configurable},
+    }
+
+# ==========================================
+# 6. Shared Event Loop
+# ==========================================
+# The pooled async HTTP clients are bound to the event loop that first used them, so callers
+# without a long-lived loop of their own (e.g. Streamlit reruns, which run on a fresh thread
+# each time) submit their coroutines to this background loop instead of creating new ones.
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+def get_agent_loop() -> asyncio.AbstractEventLoop:
+    """Returns the process-wide background event loop, starting it on first use."""
+    global _LOOP
+    with _CACHE_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="agent-loop", daemon=True).start()
+        return _LOOP
+
+def run_coroutine(coro):
+    """Runs a coroutine on the shared background loop and blocks until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, get_agent_loop()).result()
@@ -0,0 +1,184 @@
+# alert_model.py
+"""
+Typed view of a Wazuh alert and the JSON codec used on the alert hot path.
+
+Alerts cross the MCP boundary as JSON text (wazuh_server.py -> app.py / agent / daemon)
+and were decoded with json.loads and then dug into (`alert["rule"]["mitre"]["id"][0]`)
+with KeyError handling repeated at every call site. `Alert` does that digging once:
+
+    alert = Alert.from_dict(data)       # or alerts_from_json(tool_text)
+    alert.primary_technique             # "T1110" or None (invalid IDs are dropped)
+    alert.level, alert.src_ip, alert.agent_name
+    alert.raw                           # the original dict (wire format is unchanged)
+
+`loads` / `dumps` use orjson when it is installed (optional dependency) and fall back to
+the standard library otherwise; both produce compact JSON. bench_alert_codec.py measures
+the per-alert cost of both paths.
+"""
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib codec is used instead
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+TECHNIQUE_ID_RE = re.compile(r"^T\d{4}(\.\d{3})?$")
+
+# ==========================================
+# Codec
+# ==========================================
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj: Any) -> str:
+    """Compact JSON text (MCP tool results are text)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Compact JSON bytes (files, sockets)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+# ==========================================
+# Alert
+# ==========================================
+def _dict(value: Any) -> Dict[str, Any]:
+    return value if isinstance(value, dict) else {}
+
+def _as_list(value: Any) -> list:
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+# Raw ID -> normalised ID ("" if invalid). The ATT&CK vocabulary is small, so after warm-up
+# every lookup is one dict hit instead of strip/upper/regex.
+_TECHNIQUE_IDS: Dict[str, str] = {}
+
+def _technique_id(item: Any) -> str:
+    key = item if isinstance(item, str) else str(item)
+    tid = _TECHNIQUE_IDS.get(key)
+    if tid is None:
+        tid = key.strip().upper()
+        if not TECHNIQUE_ID_RE.match(tid):
+            tid = ""
+        if len(_TECHNIQUE_IDS) < 100_000:
+            _TECHNIQUE_IDS[key] = tid
+    return tid
+
+def normalize_technique_ids(value: Any) -> Tuple[str, ...]:
+    """Upper-cased, de-duplicated IDs in order; anything that is not Txxxx(.yyy) is dropped."""
+    if not value:
+        return ()
+    if isinstance(value, list) and len(value) == 1:
+        tid = _technique_id(value[0])
+        return (tid,) if tid else ()
+    ids = []
+    for item in _as_list(value):
+        tid = _technique_id(item)
+        if tid and tid not in ids:
+            ids.append(tid)
+    return tuple(ids)
+
+def _src_ip(raw: Dict[str, Any], data: Any) -> Optional[str]:
+    # Mock scenarios carry a top-level src_ip; Wazuh decoders put it under data
+    value = raw.get("src_ip")
+    if value not in (None, "", "-"):
+        return str(value)
+    if not isinstance(data, dict):
+        return None
+    for value in (data.get("srcip"), data.get("src_ip"), _dict(_dict(data.get("win")).get("eventdata")).get("ipAddress")):
+        if value not in (None, "", "-"):
+            return str(value)
+    return None
+
+class Alert:
+    """Normalised, read-only fields of one alert; `raw` keeps the original dict."""
+    __slots__ = ("raw", "timestamp", "level", "description", "mitre_ids", "mitre_techniques",
+                 "agent_name", "agent_ip", "src_ip", "full_log")
+
+    def __init__(self, raw: Dict[str, Any], timestamp: Optional[str], level: int, description: str,
+                 mitre_ids: Tuple[str, ...], mitre_techniques: Tuple[str, ...], agent_name: Optional[str],
+                 agent_ip: Optional[str], src_ip: Optional[str], full_log: str):
+        self.raw = raw
+        self.timestamp = timestamp
+        self.level = level
+        self.description = description
+        self.mitre_ids = mitre_ids
+        self.mitre_techniques = mitre_techniques
+        self.agent_name = agent_name
+        self.agent_ip = agent_ip
+        self.src_ip = src_ip
+        self.full_log = full_log
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> "Alert":
+        # Hot path (every polled alert): plain lookups, no exceptions for the common shape
+        if not isinstance(raw, dict):
+            raw = {}
+        rule = raw.get("rule")
+        if not isinstance(rule, dict):
+            rule = {}
+        mitre = rule.get("mitre")
+        if not isinstance(mitre, dict):
+            mitre = {}
+        agent = raw.get("agent")
+        if not isinstance(agent, dict):
+            agent = {}
+        level = rule.get("level")
+        if type(level) is not int:
+            try:
+                level = int(level or 0)
+            except (TypeError, ValueError):
+                level = 0
+        techniques = mitre.get("technique")
+        description = rule.get("description")
+        full_log = raw.get("full_log")
+
+        alert = cls.__new__(cls)
+        alert.raw = raw
+        alert.timestamp = raw.get("timestamp")
+        alert.level = level
+        alert.description = description if type(description) is str else str(description or "")
+        alert.mitre_ids = normalize_technique_ids(mitre.get("id"))
+        alert.mitre_techniques = tuple(techniques) if type(techniques) is list else tuple(str(t) for t in _as_list(techniques))
+        alert.agent_name = agent.get("name")
+        alert.agent_ip = agent.get("ip")
+        alert.src_ip = _src_ip(raw, raw.get("data"))
+        alert.full_log = full_log if type(full_log) is str else str(full_log or "")
+        return alert
+
+    @classmethod
+    def from_json(cls, text: Union[str, bytes]) -> "Alert":
+        return cls.from_dict(loads(text))
+
+    @property
+    def primary_technique(self) -> Optional[str]:
+        return self.mitre_ids[0] if self.mitre_ids else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.raw
+
+    def to_json(self) -> str:
+        return dumps(self.raw)
+
+    def __repr__(self) -> str:
+        return f"Alert(level={self.level}, mitre_ids={self.mitre_ids}, agent={self.agent_name!r}, description={self.description[:40]!r})"
+
+def as_alert(alert: Union["Alert", Dict[str, Any]]) -> Alert:
+    return alert if isinstance(alert, Alert) else Alert.from_dict(alert)
+
+def alerts_from_json(text: Union[str, bytes]) -> List[Alert]:
+    """Decodes a tool result holding one alert or a list of alerts."""
+    data = loads(text)
+    if isinstance(data, dict):
+        data = [data]
+    return [Alert.from_dict(item) for item in data or []]
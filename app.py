@@ -1,31 +1,73 @@
+import time
+_script_started = time.perf_counter()
+
 import streamlit as st
 import asyncio
 import json
 import sys
 import os
 from contextlib import AsyncExitStack
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
 import shutil
 
-from langchain_core.messages import SystemMessage, HumanMessage
-import agent
-from datetime import datetime
-import importlib
-importlib.reload(agent)
-from agent import build_react_agent
-import ollama
+# Only light modules are imported up front. LangGraph/LangChain (agent, prompts), MCP
+# (mcp_transport) and the Ollama client are imported by the mode that uses them, so the
+# sidebar is drawn before they load (see startup_profile.py).
+# NOTE: agent is deliberately NOT reloaded on every rerun: it caches compiled graphs and
+# pooled Ollama clients per model, which must survive across Streamlit reruns.
+from scenario_catalog import ScenarioCatalog
+from context_cache import ContextCache
+from triage_store import TriageStore
+from alert_model import Alert, loads, dumps
+from model_router import load_routing_config
+from startup_profile import StartupProfile
 
-# Configure Ollama client to use Docker service if OLLAMA_HOST is set
-ollama_client = ollama.Client(host=os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# The installed model list changes rarely; re-query Ollama at most this often
+MODEL_LIST_TTL_SECONDS = int(os.getenv("OLLAMA_MODEL_LIST_TTL", "300"))
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(layout="wide", page_title="Wazuh AI Assistant", page_icon="🛡️")
 
+profile = StartupProfile(_script_started, first_run="startup_profile" not in st.session_state)
+
+@st.cache_resource
+def get_ollama_client():
+    # Configure Ollama client to use Docker service if OLLAMA_HOST is set
+    return profile.lazy_import("ollama").Client(host=OLLAMA_HOST)
+
+@st.cache_resource
+def get_warmup_manager():
+    return profile.lazy_import("ollama_warmup").OllamaWarmupManager(host=OLLAMA_HOST)
+
+@st.cache_resource
+def get_tracer():
+    return profile.lazy_import("tracing").Tracer("streamlit-app")
+
+@st.cache_resource
+def get_scenario_catalog():
+    # Built once per process; each rerun only re-stats the folder (see scenario_catalog.py)
+    return ScenarioCatalog("scenarios")
+
+@st.cache_resource
+def get_context_cache():
+    # Shared by every browser session in this process (see context_cache.py)
+    return ContextCache()
+
+@st.cache_resource
+def get_triage_store():
+    # Read-only view of the store written by triage_daemon.py (raises until the daemon has run)
+    return TriageStore(read_only=True)
+
+@st.cache_data(ttl=MODEL_LIST_TTL_SECONDS, show_spinner=False)
+def list_ollama_models():
+    # Cached: otherwise every rerun pays an HTTP round-trip to Ollama before the sidebar is drawn.
+    # Failures raise, and exceptions are not cached, so a stopped Ollama is retried next rerun.
+    models_info = get_ollama_client().list()
+    return [m['model'] for m in models_info['models']]
+
 def get_installed_models():
     try:
-        models_info = ollama_client.list()
-        return [m['model'] for m in models_info['models']]
+        return list_ollama_models()
     except Exception as e:
         return ["llama3.2", "llama3.1", "mistral", "gemma2"]
 
@@ -42,29 +84,38 @@ with st.sidebar:
         "alert_scheduled_task.json": "⏱️ Scheduled Task (T1053.005)"
     }
     
+    with profile.phase("scenario catalog"):
+        catalog = get_scenario_catalog()
+        catalog.refresh()
+    
+    with st.expander("🔎 Filter scenarios"):
+        technique_filter = st.selectbox("Technique:", options=["All"] + catalog.techniques())
+        level_range = st.slider("Severity (rule level):", 0, 15, (0, 15))
+        search = st.text_input("Search:", placeholder="description, file or MITRE ID")
+    
     scenarios = {}
-    if os.path.exists("scenarios"):
-        for file in sorted(os.listdir("scenarios")):
-            if file.startswith("alert_") and file.endswith(".json"):
-                if file in known_scenarios:
-                    scenarios[file] = known_scenarios[file]
-                else:
-                    # Automatically generate a display name for new scenarios
-                    try:
-                        with open(os.path.join("scenarios", file), "r", encoding="utf-8") as f:
-                            data = json.load(f)
-                            desc = data.get("rule", {}).get("description", file.replace(".json", ""))
-                            # Truncate description so it fits cleanly in the sidebar
-                            if len(desc) > 35:
-                                desc = desc[:32] + "..."
-                            mitre_info = data.get("rule", {}).get("mitre", {}).get("id", ["Unknown"])
-                            mitre_id = mitre_info[0] if mitre_info else "Unknown"
-                            scenarios[file] = f"📄 {desc} ({mitre_id})"
-                    except Exception:
-                        scenarios[file] = f"📄 {file}"
+    for entry in catalog.filter(
+        technique=None if technique_filter == "All" else technique_filter,
+        min_level=level_range[0],
+        max_level=level_range[1],
+        query=search,
+    ):
+        file = entry["file"]
+        if file in known_scenarios:
+            scenarios[file] = known_scenarios[file]
+        elif entry.get("error"):
+            scenarios[file] = f"📄 {file}"
+        else:
+            # Automatically generate a display name for new scenarios
+            desc = entry["description"] or file.replace(".json", "")
+            # Truncate description so it fits cleanly in the sidebar
+            if len(desc) > 35:
+                desc = desc[:32] + "..."
+            mitre_id = entry["mitre_ids"][0] if entry["mitre_ids"] else "Unknown"
+            scenarios[file] = f"📄 {desc} ({mitre_id})"
                         
     if not scenarios:
-        scenarios["none.json"] = "⚠️ No scenarios found in folder"
+        scenarios["none.json"] = "⚠️ No scenarios found in folder" if not len(catalog) else "⚠️ No scenarios match the filters"
     
     selected_scenario_file = st.selectbox(
         "Select Attack Vector:",
@@ -97,21 +148,27 @@ with st.sidebar:
     st.header("⚙️ Architecture Mode")
     app_mode = st.radio(
         "Select Investigation Mode:",
-        options=["Agentic RAG (Autonomous)", "Static RAG (Interactive)"],
-        help="Switch between autonomous LangGraph agent or manual Interactive Chat."
+        options=["Agentic RAG (Autonomous)", "Static RAG (Interactive)", "Triage Daemon (Read-only)"],
+        help="Switch between autonomous LangGraph agent, manual Interactive Chat, or the reports of the headless triage daemon."
     )
     
-    st.divider()
+    if app_mode != "Triage Daemon (Read-only)":
+        st.divider()
 
-    st.header("🧠 AI Configuration")
-    available_models = get_installed_models()
-    selected_model = st.selectbox(
-        "Select LLM Model:",
-        options=available_models,
-        index=0,
-        help="Switch models to compare speed vs. accuracy."
-    )
-    st.caption(f"Active Model: `{selected_model}`")
+        st.header("🧠 AI Configuration")
+        with profile.phase("model list"):
+            available_models = get_installed_models()
+        selected_model = st.selectbox(
+            "Select LLM Model:",
+            options=available_models,
+            index=0,
+            help="Switch models to compare speed vs. accuracy."
+        )
+        st.caption(f"Active Model: `{selected_model}`")
+
+        # Load the models the agent will use in the background, so the first run doesn't pay load time
+        with profile.phase("warm-up"):
+            get_warmup_manager().preload_in_background([selected_model, load_routing_config()["small_model"]])
     
     if app_mode == "Static RAG (Interactive)":
         st.divider()
@@ -131,156 +188,186 @@ with st.sidebar:
         )
         st.session_state["intel_mode"] = intel_mode
 
+# Everything above is the UI chrome; its time is checked against the startup budget
+profile.mark("ui_ready")
+budget_warning = profile.check_budget()
+st.session_state["startup_profile"] = profile.to_dict()
+if budget_warning or os.getenv("APP_PROFILE") == "1":
+    with st.sidebar.expander("⏱️ Startup Profile", expanded=bool(budget_warning)):
+        if budget_warning:
+            st.warning(budget_warning)
+        st.caption(f"Sidebar drawn after {profile.marks['ui_ready']:.0f} ms (budget {profile.budget_ms:.0f} ms)")
+        st.dataframe(profile.phases, use_container_width=True, hide_index=True)
+
 # --- MCP SERVERS (Windows Configuration) ---
-wazuh_server = StdioServerParameters(command=sys.executable, args=["wazuh_server.py"])
-mitre_server = StdioServerParameters(command=sys.executable, args=["mitre_server.py"])
+# Used only when WAZUH_MCP_URL / MITRE_MCP_URL are unset; otherwise the app connects to the
+# shared network servers (see mcp_transport.py).
+# The full environment is passed through so the servers see the Wazuh API and tracing settings
+def server_params(name):
+    StdioServerParameters = profile.lazy_import("mcp").StdioServerParameters
+    return StdioServerParameters(command=sys.executable, args=[f"{name}_server.py"], env=dict(os.environ))
 
 # --- ORCHESTRATION FUNCTIONS (Async) ---
 
 async def orchestrate_investigation():
     """STATIC RAG LOGIC: Connects, retrieves data once statically based on selected tier."""
+    with get_tracer().span("static_rag.investigation", intel_mode=st.session_state.get("intel_mode", "hybrid")):
+        return await _orchestrate_investigation()
+
+async def _orchestrate_investigation():
+    from mcp_transport import connect_mcp
+    from tracing import traced_call_tool
+
     async with AsyncExitStack() as stack:
         try:
-            wazuh_transport = await stack.enter_async_context(stdio_client(wazuh_server))
-            wazuh_session = await stack.enter_async_context(ClientSession(wazuh_transport[0], wazuh_transport[1]))
-            await wazuh_session.initialize()
-        except:
-            return None, None
-            
-        try:
-            mitre_transport = await stack.enter_async_context(stdio_client(mitre_server))
-            mitre_session = await stack.enter_async_context(ClientSession(mitre_transport[0], mitre_transport[1]))
-            await mitre_session.initialize()
+            wazuh_session = await connect_mcp(stack, "wazuh", server_params("wazuh"))
         except:
             return None, None
 
         try:
-            alerts_result = await wazuh_session.call_tool("get_latest_alerts", arguments={})
-            alerts_data = json.loads(alerts_result.content[0].text)
+            alerts_result = await traced_call_tool(wazuh_session, "get_latest_alerts", {})
+            alerts_data = loads(alerts_result.content[0].text)
         except:
             return None, None
         
         if not alerts_data:
             return None, "No alerts found."
 
-        target_alert = alerts_data[0]
+    target_alert = alerts_data[0]
+    return target_alert, await retrieve_context(target_alert, st.session_state.get("intel_mode", "hybrid"))
+
+async def retrieve_context(target_alert, intel_mode):
+    """Knowledge context for one alert and tier: from the shared cache, else from the MITRE server."""
+    alert = Alert.from_dict(target_alert)
+    mitre_id = alert.primary_technique
+    
+    if intel_mode == "tier3":
+        # For Tier 3 Static RAG, we deliberately don't inject any MCP context.
+        return "N/A (Relying purely on LLM internal knowledge for mitigation strategies)."
+    context_cache = get_context_cache()
+    cached = context_cache.get(target_alert, mitre_id or "similar", intel_mode)
+    if cached is not None:
+        return cached
+
+    # Only a cache miss pays for the MITRE server connection (and the MCP imports)
+    from mcp_transport import connect_mcp
+    from tracing import traced_call_tool
+
+    async with AsyncExitStack() as stack:
         try:
-            mitre_id = target_alert['rule']['mitre']['id'][0]
-        except KeyError:
-            mitre_id = None
-        
-        context_text = "No MITRE ID found in alert."
-        intel_mode = st.session_state.get("intel_mode", "hybrid")
-        
-        if intel_mode == "tier3":
-            # For Tier 3 Static RAG, we deliberately don't inject any MCP context.
-            context_text = "N/A (Relying purely on LLM internal knowledge for mitigation strategies)."
-        elif mitre_id:
-            try:
-                tool_map = {
-                    "tier1": "get_playbook",
-                    "tier2": "get_tier2_mitre_data",
-                    "hybrid": "get_full_context"
-                }
+            mitre_session = await connect_mcp(stack, "mitre", server_params("mitre"))
+            tool_map = {
+                "tier1": "get_playbook",
+                "tier2": "get_tier2_mitre_data",
+                "hybrid": "get_full_context"
+            }
+            if mitre_id:
                 tool_name = tool_map.get(intel_mode, "get_full_context")
-                mitigation_result = await mitre_session.call_tool(tool_name, arguments={"technique_id": mitre_id})
+                mitigation_result = await traced_call_tool(mitre_session, tool_name, {"technique_id": mitre_id})
                 context_text = mitigation_result.content[0].text
-            except Exception as e:
-                context_text = f"Could not retrieve MITRE data: {str(e)}"
+            else:
+                # No MITRE ID: fall back to the nearest playbooks, techniques and past reports
+                similar_result = await traced_call_tool(mitre_session, "find_similar_entries", {
+                    "description": alert.description,
+                    "full_log": alert.full_log,
+                })
+                context_text = format_similar_entries(loads(similar_result.content[0].text))
+        except Exception as e:
+            return f"Could not retrieve MITRE data: {str(e)}"
 
-        return target_alert, context_text
+    context_cache.put(target_alert, mitre_id or "similar", intel_mode, context_text)
+    return context_text
 
-def run_static_logic():
+def format_similar_entries(result):
+    if "error" in result:
+        return f"No MITRE ID found in alert. Similarity search failed: {result['error']}"
+    if not result["matches"]:
+        return "No MITRE ID found in alert, and no similar playbooks, techniques or past reports."
+    lines = ["No MITRE ID found in alert. Closest known entries (similarity search):", ""]
+    for match in result["matches"]:
+        lines.append(f"- **[{match['kind']}] {match['ref']}** {match['title']} (score {match['score']:.2f}): {match['snippet']}")
+    return "\n".join(lines)
+
+def run_static(coro):
     try:
         loop = asyncio.get_event_loop()
     except RuntimeError:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-    return loop.run_until_complete(orchestrate_investigation())
+    return loop.run_until_complete(coro)
+
+def run_static_logic():
+    return run_static(orchestrate_investigation())
 
 async def run_agentic_triage(selected_model):
     """
     Connects to both servers, configures the LangGraph Agent, and runs it on the latest alert.
     """
+    from agent import get_react_agent, run_config
+    from mcp_transport import connect_mcp
+    from prompts import triage_messages
+    from resilience import UpstreamUnavailable
+
     async with AsyncExitStack() as stack:
         # --- CONNECT TO MCP SERVERS ---
         try:
-            st.toast("🔌 Connecting to Wazuh MCP Server...", icon="🔗")
-            wazuh_transport = await stack.enter_async_context(stdio_client(wazuh_server))
-            wazuh_session = await stack.enter_async_context(ClientSession(wazuh_transport[0], wazuh_transport[1]))
-            await wazuh_session.initialize()
-            
-            st.toast("🔌 Connecting to MITRE Knowledge Base...", icon="🔗")
-            mitre_transport = await stack.enter_async_context(stdio_client(mitre_server))
-            mitre_session = await stack.enter_async_context(ClientSession(mitre_transport[0], mitre_transport[1]))
-            await mitre_session.initialize()
+            wazuh_session = await connect_mcp(stack, "wazuh", server_params("wazuh"))
+            mitre_session = await connect_mcp(stack, "mitre", server_params("mitre"))
         except Exception as e:
             yield f"Error establishing MCP connections: {str(e)}"
             return
 
         # --- RUN LANGGRAPH AGENT ---
-        agent = build_react_agent(wazuh_session, mitre_session, selected_model)
-        
-        system_prompt = SystemMessage(content='''You are an elite Cybersecurity SOC Analyst Assistant.
+        # Cached per model: only the session bindings change between runs
+        agent = get_react_agent(selected_model)
         
-You are equipped with tools to fetch alerts and playbooks.
-
-YOUR OBJECTIVE:
-1. First, call `fetch_wazuh_alerts` to see current incidents.
-2. Read the returned alert CAREFULLY. Note the EXACT MITRE technique ID and the source IP given in the JSON.
-3. Call `get_tier1_playbook` passing the precise technique ID discovered in step 2. You MUST NOT assume the ID is T1110. Use the one you just read.
-4. If the Tier 1 playbook is NOT found (returns an error/not found message), you MUST call `get_tier2_mitre_data` with the technique ID to get the official MITRE mitigation steps.
-5. Once you have the playbook or mitigation information from ANY tier, write a final comprehensive SOC report for the human analyst focusing on the exact technique ID and attack type returned.
-
-CRITICAL RULES FOR TOOL CALLING:
-- You must use the native tool calling capability.
-- When calling ANY playbook or MITRE tool, you MUST use the exact parameter name: `technique_id`.
-- DO NOT output a tool call as plain text or JSON in your response message.
-- DO NOT say "I will now call the tool...". If you need to use a tool, invoke it directly without any conversational text.
-- Your final report MUST be a standalone, complete document. You MUST rewrite the incident details, IP, and the playbook steps precisely inside your final message. DO NOT just say "see the playbook above".
-- Once you have the playbook data from the tools, synthesize everything into a well-formatted Markdown report.
-- If BOTH Tier 1 and Tier 2 tools fail to find data, and you must rely entirely on your own internal knowledge (Tier 3) to generate mitigations, you MUST add a clear WARNING to the report stating this. DO NOT add this warning if Tier 1 returned a valid playbook or Tier 2 returned valid MITRE data.
-''')
-        
-        # State to trace logic
-        state = {"messages": [system_prompt, HumanMessage(content=f"[{datetime.now()}] Start the autonomous triage process. You MUST call `fetch_wazuh_alerts` NOW to get the latest alert data, do not assume or invent anything.")]}
+        # State to trace logic (the system prompt is a stable prefix, see prompts.py)
+        state = {"messages": triage_messages()}
         
         # Stream the graph logic
         final_report = None
         
-        # Increased recursion limit slightly to 15 to allow room for the new Reflection correction loops
-        async for event in agent.astream(state, {"recursion_limit": 15}):
-            for node, content in event.items():
-                if node == "agent":
-                    message = content["messages"][-1]
-                    if getattr(message, "tool_calls", None):
-                        for tc in message.tool_calls:
-                            yield {"type": "tool_call", "name": tc["name"], "args": tc["args"]}
-                    else:
-                        # Capture the agent's text output, but DO NOT yield it to the UI yet.
-                        # If it hallucinated, this variable will be overwritten by its next attempt.
-                        final_report = message.content
-                elif node == "tools":
-                    message = content["messages"][-1]
-                    yield {"type": "tool_result", "name": message.name, "result": message.content}
+        # An unreachable Ollama or MCP server ends the run at once (see resilience.py)
+        try:
+            # Increased recursion limit slightly to 15 to allow room for the new Reflection correction loops
+            async for event in agent.astream(state, run_config(wazuh_session, mitre_session, recursion_limit=15)):
+                for node, content in event.items():
+                    if node == "agent":
+                        for decision in content.get("routing", []):
+                            yield {"type": "routing", **decision}
+                        message = content["messages"][-1]
+                        if getattr(message, "tool_calls", None):
+                            for tc in message.tool_calls:
+                                yield {"type": "tool_call", "name": tc["name"], "args": tc["args"]}
+                        else:
+                            # Capture the agent's text output, but DO NOT yield it to the UI yet.
+                            # If it hallucinated, this variable will be overwritten by its next attempt.
+                            final_report = message.content
+                    elif node == "tools":
+                        message = content["messages"][-1]
+                        yield {"type": "tool_result", "name": message.name, "result": message.content}
+        except UpstreamUnavailable as e:
+            yield f"Triage stopped: {e}"
+            return
         
         # Only yield the Final Triage Report to the UI once the LangGraph execution has completely finished.
         if final_report:
             yield {"type": "content", "content": final_report}
 
 def start_triage():
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-    return loop.run_until_complete(run_event_stream())
+    # The run executes on the agent's shared background loop (where the pooled Ollama
+    # clients live), so UI feedback is emitted here, from the script thread.
+    st.toast("🔌 Connecting to Wazuh MCP Server and MITRE Knowledge Base...", icon="🔗")
+    run_coroutine = profile.lazy_import("agent").run_coroutine
+    # Resolved here: Streamlit caches can't be used from the agent's background loop thread
+    return run_coroutine(run_event_stream(get_tracer()))
 
-async def run_event_stream():
+async def run_event_stream(tracer):
     events = []
-    async for e in run_agentic_triage(selected_model):
-        events.append(e)
+    # One trace per triage run: nodes, LLM calls and MCP calls (client and server side) nest under it
+    with tracer.span("triage.run", model=selected_model):
+        async for e in run_agentic_triage(selected_model):
+            events.append(e)
     return events
 
 # --- INTERFACE ---
@@ -298,7 +385,7 @@ if app_mode == "Agentic RAG (Autonomous)":
         st.subheader("Agent Control")
         if st.button("🚨 Autonomous Triage (Run Agent)", type="primary", use_container_width=True):
             st.session_state["agent_history"] = [] # clear previous run
-            with st.spinner("Agent is thinking..."):
+            with st.spinner("Agent is thinking..."), profile.phase("agent run"):
                 events = start_triage()
                 st.session_state["agent_history"] = events
         
@@ -312,6 +399,8 @@ if app_mode == "Agentic RAG (Autonomous)":
                 elif event["type"] == "tool_call":
                     with st.status(f"Agent called tool: `{event['name']}`") as status:
                         st.json(event["args"])
+                elif event["type"] == "routing":
+                    st.caption(f"🧭 `{event['step']}` → `{event['model']}` ({event['latency_seconds']}s) — {event['reason']}")
                 elif event["type"] == "tool_result":
                     with st.expander(f"Tool Output: `{event['name']}`"):
                         st.text(str(event["result"])[:500] + "... (truncated)" if len(str(event["result"])) > 500 else str(event["result"]))
@@ -331,6 +420,96 @@ if app_mode == "Agentic RAG (Autonomous)":
         if not has_report:
             st.info("The final generated triage report will appear here once the agent finishes its investigation.")
 
+elif app_mode == "Triage Daemon (Read-only)":
+    # --- TRIAGE DAEMON VIEWER Mode ---
+    # Nothing runs here: triage_daemon.py does the work, this only reads its store
+    st.caption("Architecture: triage_daemon.py → LangGraph ReAct Agent → SQLite store → Streamlit (read-only)")
+    
+    try:
+        triage_store = get_triage_store()
+    except Exception:
+        st.warning("No triage store found. Start the daemon first: `python triage_daemon.py --source stream`")
+        st.stop()
+    
+    daemon_state = triage_store.get_state("daemon")
+    heartbeat_age = triage_store.state_age("daemon")
+    col_status, col_refresh = st.columns([4, 1])
+    with col_status:
+        if daemon_state is None:
+            st.info("The daemon has not reported yet.")
+        elif heartbeat_age > 3 * daemon_state["poll_interval"] + 30:
+            st.error(f"🔴 Daemon not responding (last heartbeat {heartbeat_age:.0f}s ago, pid {daemon_state['pid']}).")
+        else:
+            st.success(f"🟢 Daemon running: source `{daemon_state['source']}`, model `{daemon_state['model']}` (heartbeat {heartbeat_age:.0f}s ago)")
+    with col_refresh:
+        st.button("🔄 Refresh", use_container_width=True)
+    
+    counts = triage_store.counts()
+    metric_cols = st.columns(len(counts) + 1)
+    for col, (status_name, count) in zip(metric_cols, counts.items()):
+        col.metric(status_name.capitalize(), count)
+    if daemon_state:
+        scheduler_stats = daemon_state["scheduler"]
+        metric_cols[-1].metric("Concurrency", f"{scheduler_stats['in_flight']}/{scheduler_stats['concurrency_limit']}")
+        st.caption(f"⏳ Queue depth by severity: {scheduler_stats['queue_depth']} — deadline misses: {scheduler_stats['deadline_missed']}")
+        unhealthy = {name: u for name, u in daemon_state.get("upstreams", {}).items() if u["state"] != "closed"}
+        for name, upstream in unhealthy.items():
+            st.warning(f"⚡ Upstream `{name}` circuit {upstream['state'].replace('_', '-')}: calls fail fast until it recovers.")
+    
+    col_list, col_report = st.columns([1.2, 1.5])
+    
+    with col_list:
+        st.subheader("Triaged Alerts")
+        col_f1, col_f2 = st.columns(2)
+        status_filter = col_f1.selectbox("Status:", options=["All", "done", "running", "queued", "error", "shed"])
+        severity_filter = col_f2.selectbox("Severity:", options=["All", "critical", "high", "medium", "low"])
+        rows = triage_store.recent(
+            limit=200,
+            status=None if status_filter == "All" else status_filter,
+            severity=None if severity_filter == "All" else severity_filter,
+        )
+        if not rows:
+            st.info("No alerts match the filters.")
+        else:
+            st.dataframe(
+                [{
+                    "Severity": r["severity"],
+                    "Status": r["status"],
+                    "Rule": r["description"],
+                    "MITRE": ", ".join(r["mitre_ids"]),
+                    "Agent": r["agent_name"],
+                    "Run (s)": round(r["finished_at"] - r["started_at"], 1) if r["finished_at"] and r["started_at"] else None,
+                } for r in rows],
+                use_container_width=True,
+                hide_index=True,
+            )
+            selected_fingerprint = st.selectbox(
+                "Open report:",
+                options=[r["fingerprint"] for r in rows],
+                format_func=lambda fp: next(f"[{r['severity']}] {r['description']} ({r['status']})" for r in rows if r["fingerprint"] == fp),
+            )
+    
+    with col_report:
+        st.subheader("Final Triage Report")
+        record = triage_store.get(selected_fingerprint) if rows else None
+        if record is None:
+            st.info("Select an alert to view its report.")
+        else:
+            if record["status"] == "done":
+                st.info(record["report"])
+            elif record["error"]:
+                st.error(record["error"])
+            else:
+                st.info(f"Triage {record['status']}...")
+            for decision in record["routing"]:
+                st.caption(f"🧭 `{decision['step']}` → `{decision['model']}` ({decision['latency_seconds']}s) — {decision['reason']}")
+            if record["steps"]:
+                with st.expander("Agent Thought Process"):
+                    for step in record["steps"]:
+                        st.text(step)
+            with st.expander("🔍 Raw Alert Data"):
+                st.json(record["alert"])
+
 else:
     # --- STATIC RAG UI Mode ---
     st.caption("Architecture: Static Connect → Load Context → LLM Chat")
@@ -338,10 +517,17 @@ else:
     col_dashboard, col_chat = st.columns([1.5, 1])
 
     with st.spinner("Fetching static context from MCP Servers..."):
+        current_tier = st.session_state.get("intel_mode", "hybrid")
         if "alert_data" not in st.session_state:
-            data, context = run_static_logic()
+            with profile.phase("static fetch"):
+                data, context = run_static_logic()
             st.session_state["alert_data"] = data
             st.session_state["knowledge_context"] = context
+            st.session_state["context_tier"] = current_tier
+        elif st.session_state.get("alert_data") and st.session_state.get("context_tier") != current_tier:
+            # Tier switched: same alert, so no Wazuh round-trip; usually a context cache hit
+            st.session_state["knowledge_context"] = run_static(retrieve_context(st.session_state["alert_data"], current_tier))
+            st.session_state["context_tier"] = current_tier
         
         alert_data = st.session_state.get("alert_data")
         knowledge_context = st.session_state.get("knowledge_context")
@@ -352,6 +538,8 @@ else:
             st.info(f"**Rule:** {alert_data.get('rule', {}).get('description', 'Unknown Alert')}")
             with st.expander("🧠 Retrieved Context (From MITRE Server)", expanded=True):
                 st.markdown(knowledge_context)
+                cache_stats = get_context_cache().stats()
+                st.caption(f"♻️ Context cache: {cache_stats['entries']} entries, {cache_stats['hits']} hits / {cache_stats['misses']} misses")
             with st.expander("🔍 Raw Alert Data"):
                 st.json(alert_data)
         else:
@@ -378,9 +566,10 @@ else:
                     "tier1": "Focus: Playbook actions.", "tier2": "Focus: Summarize.", "tier3": "Focus: Deep dive.", "hybrid": "Focus: Explain and remediate."
                 }
                 
-                final_prompt = f"""{system_persona}\n{tier_focus[current_tier]}\n🚨 ALERT DATA:\n{json.dumps(alert_data)}\n📚 KNOWLEDGE BASE:\n{knowledge_context}\n❓ QUESTION: {prompt}"""
+                final_prompt = f"""{system_persona}\n{tier_focus[current_tier]}\n🚨 ALERT DATA:\n{dumps(alert_data)}\n📚 KNOWLEDGE BASE:\n{knowledge_context}\n❓ QUESTION: {prompt}"""
                 
-                stream = ollama_client.chat(model=selected_model, messages=[{'role': 'user', 'content': final_prompt}], stream=True)
+                keep_alive = profile.lazy_import("ollama_warmup").DEFAULT_KEEP_ALIVE
+                stream = get_ollama_client().chat(model=selected_model, messages=[{'role': 'user', 'content': final_prompt}], stream=True, keep_alive=keep_alive)
                 
                 def stream_parser(raw_stream):
                     for chunk in raw_stream:
@@ -389,4 +578,7 @@ else:
 
                 response = st.write_stream(stream_parser(stream))
             
-            st.session_state.messages.append({"role": "assistant", "content": response})
\ No newline at end of file
+            st.session_state.messages.append({"role": "assistant", "content": response})
+
+# Final timings of this run, including the actions that ran after "ui_ready"
+st.session_state["startup_profile"] = profile.to_dict()
@@ -0,0 +1,138 @@
+# bench_alert_codec.py
+"""
+Micro-benchmark of the per-alert JSON cost on the alert hot path, before and after
+alert_model.py:
+
+- before: json.loads + nested dict digging (rule.mitre.id[0], level, agent, src_ip with
+          the try/except KeyError pattern the call sites used), json.dumps
+- after:  alert_model.loads + Alert.from_dict (one normalisation step), alert_model.dumps
+          (orjson when installed, otherwise the compact stdlib fallback)
+
+Alerts come from JSONL files (e.g. bulk_alerts/ from generate_safe_scenarios.py --bulk)
+or, without files, are generated in memory.
+
+Usage:
+    python bench_alert_codec.py --count 20000
+    python bench_alert_codec.py bulk_alerts/alerts_0000.jsonl --output codec_bench.json
+"""
+import sys
+import json
+import time
+import argparse
+import itertools
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import alert_model
+from alert_model import Alert
+
+def load_lines(files: List[str], count: int, seed: int = 7) -> List[str]:
+    if files:
+        lines = []
+        for path in files:
+            with open(path, "r", encoding="utf-8") as f:
+                lines.extend(line.rstrip("\n") for line in itertools.islice(f, count - len(lines)) if line.strip())
+            if len(lines) >= count:
+                break
+        return lines
+    from generate_safe_scenarios import AlertFactory, load_attack_techniques
+    factory = AlertFactory(load_attack_techniques(None), seed, datetime(2025, 1, 1), 86400, 0)
+    alerts = []
+    while len(alerts) < count:
+        alerts.extend(factory.episode())
+    return [json.dumps(a, separators=(",", ":")) for a in alerts[:count]]
+
+# ==========================================
+# The two paths
+# ==========================================
+def legacy_fields(data: Dict[str, Any]):
+    try:
+        mitre_id = data['rule']['mitre']['id'][0]
+    except (KeyError, IndexError):
+        mitre_id = None
+    try:
+        level = int(data["rule"]["level"])
+    except (KeyError, TypeError, ValueError):
+        level = 0
+    agent = data.get("agent") or {}
+    return mitre_id, level, agent.get("name"), data.get("src_ip")
+
+def legacy_parse(line: str):
+    return legacy_fields(json.loads(line))
+
+def model_parse(line: str):
+    alert = Alert.from_json(line)
+    return alert.primary_technique, alert.level, alert.agent_name, alert.src_ip
+
+def legacy_serialize(data: Dict[str, Any]) -> str:
+    return json.dumps([data])
+
+def model_serialize(data: Dict[str, Any]) -> str:
+    return alert_model.dumps([data])
+
+# ==========================================
+# Measurement
+# ==========================================
+def time_per_item(fn: Callable, items: List[Any], repeat: int) -> float:
+    """Best-of-`repeat` microseconds per item."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - started)
+    return best / len(items) * 1e6
+
+def run_benchmark(lines: List[str], repeat: int = 5) -> Dict[str, Any]:
+    dicts = [json.loads(line) for line in lines]
+    results = {
+        "alerts": len(lines),
+        "avg_bytes": round(sum(len(line) for line in lines) / len(lines), 1),
+        "backend": alert_model.JSON_BACKEND,
+        "parse_us": {
+            "before": time_per_item(legacy_parse, lines, repeat),
+            "after": time_per_item(model_parse, lines, repeat),
+        },
+        "serialize_us": {
+            "before": time_per_item(legacy_serialize, dicts, repeat),
+            "after": time_per_item(model_serialize, dicts, repeat),
+        },
+        "wire_bytes": {
+            "before": round(sum(len(legacy_serialize(d)) for d in dicts) / len(dicts), 1),
+            "after": round(sum(len(model_serialize(d)) for d in dicts) / len(dicts), 1),
+        },
+    }
+    # Same answers on both paths, except IDs the model normalises or drops as invalid
+    mismatches = sum(1 for line in lines if legacy_parse(line)[1:] != model_parse(line)[1:])
+    results["field_mismatches"] = mismatches
+    return results
+
+def format_results(r: Dict[str, Any]) -> str:
+    lines = [f"[*] {r['alerts']} alerts, {r['avg_bytes']} bytes avg, codec backend: {r['backend']}"]
+    lines.append(f"    {'':<14}{'before':>10}{'after':>10}{'speedup':>10}")
+    for key, label, unit in (("parse_us", "parse", "us"), ("serialize_us", "serialize", "us"), ("wire_bytes", "wire size", "B")):
+        before, after = r[key]["before"], r[key]["after"]
+        lines.append(f"    {label + ' (' + unit + ')':<14}{before:>10.2f}{after:>10.2f}{before / after:>9.2f}x")
+    if r["field_mismatches"]:
+        lines.append(f"[-] {r['field_mismatches']} alerts decoded to different level/agent/src_ip fields")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-alert parse/serialize cost: json + dict digging vs alert_model.")
+    parser.add_argument("files", nargs="*", help="JSONL alert files (default: generated alerts)")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5, help="Passes per measurement (best is kept)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    lines = load_lines(args.files, args.count, args.seed)
+    if not lines:
+        print("[-] No alerts to benchmark.")
+        sys.exit(1)
+    results = run_benchmark(lines, args.repeat)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+        print(f"[+] Results saved to {args.output}")
@@ -0,0 +1,220 @@
+# benchmark.py
+"""
+Per-node latency and token benchmarking for the triage graph.
+
+`BenchmarkCallback` is a LangChain callback handler attached to one graph run. It records:
+- wall time of every LangGraph node execution (agent / tools / correction),
+- wall time of every tool call (each tool is one MCP `call_tool` round-trip),
+- every LLM call: model, latency, time-to-first-token, prompt/completion tokens,
+  tokens/sec and Ollama's own load / prefill / generation timings,
+- the number of `correction_node` loops.
+
+`summarize` aggregates many run records into p50/p95/p99 tables per model and per
+MITRE technique. evaluate_agent.py uses both in --benchmark mode.
+"""
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+GRAPH_NODES = ("agent", "tools", "correction")
+
+class BenchmarkCallback(BaseCallbackHandler):
+    """Collects timings for a single graph run. Create one per run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.nodes: List[Dict[str, Any]] = []
+        self.tools: List[Dict[str, Any]] = []
+        self.llm_calls: List[Dict[str, Any]] = []
+        self._open: Dict[UUID, Dict[str, Any]] = {}
+
+    def _elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    # --- Graph nodes ---
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node runnable itself (not the sub-chains it invokes) carries its own name
+        if node in GRAPH_NODES and kwargs.get("name") == node:
+            self._open[run_id] = {"kind": "node", "node": node, "start": self._elapsed()}
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._close(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._close(run_id, error=str(error))
+
+    # --- Tools (MCP calls) ---
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "unknown")
+        self._open[run_id] = {"kind": "tool", "tool": name, "start": self._elapsed()}
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._close(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._close(run_id, error=str(error))
+
+    # --- LLM calls ---
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (kwargs.get("invocation_params") or {}).get("model")
+        self._open[run_id] = {"kind": "llm", "model": model, "start": self._elapsed(), "first_token": None}
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        call = self._open.get(run_id)
+        if call is not None and call["first_token"] is None:
+            call["first_token"] = self._elapsed()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        call = self._open.get(run_id)
+        if call is not None:
+            try:
+                message = response.generations[0][0].message
+                meta = dict(message.response_metadata or {})
+            except (IndexError, AttributeError):
+                meta = {}
+            call["model"] = meta.get("model") or call["model"]
+            call["meta"] = meta
+        self._close(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._close(run_id, error=str(error))
+
+    def _close(self, run_id, error: Optional[str] = None):
+        entry = self._open.pop(run_id, None)
+        if entry is None:
+            return
+        end = self._elapsed()
+        seconds = round(end - entry["start"], 4)
+        if entry["kind"] == "node":
+            self.nodes.append({"node": entry["node"], "seconds": seconds, "error": error})
+        elif entry["kind"] == "tool":
+            self.tools.append({"tool": entry["tool"], "seconds": seconds, "error": error})
+        else:
+            meta = entry.get("meta", {})
+            prompt_tokens = meta.get("prompt_eval_count")
+            completion_tokens = meta.get("eval_count")
+            eval_seconds = (meta.get("eval_duration") or 0) / 1e9
+            if entry["first_token"] is not None:
+                ttft = entry["first_token"] - entry["start"]
+            else:
+                # Not streamed: approximate with Ollama's load + prefill time
+                ttft = ((meta.get("load_duration") or 0) + (meta.get("prompt_eval_duration") or 0)) / 1e9 or None
+            self.llm_calls.append({
+                "model": entry["model"],
+                "seconds": seconds,
+                "ttft_seconds": round(ttft, 4) if ttft else None,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "tokens_per_second": round(completion_tokens / eval_seconds, 2) if completion_tokens and eval_seconds else None,
+                "load_seconds": round((meta.get("load_duration") or 0) / 1e9, 4),
+                "prefill_seconds": round((meta.get("prompt_eval_duration") or 0) / 1e9, 4),
+                "error": error,
+            })
+
+    def finish(self) -> None:
+        self.finished = self._elapsed()
+
+    def to_record(self) -> Dict[str, Any]:
+        """JSON-serializable timings for this run."""
+        return {
+            "total_seconds": round(self.finished if self.finished is not None else self._elapsed(), 4),
+            "correction_loops": sum(1 for n in self.nodes if n["node"] == "correction"),
+            "nodes": self.nodes,
+            "tools": self.tools,
+            "llm_calls": self.llm_calls,
+        }
+
+# ==========================================
+# Aggregation
+# ==========================================
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (pct in 0-100)."""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+def distribution(values: Iterable[Optional[float]]) -> Dict[str, Any]:
+    values = [v for v in values if v is not None]
+    return {
+        "n": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+def summarize(runs: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregates run records of the form {"technique": str, "benchmark": to_record()}.
+    Returns p50/p95/p99 per model (LLM calls) and per technique (whole runs), plus
+    per-node and per-tool latency distributions.
+    """
+    runs = list(runs)
+    per_model: Dict[str, List[Dict[str, Any]]] = {}
+    per_technique: Dict[str, List[Dict[str, Any]]] = {}
+    nodes: Dict[str, List[float]] = {}
+    tools: Dict[str, List[float]] = {}
+
+    for run in runs:
+        bench = run["benchmark"]
+        per_technique.setdefault(run.get("technique") or "unknown", []).append(bench)
+        for call in bench["llm_calls"]:
+            per_model.setdefault(call["model"] or "unknown", []).append(call)
+        for node in bench["nodes"]:
+            nodes.setdefault(node["node"], []).append(node["seconds"])
+        for tool in bench["tools"]:
+            tools.setdefault(tool["tool"], []).append(tool["seconds"])
+
+    return {
+        "runs": len(runs),
+        "per_model": {
+            model: {
+                "latency_seconds": distribution(c["seconds"] for c in calls),
+                "ttft_seconds": distribution(c["ttft_seconds"] for c in calls),
+                "tokens_per_second": distribution(c["tokens_per_second"] for c in calls),
+                "prompt_tokens": distribution(c["prompt_tokens"] for c in calls),
+                "completion_tokens": distribution(c["completion_tokens"] for c in calls),
+            }
+            for model, calls in sorted(per_model.items())
+        },
+        "per_technique": {
+            technique: {
+                "total_seconds": distribution(b["total_seconds"] for b in benches),
+                "llm_seconds": distribution(sum(c["seconds"] for c in b["llm_calls"]) for b in benches),
+                "tool_seconds": distribution(sum(t["seconds"] for t in b["tools"]) for b in benches),
+                "correction_loops": distribution(b["correction_loops"] for b in benches),
+            }
+            for technique, benches in sorted(per_technique.items())
+        },
+        "per_node": {node: distribution(v) for node, v in sorted(nodes.items())},
+        "per_tool": {tool: distribution(v) for tool, v in sorted(tools.items())},
+    }
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    """Plain-text tables for the console."""
+    def fmt(d):
+        if not d["n"]:
+            return "n=0"
+        return f"p50 {d['p50']:.3f} | p95 {d['p95']:.3f} | p99 {d['p99']:.3f} (n={d['n']})"
+
+    lines = [f"Benchmark summary over {summary['runs']} runs", "", "LLM calls per model (seconds):"]
+    for model, stats in summary["per_model"].items():
+        lines.append(f"  {model:<24} latency {fmt(stats['latency_seconds'])}")
+        lines.append(f"  {'':<24} TTFT    {fmt(stats['ttft_seconds'])}")
+        lines.append(f"  {'':<24} tok/s   {fmt(stats['tokens_per_second'])}")
+    lines += ["", "End-to-end runs per technique (seconds):"]
+    for technique, stats in summary["per_technique"].items():
+        lines.append(f"  {technique:<12} total {fmt(stats['total_seconds'])} | corrections p95 {stats['correction_loops']['p95']}")
+    lines += ["", "Graph nodes (seconds):"]
+    for node, d in summary["per_node"].items():
+        lines.append(f"  {node:<12} {fmt(d)}")
+    lines += ["", "MCP tool calls (seconds):"]
+    for tool, d in summary["per_tool"].items():
+        lines.append(f"  {tool:<22} {fmt(d)}")
+    return "\n".join(lines)
@@ -0,0 +1,189 @@
+# compare_transports.py
+"""
+Compares per-call latency and total server memory of the MCP transports.
+
+For each transport, `--clients` concurrent clients each make `--calls` tool calls:
+- stdio: every client spawns its own server subprocess (the historical setup),
+- streamable-http / sse: one shared server process serves all clients.
+
+Reports session setup time, p50/p95/p99 call latency, throughput and the summed RSS of
+all server processes. Example:
+
+    python compare_transports.py --server mitre --clients 8 --calls 100
+"""
+import os
+import sys
+import time
+import json
+import socket
+import asyncio
+import argparse
+import subprocess
+from contextlib import AsyncExitStack
+from typing import Dict, List
+
+from mcp import StdioServerParameters
+from mcp_transport import TRANSPORTS, open_session
+from benchmark import distribution
+
+SERVERS = {
+    "wazuh": ("wazuh_server.py", "get_latest_alerts", {}),
+    "mitre": ("mitre_server.py", "get_playbook", {"technique_id": "T1110"}),
+}
+
+# ==========================================
+# Process Memory
+# ==========================================
+def _children(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # Field 4 is the parent pid; the command name (field 2) may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return 0
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def tree_rss(pid: int, include_root: bool = True) -> Dict[str, int]:
+    """Summed RSS of `pid` and all its descendants. Returns {"processes", "rss_bytes"}."""
+    pids = [pid] if include_root else []
+    frontier = [pid]
+    while frontier:
+        kids = _children(frontier.pop())
+        pids.extend(kids)
+        frontier.extend(kids)
+    return {"processes": len(pids), "rss_bytes": sum(_rss_bytes(p) for p in pids)}
+
+# ==========================================
+# Runs
+# ==========================================
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port: int, timeout: float = 120.0) -> None:
+    # The MITRE server downloads ATT&CK before it starts listening
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.2)
+    raise TimeoutError(f"server did not listen on port {port} within {timeout}s")
+
+def start_server(script: str, transport: str, env=None):
+    """Starts `script` as a network MCP server on a free port. Returns (process, url)."""
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, script, "--transport", transport, "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env,
+    )
+    wait_for_port(port)
+    return proc, f"http://127.0.0.1:{port}/sse" if transport == "sse" else f"http://127.0.0.1:{port}/mcp"
+
+async def _client(url, stdio_params, tool, arguments, calls, latencies, ready, go):
+    async with AsyncExitStack() as stack:
+        session = await open_session(stack, url, stdio_params)
+        ready.release()
+        await go.wait()
+        for _ in range(calls):
+            started = time.perf_counter()
+            await session.call_tool(tool, arguments=arguments)
+            latencies.append(time.perf_counter() - started)
+
+async def run_transport(transport: str, server: str, clients: int, calls: int) -> Dict:
+    script, tool, arguments = SERVERS[server]
+    stdio_params = StdioServerParameters(command=sys.executable, args=[script], env=dict(os.environ))
+    server_proc = None
+    url = None
+
+    if transport != "stdio":
+        server_proc, url = start_server(script, transport)
+
+    latencies: List[float] = []
+    ready = asyncio.Semaphore(0)
+    go = asyncio.Event()
+    try:
+        setup_started = time.perf_counter()
+        tasks = [asyncio.create_task(_client(url, stdio_params, tool, arguments, calls, latencies, ready, go))
+                 for _ in range(clients)]
+        for _ in range(clients):
+            await ready.acquire()
+        setup_seconds = time.perf_counter() - setup_started
+
+        # Measured while every session is open: stdio servers are children of this process
+        memory = tree_rss(server_proc.pid) if server_proc else tree_rss(os.getpid(), include_root=False)
+
+        calls_started = time.perf_counter()
+        go.set()
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - calls_started
+    finally:
+        if server_proc:
+            server_proc.terminate()
+            server_proc.wait(timeout=10)
+
+    return {
+        "transport": transport,
+        "server": server,
+        "clients": clients,
+        "calls": len(latencies),
+        "setup_seconds": round(setup_seconds, 3),
+        "latency_seconds": distribution(latencies),
+        "calls_per_second": round(len(latencies) / wall, 1) if wall else None,
+        "server_processes": memory["processes"],
+        "server_rss_mb": round(memory["rss_bytes"] / 2**20, 1),
+    }
+
+def format_results(results: List[Dict]) -> str:
+    lines = [f"{'transport':<16} {'procs':>5} {'RSS MB':>8} {'setup s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/s':>8}"]
+    for r in results:
+        lat = r["latency_seconds"]
+        lines.append(
+            f"{r['transport']:<16} {r['server_processes']:>5} {r['server_rss_mb']:>8} {r['setup_seconds']:>8} "
+            f"{lat['p50'] * 1000:>8.2f} {lat['p95'] * 1000:>8.2f} {lat['p99'] * 1000:>8.2f} {r['calls_per_second']:>8}"
+        )
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare stdio vs network MCP transports.")
+    parser.add_argument("--server", choices=sorted(SERVERS), default="mitre")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent client sessions")
+    parser.add_argument("--calls", type=int, default=50, help="Tool calls per client")
+    parser.add_argument("--transports", nargs="+", choices=TRANSPORTS, default=["stdio", "streamable-http"])
+    parser.add_argument("--output", default=None, help="Optional JSON file for the raw results")
+    args = parser.parse_args()
+
+    results = []
+    for transport in args.transports:
+        print(f"[*] {transport}: {args.clients} clients x {args.calls} calls to {args.server}...")
+        results.append(asyncio.run(run_transport(transport, args.server, args.clients, args.calls)))
+
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+        print(f"[+] Results saved to {args.output}")
@@ -0,0 +1,122 @@
+# context_cache.py
+"""
+Process-wide cache of Static RAG context, keyed by (alert fingerprint, technique ID, tier).
+
+Retrieving context means spawning/connecting to the MITRE server and calling
+get_playbook / get_tier2_mitre_data / get_full_context. Every Streamlit session in the
+process shares this cache, so switching tiers back and forth, or a second analyst opening
+the same alert, is served from memory.
+
+Entries expire after a TTL and are invalidated when the knowledge changes: mitre_server.py
+rewrites MITRE_SNAPSHOT_FILE whenever a download yields different ATT&CK data
+(`mark_mitre_snapshot`), and the playbooks file mtime is tracked the same way.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import is_error_result
+
+MITRE_SNAPSHOT_FILE = os.getenv("MITRE_SNAPSHOT_FILE", os.path.join(".cache", "mitre_snapshot.json"))
+PLAYBOOKS_FILE = "config/playbooks.json"
+DEFAULT_TTL_SECONDS = float(os.getenv("CONTEXT_CACHE_TTL", "900"))
+
+def mark_mitre_snapshot(digest: str, techniques: int, snapshot_file: str = MITRE_SNAPSHOT_FILE) -> bool:
+    """
+    Called by mitre_server.py after a successful download. The file is only rewritten when
+    the data digest changed, so the many stdio server copies re-downloading the same
+    ATT&CK release don't invalidate every cache. Returns True if the snapshot changed.
+    """
+    try:
+        with open(snapshot_file, "r", encoding="utf-8") as f:
+            if json.load(f).get("digest") == digest:
+                return False
+    except (OSError, ValueError):
+        pass
+    try:
+        os.makedirs(os.path.dirname(snapshot_file) or ".", exist_ok=True)
+        tmp = f"{snapshot_file}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"digest": digest, "loaded_at": time.time(), "techniques": techniques}, f)
+        os.replace(tmp, snapshot_file)
+    except OSError as e:
+        sys.stderr.write(f"[CONTEXT CACHE] Could not write {snapshot_file}: {e}\n")
+        return False
+    return True
+
+def alert_fingerprint(alert: Dict[str, Any]) -> str:
+    """Stable hash of the alert content (key order independent)."""
+    canonical = json.dumps(alert, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+class ContextCache:
+    """Thread-safe TTL + LRU cache of retrieved context text."""
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = 512,
+                 snapshot_file: str = MITRE_SNAPSHOT_FILE, playbooks_file: str = PLAYBOOKS_FILE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.snapshot_file = snapshot_file
+        self.playbooks_file = playbooks_file
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def knowledge_version(self) -> Tuple[Optional[int], Optional[int]]:
+        return _mtime(self.snapshot_file), _mtime(self.playbooks_file)
+
+    @staticmethod
+    def key(alert: Dict[str, Any], technique_id: str, tier: str) -> Tuple[str, str, str]:
+        return alert_fingerprint(alert), technique_id, tier
+
+    def get(self, alert: Dict[str, Any], technique_id: str, tier: str) -> Optional[str]:
+        key = self.key(alert, technique_id, tier)
+        version = self.knowledge_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry["stored_at"] > self.ttl_seconds or entry["version"] != version:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["context"]
+
+    def put(self, alert: Dict[str, Any], technique_id: str, tier: str, context: str) -> None:
+        # Failures ("❌ ...", {"error": ...}) are not cached so the next request retries
+        if is_error_result(context):
+            return
+        key = self.key(alert, technique_id, tier)
+        with self._lock:
+            self._entries[key] = {"context": context, "stored_at": time.monotonic(), "version": self.knowledge_version()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+        }
@@ -1,137 +1,285 @@
 import os
 import sys
 import json
+import time
 import shutil
 import asyncio
-import pandas as pd
-from datetime import datetime
+import argparse
 from contextlib import AsyncExitStack
 
 # Agent and MCP imports mirroring app.py
-from agent import build_react_agent
+from agent import get_react_agent, run_config
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
-from langchain_core.messages import SystemMessage, HumanMessage
+from mcp_transport import connect_mcp
+from prompts import triage_messages
+from fake_llm import use_fake_llm
+from ollama_warmup import OllamaWarmupManager
+from model_router import load_routing_config
+from benchmark import BenchmarkCallback, summarize, format_summary
+from tracing import Tracer
+from alert_model import Alert
+from run_summary import run_stats, summarize_run
 
-wazuh_server_params = StdioServerParameters(command=sys.executable, args=["wazuh_server.py"])
-mitre_server_params = StdioServerParameters(command=sys.executable, args=["mitre_server.py"])
+mitre_server_params = StdioServerParameters(command=sys.executable, args=["mitre_server.py"], env=dict(os.environ))
+
+tracer = Tracer("evaluator")
+
+# Each worker injects scenarios into its own alert file, served by its own Wazuh MCP server.
+# These stay stdio even if WAZUH_MCP_URL is set: a shared server would serve one alert file to all.
+WORKERS_DIR = ".eval_workers"
+
+def wazuh_server_params_for(alert_file: str) -> StdioServerParameters:
+    return StdioServerParameters(
+        command=sys.executable,
+        args=["wazuh_server.py"],
+        env={**os.environ, "WAZUH_ALERT_FILE": os.path.abspath(alert_file)},
+    )
+
+# ==========================================
+# Results Streaming & Resume
+# ==========================================
+# Prefix of "Final Agent Output" when the run itself failed (not a wrong answer)
+EXECUTION_ERROR = "EXECUTION_ERROR"
+
+def load_recorded(results_file: str) -> dict:
+    """Returns {Filename: latest record} for every scenario already streamed to the JSONL file."""
+    recorded = {}
+    if not os.path.exists(results_file):
+        return recorded
+    with open(results_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-write leaves at most one truncated trailing line
+                continue
+            recorded[record["Filename"]] = record
+    return recorded
+
+def is_failed(record: dict) -> bool:
+    """Records of runs that crashed are retried on resume instead of counting as done."""
+    return str(record.get("Final Agent Output", "")).startswith(EXECUTION_ERROR)
+
+def append_record(results_file: str, record: dict) -> None:
+    # One line per scenario, flushed immediately so a crash never loses finished work
+    with open(results_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def format_step_summary(results) -> str:
+    """Average turns and wall time per run, grouped by the number of techniques in the alert."""
+    groups = {}
+    for r in results:
+        if "Agent Turns" in r:
+            groups.setdefault(r.get("Techniques", 1), []).append(r)
+    lines = ["[*] Agent turns and wall time by techniques per alert:"]
+    for count, runs in sorted(groups.items()):
+        turns = sum(r["Agent Turns"] for r in runs) / len(runs)
+        seconds = sum(r["Elapsed Seconds"] for r in runs) / len(runs)
+        lines.append(f"    {count} technique(s): {len(runs)} runs, {turns:.1f} turns, {seconds:.2f}s avg")
+    return "\n".join(lines)
+
+# ==========================================
+# Worker Pool
+# ==========================================
+async def evaluation_worker(worker_id, queue, agent, mitre_session, scenarios_dir, results_file, done_counter, benchmark=False,
+                            parallel_tool_calls=True):
+    def log(msg):
+        print(f"[worker {worker_id}] {msg}")
+
+    # Isolated alert source: this worker's Wazuh server only ever reads this file
+    worker_dir = os.path.join(WORKERS_DIR, f"worker_{worker_id}")
+    os.makedirs(worker_dir, exist_ok=True)
+    alert_file = os.path.join(worker_dir, "alert.json")
+    if os.path.exists("alert.json"):
+        shutil.copy("alert.json", alert_file)
 
-async def evaluate_agent():
-    scenarios_dir = "scenarios"
-    results = []
-    selected_model = "llama3.1:latest"  # Matches the Streamlit UI screenshot to ensure identical behavior
-    
-    print("[*] Initializing MCP connections...")
     async with AsyncExitStack() as stack:
         try:
-            wazuh_transport = await stack.enter_async_context(stdio_client(wazuh_server_params))
+            wazuh_transport = await stack.enter_async_context(stdio_client(wazuh_server_params_for(alert_file)))
             wazuh_session = await stack.enter_async_context(ClientSession(wazuh_transport[0], wazuh_transport[1]))
             await wazuh_session.initialize()
-            
-            mitre_transport = await stack.enter_async_context(stdio_client(mitre_server_params))
-            mitre_session = await stack.enter_async_context(ClientSession(mitre_transport[0], mitre_transport[1]))
-            await mitre_session.initialize()
         except Exception as e:
-            print(f"[-] Could not connect to MCP servers: {e}")
+            log(f"[-] Could not connect to the Wazuh MCP server: {e}")
             return
-            
-        agent = build_react_agent(wazuh_session, mitre_session, selected_model)
-        
-        # System prompt EXACTLY mirroring app.py
-        system_prompt = SystemMessage(content='''You are an elite Cybersecurity SOC Analyst Assistant.
-        
-You are equipped with tools to fetch alerts and playbooks.
-
-YOUR OBJECTIVE:
-1. First, call `fetch_wazuh_alerts` to see current incidents.
-2. Read the returned alert CAREFULLY. Note the EXACT MITRE technique ID and the source IP given in the JSON.
-3. Call `get_tier1_playbook` passing the precise technique ID discovered in step 2. You MUST NOT assume the ID is T1110. Use the one you just read.
-4. If the Tier 1 playbook is NOT found (returns an error/not found message), you MUST call `get_tier2_mitre_data` with the technique ID to get the official MITRE mitigation steps.
-5. Once you have the playbook or mitigation information from ANY tier, write a final comprehensive SOC report for the human analyst focusing on the exact technique ID and attack type returned.
-
-CRITICAL RULES FOR TOOL CALLING:
-- You must use the native tool calling capability.
-- When calling ANY playbook or MITRE tool, you MUST use the exact parameter name: `technique_id`.
-- DO NOT output a tool call as plain text or JSON in your response message.
-- DO NOT say "I will now call the tool...". If you need to use a tool, invoke it directly without any conversational text.
-- Your final report MUST be a standalone, complete document. You MUST rewrite the incident details, IP, and the playbook steps precisely inside your final message. DO NOT just say "see the playbook above".
-- Once you have the playbook data from the tools, synthesize everything into a well-formatted Markdown report.
-- If BOTH Tier 1 and Tier 2 tools fail to find data, and you must rely entirely on your own internal knowledge (Tier 3) to generate mitigations, you MUST add a clear WARNING to the report stating this. DO NOT add this warning if Tier 1 returned a valid playbook or Tier 2 returned valid MITRE data.
-''')
-
-        for file in os.listdir(scenarios_dir):
-            if not file.endswith(".json"):
-                continue
-                
+
+        config = run_config(wazuh_session, mitre_session, recursion_limit=15, parallel_tool_calls=parallel_tool_calls)
+
+        while True:
+            try:
+                file = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
             filepath = os.path.join(scenarios_dir, file)
-            print(f"[*] Evaluating scenario: {file}")
-            
-            # Inject into alert.json so 'fetch_wazuh_alerts' MCP tool picks it up
-            shutil.copy(filepath, "alert.json")
-            
-            with open(filepath, 'r') as f:
-                injected_log = json.load(f)
-                
+            log(f"[*] Evaluating scenario: {file}")
+
+            injected_log = {}
+
             # Prepare state mimicking app.py interaction
-            state = {
-                "messages": [
-                    system_prompt, 
-                    HumanMessage(content=f"[{datetime.now()}] Start the autonomous triage process. You MUST call `fetch_wazuh_alerts` NOW to get the latest alert data, do not assume or invent anything.")
-                ]
-            }
-            
+            state = {"messages": triage_messages()}
+
             final_report = "ERROR_NO_RESPONSE"
             agent_steps = []
-            
+            routing = []
+            stats = {}
+
+            # Benchmark mode: time every node, MCP tool call and LLM call of this run
+            bench = BenchmarkCallback() if benchmark else None
+            run_cfg = {**config, "callbacks": [bench]} if bench else config
+
             # Run LangGraph execution using ainvoke to capture the exact final outcome directly
-            print(f"    - Running agent stream...")
             try:
-                final_state = await agent.ainvoke(state, {"recursion_limit": 15})
-                
-                # Parse the final state strictly to pull the actual history and the final report
-                for message in final_state["messages"][2:]: # Skip system prompt and human start prompt
-                    if getattr(message, "tool_calls", None):
-                        for tc in message.tool_calls:
-                            step = f"Tool Call: {tc['name']} (args: {tc['args']})"
-                            print(f"      > {step}")
-                            agent_steps.append(step)
-                    elif message.type == "tool":
-                        step = f"Tool Result: {message.name} => {str(message.content)[:100]}..."
-                        print(f"      > {step}")
-                        agent_steps.append(step)
-                    elif message.type == "human" and message.content.startswith("System Error"):
-                        step = f"Correction Triggered: {message.content}"
-                        print(f"      > {step}")
-                        agent_steps.append(step)
-                
-                # The final message is guaranteed to be the AI's last report before graph __end__
-                final_report = final_state["messages"][-1].content
-                            
+                # Inject into this worker's alert file so its 'fetch_wazuh_alerts' MCP tool picks it up
+                with open(filepath, 'r') as f:
+                    scenario = json.load(f)
+                if not isinstance(scenario, dict):
+                    raise ValueError("scenario is not a JSON alert object")
+                injected_log = scenario
+                shutil.copy(filepath, alert_file)
+
+                # One trace per scenario run (see tracing.py)
+                started = time.perf_counter()
+                with tracer.span("triage.run", scenario=file, worker=worker_id):
+                    final_state = await agent.ainvoke(state, run_cfg)
+                agent_steps, routing, final_report = summarize_run(final_state, log)
+                stats = run_stats(final_state, time.perf_counter() - started)
             except Exception as e:
-                final_report = f"EXECUTION_ERROR: {str(e)}"
-                print(f"      > ERROR: {e}")
-                
-            results.append({
+                final_report = f"{EXECUTION_ERROR}: {str(e)}"
+                log(f"  > ERROR: {e}")
+
+            record = {
                 "Filename": file,
                 "Injected Rule": str(injected_log.get("rule", {}).get("description", "Unknown")),
                 "Agent Steps": "\n".join(agent_steps),
-                "Final Agent Output": final_report
-            })
-            
-    # Exporting
-    out_file = "evaluation_results_month6.json"
-    with open(out_file, "w", encoding="utf-8") as f:
+                "Model Routing": routing,
+                "Final Agent Output": final_report,
+                "Techniques": len(Alert.from_dict(injected_log).mitre_ids),
+                **stats,
+            }
+            if stats:
+                log(f"  > {stats['Agent Turns']} agent turns, {stats['Tool Calls']} tool calls "
+                    f"(max {stats['Max Parallel Tool Calls']} parallel), {stats['Elapsed Seconds']}s")
+            if bench:
+                bench.finish()
+                record["Technique"] = Alert.from_dict(injected_log).primary_technique or "Unknown"
+                record["Benchmark"] = bench.to_record()
+                log(f"  > Timing: {record['Benchmark']['total_seconds']}s total, "
+                    f"{record['Benchmark']['correction_loops']} correction loops")
+            append_record(results_file, record)
+            done_counter[0] += 1
+            log(f"[+] Recorded {file} ({done_counter[0]}/{done_counter[1]})")
+            queue.task_done()
+
+async def evaluate_agent(scenarios_dir="scenarios", workers=4, selected_model="llama3.1:latest",
+                         results_file="evaluation_results.jsonl", summary_file="evaluation_results_month6.json",
+                         fresh=False, benchmark=False, benchmark_file="benchmark_summary.json", parallel_tool_calls=True):
+    """
+    Runs every scenario in `scenarios_dir` through the agent with a pool of `workers`.
+    Results stream to `results_file` (JSONL) as each scenario finishes; scenarios already
+    in it are skipped (except EXECUTION_ERROR ones, which are retried), so an interrupted
+    sweep resumes where it stopped. The combined
+    `summary_file` (the original JSON array format) is rewritten at the end.
+    With `benchmark=True`, each record also carries per-node/tool/LLM timings and a
+    p50/p95/p99 summary per model and per technique is written to `benchmark_file`.
+    With `parallel_tool_calls=False` the agent executes one tool call per turn (the baseline
+    the step counts of multi-technique alerts are compared against).
+    """
+    if fresh and os.path.exists(results_file):
+        os.remove(results_file)
+
+    recorded = load_recorded(results_file)
+    scenario_files = sorted(f for f in os.listdir(scenarios_dir) if f.endswith(".json"))
+    pending = [f for f in scenario_files if f not in recorded or is_failed(recorded[f])]
+    retried = sum(1 for f in pending if f in recorded)
+    print(f"[*] {len(scenario_files)} scenarios, {len(scenario_files) - len(pending)} already recorded, "
+          f"{len(pending)} to run ({retried} failed previously).")
+
+    if pending:
+        # Load (and keep resident) every model the router may pick, so scenario 1 doesn't pay load time.
+        # The offline fake backend never contacts Ollama.
+        if not use_fake_llm(selected_model):
+            print("[*] Warming up Ollama models...")
+            OllamaWarmupManager().preload_all([selected_model, load_routing_config()["small_model"]])
+
+        print("[*] Initializing MCP connections...")
+        async with AsyncExitStack() as stack:
+            try:
+                # A single MITRE server is shared by all workers (lookups are read-only);
+                # MITRE_MCP_URL points at an already-running one instead of spawning it
+                mitre_session = await connect_mcp(stack, "mitre", mitre_server_params)
+            except Exception as e:
+                print(f"[-] Could not connect to MCP servers: {e}")
+                return
+
+            agent = get_react_agent(selected_model)
+
+            queue = asyncio.Queue()
+            for file in pending:
+                queue.put_nowait(file)
+
+            done_counter = [0, len(pending)]
+            worker_count = max(1, min(workers, len(pending)))
+            await asyncio.gather(*(
+                evaluation_worker(i, queue, agent, mitre_session, scenarios_dir, results_file, done_counter, benchmark,
+                                  parallel_tool_calls)
+                for i in range(worker_count)
+            ))
+
+    # Exporting (combined view in the original format, in scenario order)
+    recorded = load_recorded(results_file)
+    results = [recorded[f] for f in scenario_files if f in recorded]
+    with open(summary_file, "w", encoding="utf-8") as f:
         json.dump(results, f, indent=4, ensure_ascii=False)
-    print(f"[+] Evaluation complete. Results saved to {out_file}")
+    print(f"[+] Evaluation complete. {len(results)} results streamed to {results_file}, summary saved to {summary_file}")
+    print(format_step_summary(results))
+
+    if benchmark:
+        bench_summary = summarize(
+            {"technique": r.get("Technique"), "benchmark": r["Benchmark"]} for r in results if "Benchmark" in r
+        )
+        with open(benchmark_file, "w", encoding="utf-8") as f:
+            json.dump(bench_summary, f, indent=4)
+        print(format_summary(bench_summary))
+        print(f"[+] Benchmark summary saved to {benchmark_file}")
 
 if __name__ == "__main__":
-    if not os.path.exists("scenarios"):
+    parser = argparse.ArgumentParser(description="Run the triage agent over a directory of alert scenarios.")
+    parser.add_argument("--scenarios-dir", default="scenarios")
+    parser.add_argument("--workers", type=int, default=4, help="Scenarios evaluated concurrently")
+    # Matches the Streamlit UI screenshot to ensure identical behavior
+    parser.add_argument("--model", default="llama3.1:latest")
+    parser.add_argument("--results", default="evaluation_results.jsonl", help="Streamed per-scenario results (resume source)")
+    parser.add_argument("--summary", default="evaluation_results_month6.json", help="Combined JSON written at the end")
+    parser.add_argument("--fresh", action="store_true", help="Discard previously recorded results instead of resuming")
+    parser.add_argument("--benchmark", action="store_true", help="Record per-node, per-tool and per-LLM-call timings")
+    parser.add_argument("--benchmark-summary", default="benchmark_summary.json")
+    parser.add_argument("--sequential-lookups", action="store_true",
+                        help="Execute one tool call per agent turn (baseline for the parallel multi-technique lookups)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.scenarios_dir):
         print("Scenarios directory not found.")
         sys.exit(1)
-        
+
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     try:
-        loop.run_until_complete(evaluate_agent())
+        loop.run_until_complete(evaluate_agent(
+            scenarios_dir=args.scenarios_dir,
+            workers=args.workers,
+            selected_model=args.model,
+            results_file=args.results,
+            summary_file=args.summary,
+            fresh=args.fresh,
+            benchmark=args.benchmark,
+            benchmark_file=args.benchmark_summary,
+            parallel_tool_calls=not args.sequential_lookups,
+        ))
     except KeyboardInterrupt:
         pass
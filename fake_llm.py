@@ -0,0 +1,457 @@
+# fake_llm.py
+"""
+Deterministic local LLM stand-in for offline benchmarking (no GPU, no network).
+
+The scripted policy plays the triage conversation the way a well-behaved model would:
+fetch the alert -> Tier 1 playbook for each of its techniques (parallel calls in one
+turn) -> Tier 2 for the techniques Tier 1 missed -> final Markdown report. With `hallucination_rate` > 0 it sometimes answers a tool step
+with a plain-text JSON "tool call" instead of a native one, which exercises the
+agent's correction_node exactly like a misbehaving small model does. Whether a given
+step hallucinates depends only on the seed, the step and the tool results so far (not on
+the timestamped start message), so runs are repeatable.
+
+Two ways to use it:
+
+1. In-process, in place of ChatOllama: set LLM_BACKEND=fake (every model name the agent
+   or router asks for is served by ScriptedChatModel) or select a model named "fake:<x>".
+   FAKE_LLM_TOKEN_LATENCY / FAKE_LLM_FIRST_TOKEN_LATENCY / FAKE_LLM_HALLUCINATION_RATE /
+   FAKE_LLM_SEED configure it.
+
+2. As an Ollama-compatible HTTP endpoint (/api/chat, /api/generate, /api/tags, ...):
+
+       python fake_llm.py --port 11435 --token-latency 0.005 --hallucination-rate 0.1
+       OLLAMA_HOST=http://localhost:11435 streamlit run app.py
+"""
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import asyncio
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from alert_model import Alert
+
+FAKE_MODEL_NAMES = ["fake-small", "fake-large"]
+
+TIER1_MISS_MARKERS = ("❌", "Error", "O servidor MCP devolveu um erro")
+
+# ==========================================
+# Scripted Triage Policy
+# ==========================================
+def _count_tokens(text: str) -> int:
+    # Rough whitespace tokenization; only used for latency simulation and fake usage stats
+    return max(1, len(text.split())) if text else 0
+
+def _stable_fraction(*parts: str) -> float:
+    """Deterministic value in [0, 1) derived from the inputs (str hash() is salted per process)."""
+    return zlib.crc32("\x1f".join(parts).encode("utf-8")) / 2**32
+
+class ScriptedTriagePolicy:
+    """
+    Decides the next assistant turn from a normalized conversation:
+    a list of {"role", "content", "tool_calls": [{"name", "args"}], "name"} dicts,
+    where tool results carry the tool name in "name".
+    """
+
+    def __init__(self, hallucination_rate: float = 0.0, seed: int = 0):
+        self.hallucination_rate = hallucination_rate
+        self.seed = seed
+
+    @staticmethod
+    def _tool_results(messages, name):
+        return [m["content"] for m in messages if m["role"] == "tool" and m.get("name") == name]
+
+    @staticmethod
+    def _called(messages, name) -> bool:
+        return any(tc["name"] == name for m in messages for tc in m.get("tool_calls") or [])
+
+    @staticmethod
+    def _lookups(messages, name) -> Dict[str, str]:
+        """technique_id -> result of every `name` call so far (results follow the calls' order)."""
+        calls = [str(tc["args"].get("technique_id", "")) for m in messages for tc in m.get("tool_calls") or [] if tc["name"] == name]
+        return dict(zip(calls, ScriptedTriagePolicy._tool_results(messages, name)))
+
+    @staticmethod
+    def _alert(messages) -> Dict[str, Any]:
+        for content in ScriptedTriagePolicy._tool_results(messages, "fetch_wazuh_alerts"):
+            try:
+                alerts = json.loads(content)
+                return (alerts[0] if isinstance(alerts, list) else alerts) or {}
+            except (ValueError, IndexError, TypeError):
+                continue
+        return {}
+
+    @staticmethod
+    def _technique_ids(alert) -> List[str]:
+        return list(Alert.from_dict(alert).mitre_ids)
+
+    def _should_hallucinate(self, messages) -> bool:
+        if self.hallucination_rate <= 0:
+            return False
+        # Never hallucinate twice in a row: the correction prompt "fixes" the model
+        last = messages[-1] if messages else {}
+        if last.get("role") == "user" and str(last.get("content", "")).startswith("System Error"):
+            return False
+        # Only stable inputs: the step and the tool results (the start message carries a timestamp)
+        step = sum(1 for m in messages if m["role"] == "assistant")
+        fingerprint = "|".join(f"{m.get('name')}:{str(m.get('content', ''))[:200]}" for m in messages if m["role"] == "tool")
+        return _stable_fraction(str(self.seed), str(step), fingerprint) < self.hallucination_rate
+
+    def next_turn(self, messages: List[Dict[str, Any]], tool_names: List[str]) -> Dict[str, Any]:
+        """Returns {"content": str, "tool_calls": [{"name", "args"}]}."""
+        alert = self._alert(messages)
+        technique_ids = self._technique_ids(alert)
+        tier1 = self._lookups(messages, "get_tier1_playbook")
+        calls = []
+
+        # Every technique still missing a lookup is requested in the same turn
+        if "fetch_wazuh_alerts" in tool_names and not self._called(messages, "fetch_wazuh_alerts"):
+            calls = [{"name": "fetch_wazuh_alerts", "args": {}}]
+        elif "get_tier1_playbook" in tool_names and technique_ids:
+            calls = [{"name": "get_tier1_playbook", "args": {"technique_id": t}} for t in technique_ids if t not in tier1]
+        if not calls and "get_tier2_mitre_data" in tool_names and technique_ids:
+            tier2 = self._lookups(messages, "get_tier2_mitre_data")
+            missed = [t for t in technique_ids if t in tier1 and tier1[t].startswith(TIER1_MISS_MARKERS) and t not in tier2]
+            calls = [{"name": "get_tier2_mitre_data", "args": {"technique_id": t}} for t in missed]
+
+        if calls:
+            if self._should_hallucinate(messages):
+                # Plain-text JSON instead of a native tool call (what correction_node catches)
+                return {"content": json.dumps({"name": calls[0]["name"], "parameters": calls[0]["args"]}), "tool_calls": []}
+            return {"content": "", "tool_calls": calls}
+
+        return {"content": self._report(messages, alert, technique_ids), "tool_calls": []}
+
+    def _report(self, messages, alert, technique_ids) -> str:
+        if not any(m["role"] == "tool" for m in messages):
+            # Plain chat (e.g. the Static RAG chatbot): echo a grounded, deterministic answer
+            question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+            return f"Scripted answer ({_count_tokens(question)} question tokens): review the alert, contain the source and follow the playbook."
+
+        rule = alert.get("rule", {})
+        technique = ", ".join(technique_ids) or "Unknown"
+        tier1 = self._lookups(messages, "get_tier1_playbook")
+        tier2 = self._lookups(messages, "get_tier2_mitre_data")
+        # First tier that answered, per technique, in the alert's order
+        found = []
+        for t in technique_ids:
+            answer = next((r for r in (tier1.get(t), tier2.get(t)) if r and not r.startswith(TIER1_MISS_MARKERS)), None)
+            if answer:
+                found.append(answer)
+        guidance = "\n\n".join(found) or None
+
+        lines = [
+            f"# SOC Triage Report: {technique}",
+            "",
+            f"**Incident:** {rule.get('description', 'Unknown alert')}",
+            f"**Severity (rule.level):** {rule.get('level', 'Unknown')}",
+            f"**Source IP:** {alert.get('src_ip', 'Unknown')}",
+            "",
+            "## Response Procedure",
+        ]
+        if guidance:
+            lines.append(guidance)
+        else:
+            lines += [
+                "**WARNING:** No Tier 1 playbook or Tier 2 MITRE data was found; the steps below come from the model's internal knowledge (Tier 3).",
+                "1. Contain the affected host and block the source IP.",
+                "2. Collect and preserve relevant logs.",
+                "3. Escalate to Tier 2 analysts for investigation.",
+            ]
+        return "\n".join(lines)
+
+def _ollama_metadata(model, prompt_tokens, completion_tokens, prefill_seconds, eval_seconds):
+    """Response metadata shaped like Ollama's, so benchmark.py can read it unchanged."""
+    return {
+        "model": model,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "done": True,
+        "done_reason": "stop",
+        "total_duration": int((prefill_seconds + eval_seconds) * 1e9),
+        "load_duration": 0,
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": int(prefill_seconds * 1e9),
+        "eval_count": completion_tokens,
+        "eval_duration": int(eval_seconds * 1e9),
+    }
+
+def _chunks(text: str) -> List[str]:
+    # Whitespace-preserving word chunks, one simulated token each
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+def _paced(text: str, first_token_latency: float, token_latency: float) -> Iterator[tuple]:
+    """
+    Simulated decoding schedule shared by every output path (sync, async, HTTP stream):
+    yields (delay, None) for the prefill, then (delay, piece) per token. The caller sleeps
+    `delay` with time.sleep or asyncio.sleep and then emits the piece.
+    """
+    yield first_token_latency, None
+    for piece in _chunks(text):
+        yield token_latency, piece
+
+# ==========================================
+# LangChain Chat Model (in place of ChatOllama)
+# ==========================================
+def _normalize_langchain(messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+    role_map = {"system": "system", "human": "user", "ai": "assistant", "tool": "tool"}
+    return [
+        {
+            "role": role_map.get(m.type, m.type),
+            "content": m.content if isinstance(m.content, str) else json.dumps(m.content),
+            "tool_calls": [{"name": tc["name"], "args": tc["args"]} for tc in getattr(m, "tool_calls", None) or []],
+            "name": getattr(m, "name", None),
+        }
+        for m in messages
+    ]
+
+class ScriptedChatModel(BaseChatModel):
+    """Drop-in ChatOllama replacement driven by ScriptedTriagePolicy."""
+
+    model: str = "fake-large"
+    token_latency: float = 0.0
+    first_token_latency: float = 0.0
+    hallucination_rate: float = 0.0
+    seed: int = 0
+    bound_tools: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake-ollama"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model}
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        params = super()._get_ls_params(stop=stop, **kwargs)
+        params["ls_model_name"] = self.model
+        return params
+
+    def bind_tools(self, tools, **kwargs):
+        names = [getattr(t, "name", None) or t.get("name") for t in tools]
+        return self.model_copy(update={"bound_tools": names})
+
+    def _turn(self, messages):
+        normalized = _normalize_langchain(messages)
+        output = ScriptedTriagePolicy(self.hallucination_rate, self.seed).next_turn(normalized, self.bound_tools)
+        prompt_tokens = sum(_count_tokens(m["content"]) for m in normalized)
+        return output, prompt_tokens
+
+    def _message(self, output, prompt_tokens, prefill_seconds, eval_seconds):
+        completion_tokens = _count_tokens(output["content"] or json.dumps(output["tool_calls"]))
+        return AIMessage(
+            content=output["content"],
+            tool_calls=[{"name": tc["name"], "args": tc["args"], "id": f"call_{i}"} for i, tc in enumerate(output["tool_calls"])],
+            response_metadata=_ollama_metadata(self.model, prompt_tokens, completion_tokens, prefill_seconds, eval_seconds),
+            usage_metadata={"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        output, prompt_tokens = self._turn(messages)
+        pieces = 0
+        for delay, piece in _paced(output["content"], self.first_token_latency, self.token_latency):
+            if delay:
+                time.sleep(delay)
+            if piece is not None:
+                pieces += 1
+                if run_manager:
+                    run_manager.on_llm_new_token(piece)
+        message = self._message(output, prompt_tokens, self.first_token_latency, self.token_latency * pieces)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        output, prompt_tokens = self._turn(messages)
+        pieces = 0
+        for delay, piece in _paced(output["content"], self.first_token_latency, self.token_latency):
+            if delay:
+                await asyncio.sleep(delay)
+            if piece is not None:
+                pieces += 1
+                if run_manager:
+                    await run_manager.on_llm_new_token(piece)
+        message = self._message(output, prompt_tokens, self.first_token_latency, self.token_latency * pieces)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        result = self._generate(messages, stop=stop, **kwargs)
+        message = result.generations[0].message
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content=message.content,
+            tool_call_chunks=[{"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+                              for i, tc in enumerate(message.tool_calls)],
+            response_metadata=message.response_metadata,
+        ))
+
+def fake_llm_from_env(model: str) -> ScriptedChatModel:
+    """Builds the stand-in for `model` from the FAKE_LLM_* environment variables."""
+    return ScriptedChatModel(
+        model=model,
+        token_latency=float(os.getenv("FAKE_LLM_TOKEN_LATENCY", "0")),
+        first_token_latency=float(os.getenv("FAKE_LLM_FIRST_TOKEN_LATENCY", "0")),
+        hallucination_rate=float(os.getenv("FAKE_LLM_HALLUCINATION_RATE", "0")),
+        seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+    )
+
+def use_fake_llm(model: str) -> bool:
+    return os.getenv("LLM_BACKEND", "ollama").lower() == "fake" or model.startswith("fake:")
+
+# ==========================================
+# Ollama-compatible HTTP Endpoint
+# ==========================================
+def _normalize_ollama(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Ollama tool messages don't always carry the tool name: recover it from the preceding calls."""
+    normalized, pending = [], []
+    for m in messages:
+        tool_calls = [
+            {"name": tc.get("function", {}).get("name"), "args": tc.get("function", {}).get("arguments") or {}}
+            for tc in m.get("tool_calls") or []
+        ]
+        if m.get("role") == "assistant" and tool_calls:
+            pending = [tc["name"] for tc in tool_calls]
+        name = m.get("tool_name") or m.get("name")
+        if m.get("role") == "tool" and not name and pending:
+            name = pending.pop(0)
+        normalized.append({"role": m.get("role"), "content": m.get("content") or "", "tool_calls": tool_calls, "name": name})
+    return normalized
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Implements the subset of the Ollama REST API used by app.py, the agent and the warm-up manager."""
+
+    server_version = "FakeOllama/1.0"
+    config: Dict[str, Any] = {}
+
+    def log_message(self, fmt, *args):
+        if self.config.get("verbose"):
+            sys.stderr.write(f"[FAKE OLLAMA] {fmt % args}\n")
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._json({"models": [{"name": m, "model": m, "size": 0, "details": {"family": "fake"}} for m in FAKE_MODEL_NAMES]})
+        elif self.path == "/api/ps":
+            self._json({"models": [{"name": m, "model": m} for m in FAKE_MODEL_NAMES]})
+        elif self.path == "/api/version":
+            self._json({"version": "0.0.0-fake"})
+        elif self.path == "/":
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"Ollama is running")
+        else:
+            self._json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        try:
+            request = self._read_body()
+        except ValueError:
+            return self._json({"error": "invalid JSON"}, status=400)
+
+        if self.path == "/api/chat":
+            messages = _normalize_ollama(request.get("messages") or [])
+            tool_names = [t.get("function", {}).get("name") for t in request.get("tools") or []]
+        elif self.path == "/api/generate":
+            if not request.get("prompt"):
+                # Empty prompt = load/unload request (warm-up manager)
+                return self._json({"model": request.get("model"), "response": "", "done": True, "done_reason": "load"})
+            messages = [{"role": "user", "content": request["prompt"], "tool_calls": [], "name": None}]
+            tool_names = []
+        elif self.path in ("/api/embed", "/api/embeddings"):
+            return self._json({"model": request.get("model"), "embeddings": [[0.0] * 8]})
+        else:
+            return self._json({"error": "not found"}, status=404)
+
+        self._respond(request, messages, tool_names)
+
+    def _respond(self, request, messages, tool_names):
+        cfg = self.config
+        policy = ScriptedTriagePolicy(cfg.get("hallucination_rate", 0.0), cfg.get("seed", 0))
+        output = policy.next_turn(messages, tool_names)
+        model = request.get("model") or FAKE_MODEL_NAMES[0]
+        prompt_tokens = sum(_count_tokens(m["content"]) for m in messages)
+        pieces = _chunks(output["content"])
+        first, per_token = cfg.get("first_token_latency", 0.0), cfg.get("token_latency", 0.0)
+        completion_tokens = _count_tokens(output["content"] or json.dumps(output["tool_calls"]))
+        final_meta = _ollama_metadata(model, prompt_tokens, completion_tokens, first, per_token * len(pieces))
+        tool_calls = [{"function": {"name": tc["name"], "arguments": tc["args"]}} for tc in output["tool_calls"]]
+        is_chat = self.path == "/api/chat"
+
+        def frame(text, done):
+            payload = {"model": model, "created_at": final_meta["created_at"], "done": done}
+            if is_chat:
+                payload["message"] = {"role": "assistant", "content": text}
+                if done and tool_calls:
+                    payload["message"]["tool_calls"] = tool_calls
+            else:
+                payload["response"] = text
+            if done:
+                payload.update({k: v for k, v in final_meta.items() if k not in payload})
+            return payload
+
+        if request.get("stream", True) is False:
+            time.sleep(first + per_token * len(pieces))
+            return self._json(frame(output["content"], True))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for delay, piece in _paced(output["content"], first, per_token):
+            if delay:
+                time.sleep(delay)
+            if piece is not None:
+                self.wfile.write((json.dumps(frame(piece, False)) + "\n").encode("utf-8"))
+                self.wfile.flush()
+        self.wfile.write((json.dumps(frame("", True)) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+def serve(host: str = "127.0.0.1", port: int = 11435, **config) -> ThreadingHTTPServer:
+    """Starts the fake Ollama endpoint on a background thread and returns the server."""
+    handler = type("ConfiguredFakeOllamaHandler", (FakeOllamaHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a deterministic, Ollama-compatible fake LLM.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per generated token")
+    parser.add_argument("--first-token-latency", type=float, default=0.0, help="Simulated prefill seconds")
+    parser.add_argument("--hallucination-rate", type=float, default=0.0, help="Share of tool steps answered with plain-text JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = serve(
+        args.host, args.port,
+        token_latency=args.token_latency,
+        first_token_latency=args.first_token_latency,
+        hallucination_rate=args.hallucination_rate,
+        seed=args.seed,
+        verbose=args.verbose,
+    )
+    print(f"[+] Fake Ollama listening on http://{args.host}:{args.port} (models: {', '.join(FAKE_MODEL_NAMES)})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
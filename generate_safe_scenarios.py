@@ -1,8 +1,14 @@
 import os
+import sys
+import gzip
 import json
 import random
+import argparse
+import multiprocessing
 from datetime import datetime, timedelta
 
+import requests
+
 # A list of MITRE ATT&CK techniques tailored for safe (virus-free) simulation
 TECHNIQUES = [
     {"id": "T1110.001", "name": "Password Guessing", "desc": "Failed login attempts (Brute Force)", "log": "Failed password for user {user} from {ip} port 22 ssh2"},
@@ -54,7 +60,235 @@ def generate_safe_scenarios(count=100):
             
     print(f"[+] Successfully generated {count} AV-friendly mock scenarios in '{scenarios_dir}'.")
 
+# =============================================================================
+# BULK MODE: millions of alerts as sharded, compact JSONL (for load testing)
+# =============================================================================
+
+MITRE_ATTACK_URL = "https://raw.githubusercontent.com/mitre-attack/attack-stix-data/master/enterprise-attack/enterprise-attack.json"
+TECHNIQUE_CACHE_FILE = os.path.join(".cache", "attack_techniques.json")
+
+# Fixed default window start, so bulk output depends only on the seed (replay_alerts.py
+# restamps alerts with the emit time unless --keep-timestamps)
+BULK_START = datetime(2025, 1, 1)
+
+# AV-safe log templates per ATT&CK tactic, used for techniques without a hand-written one
+TACTIC_LOGS = {
+    "reconnaissance": "Inbound probe from {ip} enumerating exposed services (Safe Simulation)",
+    "resource-development": "Newly registered domain contacted by {host} (Safe Simulation)",
+    "initial-access": "Suspicious inbound request from {ip} to public application (Safe Simulation)",
+    "execution": "cmd.exe /c echo {technique} Safe Simulation by {user}",
+    "persistence": "New autostart entry created by {user} on {host} (Safe Simulation)",
+    "privilege-escalation": "Token privilege change for {user} on {host} (Safe Simulation)",
+    "defense-evasion": "Security log configuration modified on {host} (Safe Simulation)",
+    "credential-access": "Credential store accessed by {user} from {ip} (Safe Simulation)",
+    "discovery": "whoami /all && net view executed by {user} (Safe Simulation)",
+    "lateral-movement": "Remote service session from {ip} to {host} as {user} (Safe Simulation)",
+    "collection": "Bulk file staging in temp directory on {host} (Safe Simulation)",
+    "command-and-control": "Periodic beacon-like connection from {host} to {ip} (Safe Simulation)",
+    "exfiltration": "Unusual outbound transfer volume from {host} to {ip} (Safe Simulation)",
+    "impact": "Mass file rename activity on {host} (Safe Simulation)",
+}
+
+# Campaigns walk the kill chain in this order
+KILL_CHAIN = list(TACTIC_LOGS)
+
+# Relative frequency of each episode type in bulk output
+EPISODE_WEIGHTS = {"noise": 0.55, "brute_force": 0.2, "scanner": 0.15, "campaign": 0.1}
+
+USERS = ["admin", "root", "jdoe", "asmith", "guest", "svc_account", "backup", "webadmin"]
+HOSTS = [f"{prefix}-{i:02d}" for prefix in ("web", "db", "ws", "dc", "app") for i in range(1, 21)]
+
+def _techniques_from_stix(data):
+    techniques = []
+    for obj in data.get("objects", []):
+        if obj.get("type") != "attack-pattern" or obj.get("revoked") or obj.get("x_mitre_deprecated"):
+            continue
+        for ref in obj.get("external_references", []):
+            if ref.get("source_name") == "mitre-attack" and ref.get("external_id"):
+                techniques.append({
+                    "id": ref["external_id"],
+                    "name": obj.get("name", "Unknown"),
+                    "tactics": [phase["phase_name"] for phase in obj.get("kill_chain_phases", [])],
+                })
+                break
+    return techniques
+
+def load_attack_techniques(stix_file=None):
+    """
+    The full enterprise ATT&CK technique list (id, name, tactics). Read from a local STIX
+    file, the on-disk cache, or downloaded once and cached. Falls back to TECHNIQUES offline.
+    """
+    if stix_file:
+        with open(stix_file, "r", encoding="utf-8") as f:
+            return _techniques_from_stix(json.load(f))
+    if os.path.exists(TECHNIQUE_CACHE_FILE):
+        with open(TECHNIQUE_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    try:
+        print("[*] Downloading MITRE ATT&CK technique list...")
+        response = requests.get(MITRE_ATTACK_URL, timeout=60)
+        response.raise_for_status()
+        techniques = _techniques_from_stix(response.json())
+        os.makedirs(os.path.dirname(TECHNIQUE_CACHE_FILE), exist_ok=True)
+        with open(TECHNIQUE_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(techniques, f)
+        return techniques
+    except Exception as e:
+        print(f"[-] Could not download ATT&CK ({e}); using the {len(TECHNIQUES)} built-in techniques.")
+        return [{"id": t["id"], "name": t["name"], "tactics": []} for t in TECHNIQUES]
+
+class AlertFactory:
+    """Builds alerts for one shard. Deterministic for a given seed and start."""
+
+    def __init__(self, techniques, seed, start, span_seconds, shard):
+        self.rng = random.Random(seed)
+        self.techniques = techniques
+        self.by_tactic = {}
+        for tech in techniques:
+            for tactic in tech["tactics"]:
+                self.by_tactic.setdefault(tactic, []).append(tech)
+        self.templates = {t["id"]: t for t in TECHNIQUES}
+        self.start = start
+        self.span_seconds = span_seconds
+        self.shard = shard
+        self.serial = 0
+        # A few loud scanners and brute-forcers recur across the whole shard
+        self.scanners = [self.random_ip() for _ in range(5)]
+        self.brute_sources = [self.random_ip() for _ in range(20)]
+        self.find = {t["id"]: t for t in techniques}
+
+    def random_ip(self):
+        r = self.rng
+        return f"{r.randint(10, 192)}.{r.randint(1, 255)}.{r.randint(1, 255)}.{r.randint(1, 254)}"
+
+    def alert(self, tech, ts, level, src_ip, host, user, episode, campaign=None):
+        self.serial += 1
+        template = self.templates.get(tech["id"])
+        if template:
+            log, desc = template["log"], template["desc"]
+        else:
+            tactic = tech["tactics"][0] if tech["tactics"] else "execution"
+            log, desc = TACTIC_LOGS.get(tactic, TACTIC_LOGS["execution"]), tech["name"]
+        alert = {
+            "id": f"{self.shard:04d}-{self.serial:09d}",
+            "timestamp": ts.strftime("%Y-%m-%dT%H:%M:%S.") + f"{ts.microsecond // 1000:03d}+0000",
+            "rule": {
+                "level": level,
+                "description": f"Simulation: {desc}",
+                "mitre": {"id": [tech["id"]], "technique": [tech["name"]], "tactic": tech["tactics"]},
+            },
+            "agent": {"name": host},
+            "src_ip": src_ip,
+            "full_log": log.replace("{user}", user).replace("{ip}", src_ip).replace("{host}", host).replace("{technique}", tech["id"]),
+            "episode": episode,
+        }
+        if campaign:
+            alert["campaign"] = campaign
+        return alert
+
+    def technique(self, tech_id):
+        return self.find.get(tech_id) or self.find.get(tech_id.split(".")[0]) or self.rng.choice(self.techniques)
+
+    def episode(self):
+        """One burst of related alerts: background noise, a brute force, a scanner sweep or a campaign."""
+        r = self.rng
+        kind = r.choices(list(EPISODE_WEIGHTS), list(EPISODE_WEIGHTS.values()))[0]
+        ts = self.start + timedelta(seconds=r.uniform(0, self.span_seconds))
+        host = r.choice(HOSTS)
+
+        if kind == "noise":
+            yield self.alert(r.choice(self.techniques), ts, r.randint(3, 8), self.random_ip(), host, r.choice(USERS), kind)
+        elif kind == "brute_force":
+            # Repeated source: dozens of failures within seconds, rule level escalating with volume
+            tech, src, user = self.technique("T1110.001"), r.choice(self.brute_sources), r.choice(USERS)
+            for i in range(r.randint(10, 60)):
+                ts += timedelta(milliseconds=r.randint(50, 1500))
+                yield self.alert(tech, ts, min(5 + i // 8, 12), src, host, user, kind)
+        elif kind == "scanner":
+            # Noisy scanner: one source sweeping many hosts, low level
+            tech, src = self.technique(r.choice(["T1595", "T1046"])), r.choice(self.scanners)
+            for _ in range(r.randint(20, 120)):
+                ts += timedelta(milliseconds=r.randint(5, 200))
+                yield self.alert(tech, ts, r.randint(3, 6), src, r.choice(HOSTS), "-", kind)
+        else:
+            # Campaign: one actor walking the kill chain over minutes to hours, levels rising
+            campaign = f"campaign-{self.shard:04d}-{self.serial:09d}"
+            src, user = self.random_ip(), r.choice(USERS)
+            stages = sorted(r.sample(range(len(KILL_CHAIN)), r.randint(3, 8)))
+            for depth, stage in enumerate(stages):
+                candidates = self.by_tactic.get(KILL_CHAIN[stage]) or self.techniques
+                ts += timedelta(seconds=r.randint(30, 1800))
+                yield self.alert(r.choice(candidates), ts, min(8 + depth, 15), src, host, user, kind, campaign)
+
+def _write_shard(task):
+    shard, count, seed, out_dir, techniques, start, span_seconds, compress = task
+    factory = AlertFactory(techniques, seed, start, span_seconds, shard)
+    path = os.path.join(out_dir, f"alerts_{shard:04d}.jsonl" + (".gz" if compress else ""))
+    opener = gzip.open if compress else open
+    dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+    written, buffer = 0, []
+    with opener(path, "wt", encoding="utf-8") as f:
+        while written < count:
+            for alert in factory.episode():
+                buffer.append(dumps(alert))
+                written += 1
+                if written >= count:
+                    break
+            # Bulk writes: one syscall per ~10k alerts instead of one file per alert
+            if len(buffer) >= 10000:
+                f.write("\n".join(buffer) + "\n")
+                buffer.clear()
+        if buffer:
+            f.write("\n".join(buffer) + "\n")
+    return path, written
+
+def generate_bulk_alerts(total, out_dir="bulk_alerts", shard_size=250000, processes=None, seed=42,
+                         days=30, stix_file=None, compress=False, start=BULK_START):
+    """
+    Writes `total` alerts as compact JSONL shards of `shard_size` lines into `out_dir`,
+    one shard per worker process task. Timestamps fall in [`start`, `start` + `days`), so
+    the same seed and start give the same shards. Returns the list of shard paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    techniques = load_attack_techniques(stix_file)
+    span_seconds = days * 86400
+
+    tasks = []
+    for shard, offset in enumerate(range(0, total, shard_size)):
+        tasks.append((shard, min(shard_size, total - offset), seed * 100003 + shard, out_dir, techniques, start, span_seconds, compress))
+
+    print(f"[*] Generating {total} alerts over {len(techniques)} techniques in {len(tasks)} shards...")
+    started = datetime.now()
+    with multiprocessing.Pool(processes or os.cpu_count()) as pool:
+        results = []
+        for path, written in pool.imap_unordered(_write_shard, tasks):
+            results.append(path)
+            print(f"  [+] {path}: {written} alerts")
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"[+] Wrote {total} alerts to '{out_dir}' in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} alerts/s).")
+    return sorted(results)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate AV-safe, MITRE-mapped mock alerts.")
+    parser.add_argument("--count", type=int, default=100, help="Individual scenario files to write (default mode)")
+    parser.add_argument("--bulk", type=int, default=None, help="Write this many alerts as sharded JSONL instead")
+    parser.add_argument("--out-dir", default="bulk_alerts")
+    parser.add_argument("--shard-size", type=int, default=250000)
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=30, help="Time window the alerts are spread over")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=BULK_START,
+                        help=f"Start of the time window, ISO format (default: {BULK_START.date()})")
+    parser.add_argument("--stix-file", default=None, help="Local enterprise-attack.json instead of downloading")
+    parser.add_argument("--gzip", action="store_true", help="Compress shards")
+    args = parser.parse_args()
+
+    if args.bulk:
+        generate_bulk_alerts(args.bulk, args.out_dir, args.shard_size, args.processes, args.seed,
+                             args.days, args.stix_file, args.gzip, args.start)
+        sys.exit(0)
+
     # Remove old MORDOR corrupted files if they exist to prevent evaluation script crashes
     for file in os.listdir("scenarios"):
         if file.startswith("alert_mordor_"):
@@ -62,5 +296,5 @@ if __name__ == "__main__":
                 os.remove(os.path.join("scenarios", file))
             except:
                 pass
-                
-    generate_safe_scenarios(100)
\ No newline at end of file
+
+    generate_safe_scenarios(args.count)
\ No newline at end of file
@@ -0,0 +1,298 @@
+# load_test.py
+"""
+Concurrent load generator for the MCP servers.
+
+Opens `--clients` ClientSessions (a sweep, e.g. `--clients 1 8 32`) against
+wazuh_server.py and mitre_server.py and drives a weighted mix of tool calls for
+`--duration` seconds per concurrency level. Alert fetches that hit the Wazuh API go to a
+local mock API (MockWazuhAPI below), so no Wazuh Manager is needed.
+
+Reports, per level: throughput, p50/p95/p99 latency (overall and per tool), error rate
+and server RSS sampled over time. Examples:
+
+    python load_test.py --transport streamable-http --clients 1 8 32 --duration 20
+    python load_test.py --transport stdio --clients 4 --mix get_playbook=1,get_latest_alerts=1
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from contextlib import AsyncExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from mcp import StdioServerParameters
+from mcp_transport import TRANSPORTS, open_session
+from compare_transports import free_port, start_server, tree_rss
+from benchmark import distribution
+from metrics import is_error_result
+
+# Tool -> server that provides it
+TOOL_SERVERS = {
+    "get_playbook": "mitre",
+    "get_tier2_mitre_data": "mitre",
+    "get_full_context": "mitre",
+    "get_latest_alerts": "wazuh",
+    "get_real_wazuh_alerts": "wazuh",
+}
+SERVER_SCRIPTS = {"wazuh": "wazuh_server.py", "mitre": "mitre_server.py"}
+
+DEFAULT_MIX = "get_playbook=4,get_tier2_mitre_data=3,get_full_context=2,get_latest_alerts=1,get_real_wazuh_alerts=1"
+
+# Mix of techniques with and without a Tier 1 playbook
+TECHNIQUE_IDS = ["T1110", "T1059", "T1595", "T1098", "T1190", "T1053", "T1078", "T1003", "T1046", "T1021"]
+
+# ==========================================
+# Mock Wazuh API
+# ==========================================
+class MockWazuhAPI:
+    """Minimal plain-HTTP stand-in for the Wazuh Manager API (authenticate, /alerts, /agents)."""
+
+    def __init__(self, scenarios_dir: str = "scenarios", port: Optional[int] = None):
+        self.port = port or free_port()
+        self.alerts = self._load_alerts(scenarios_dir)
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @staticmethod
+    def _load_alerts(scenarios_dir: str) -> List[Dict]:
+        alerts = []
+        if os.path.isdir(scenarios_dir):
+            for name in sorted(os.listdir(scenarios_dir)):
+                if name.endswith(".json"):
+                    with open(os.path.join(scenarios_dir, name), "r", encoding="utf-8") as f:
+                        alerts.append(json.load(f))
+        return alerts
+
+    def env(self) -> Dict[str, str]:
+        """Environment pointing wazuh_server.py at this mock."""
+        return {
+            "WAZUH_MANAGER_IP": "127.0.0.1",
+            "WAZUH_API_PORT": str(self.port),
+            "WAZUH_API_SCHEME": "http",
+        }
+
+    def start(self) -> "MockWazuhAPI":
+        alerts = self.alerts
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, payload, status=200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path.startswith("/security/user/authenticate"):
+                    self._send({"data": {"token": "mock-token"}, "error": 0})
+                else:
+                    self._send({"error": "not found"}, 404)
+
+            def do_GET(self):
+                if self.path.startswith("/alerts"):
+                    self._send({"data": {"affected_items": alerts, "total_affected_items": len(alerts)}, "error": 0})
+                elif self.path.startswith("/agents"):
+                    agent = {"id": "001", "name": "metasploitable", "ip": "10.0.0.5", "status": "active"}
+                    self._send({"data": {"affected_items": [agent], "total_affected_items": 1}, "error": 0})
+                else:
+                    self._send({"error": "not found"}, 404)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="mock-wazuh-api", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+
+# ==========================================
+# Load Generation
+# ==========================================
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in TOOL_SERVERS:
+            raise ValueError(f"Unknown tool in mix: {name} (choose from {', '.join(TOOL_SERVERS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+def tool_arguments(tool: str, rng: random.Random) -> Dict:
+    if TOOL_SERVERS[tool] == "mitre":
+        return {"technique_id": rng.choice(TECHNIQUE_IDS)}
+    if tool == "get_real_wazuh_alerts":
+        return {"limit": 10}
+    return {}
+
+async def _client(client_id, urls, stdio_params, mix, deadline, samples, ready, go, seed):
+    rng = random.Random(seed + client_id)
+    tools, weights = list(mix), list(mix.values())
+    async with AsyncExitStack() as stack:
+        sessions = {}
+        for server in {TOOL_SERVERS[t] for t in tools}:
+            sessions[server] = await open_session(stack, urls.get(server), stdio_params[server])
+        ready.release()
+        await go.wait()
+        while time.monotonic() < deadline[0]:
+            tool = rng.choices(tools, weights)[0]
+            started = time.perf_counter()
+            status = "ok"
+            try:
+                result = await sessions[TOOL_SERVERS[tool]].call_tool(tool, arguments=tool_arguments(tool, rng))
+                if result.isError:
+                    status = "error"
+                elif result.content and is_error_result(getattr(result.content[0], "text", None)):
+                    # The tool answered, but with its in-band failure message (e.g. MITRE data missing)
+                    status = "degraded"
+            except Exception:
+                status = "error"
+            samples.append({"t": time.monotonic(), "tool": tool, "seconds": time.perf_counter() - started, "status": status})
+
+async def _sample_memory(server_pids, timeline, interval, stop):
+    started = time.monotonic()
+    while not stop.is_set():
+        if server_pids:
+            memory = [tree_rss(pid) for pid in server_pids]
+            rss = sum(m["rss_bytes"] for m in memory)
+            processes = sum(m["processes"] for m in memory)
+        else:
+            # stdio: every server is a child of this process
+            memory = tree_rss(os.getpid(), include_root=False)
+            rss, processes = memory["rss_bytes"], memory["processes"]
+        timeline.append({"t": round(time.monotonic() - started, 2), "processes": processes, "rss_mb": round(rss / 2**20, 1)})
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_level(clients: int, duration: float, mix: Dict[str, float], urls: Dict[str, str],
+                    stdio_params: Dict[str, StdioServerParameters], server_pids: List[int],
+                    sample_interval: float = 1.0, seed: int = 7) -> Dict:
+    samples: List[Dict] = []
+    timeline: List[Dict] = []
+    ready = asyncio.Semaphore(0)
+    go = asyncio.Event()
+    stop = asyncio.Event()
+    deadline = [float("inf")]
+
+    tasks = [asyncio.create_task(_client(i, urls, stdio_params, mix, deadline, samples, ready, go, seed))
+             for i in range(clients)]
+    for _ in range(clients):
+        await ready.acquire()
+
+    sampler = asyncio.create_task(_sample_memory(server_pids, timeline, sample_interval, stop))
+    started = time.monotonic()
+    deadline[0] = started + duration
+    go.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+    stop.set()
+    await sampler
+
+    per_tool = {}
+    for tool in mix:
+        tool_samples = [s for s in samples if s["tool"] == tool]
+        per_tool[tool] = {
+            "calls": len(tool_samples),
+            "latency_seconds": distribution(s["seconds"] for s in tool_samples),
+            "errors": sum(1 for s in tool_samples if s["status"] == "error"),
+            "degraded": sum(1 for s in tool_samples if s["status"] == "degraded"),
+        }
+    errors = sum(1 for s in samples if s["status"] == "error")
+    return {
+        "clients": clients,
+        "seconds": round(elapsed, 2),
+        "calls": len(samples),
+        "calls_per_second": round(len(samples) / elapsed, 1) if elapsed else None,
+        "latency_seconds": distribution(s["seconds"] for s in samples),
+        "error_rate": round(errors / len(samples), 4) if samples else None,
+        "degraded_rate": round(sum(1 for s in samples if s["status"] == "degraded") / len(samples), 4) if samples else None,
+        "peak_rss_mb": max((p["rss_mb"] for p in timeline), default=None),
+        "per_tool": per_tool,
+        "rss_timeline": timeline,
+    }
+
+async def run_load_test(transport: str, levels: List[int], duration: float, mix: Dict[str, float],
+                        wazuh_url: Optional[str] = None, mitre_url: Optional[str] = None,
+                        scenarios_dir: str = "scenarios", sample_interval: float = 1.0) -> List[Dict]:
+    mock = MockWazuhAPI(scenarios_dir).start()
+    env = {**os.environ, **mock.env()}
+    stdio_params = {
+        name: StdioServerParameters(command=sys.executable, args=[script], env=env)
+        for name, script in SERVER_SCRIPTS.items()
+    }
+    needed = {TOOL_SERVERS[t] for t in mix}
+    urls = {"wazuh": wazuh_url, "mitre": mitre_url}
+    procs = []
+    try:
+        if transport != "stdio":
+            for server in needed:
+                if not urls[server]:
+                    proc, urls[server] = start_server(SERVER_SCRIPTS[server], transport, env=env)
+                    procs.append(proc)
+        urls = {k: v for k, v in urls.items() if v}
+
+        results = []
+        for clients in levels:
+            print(f"[*] {transport}: {clients} clients for {duration}s...")
+            result = await run_level(clients, duration, mix, urls, stdio_params, [p.pid for p in procs], sample_interval)
+            result["transport"] = transport
+            results.append(result)
+            print(format_level(result))
+        return results
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=10)
+        mock.stop()
+
+def format_level(r: Dict) -> str:
+    def fmt(d):
+        if not d["n"]:
+            return "n=0"
+        return f"p50 {d['p50'] * 1000:.1f} | p95 {d['p95'] * 1000:.1f} | p99 {d['p99'] * 1000:.1f} ms"
+
+    lines = [
+        f"  {r['clients']} clients: {r['calls_per_second']} calls/s, {fmt(r['latency_seconds'])}, "
+        f"error rate {r['error_rate']}, degraded {r['degraded_rate']}, peak RSS {r['peak_rss_mb']} MB"
+    ]
+    for tool, stats in r["per_tool"].items():
+        lines.append(f"    {tool:<22} {stats['calls']:>6} calls  {fmt(stats['latency_seconds'])}  errors {stats['errors']}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test for the MCP servers.")
+    parser.add_argument("--transport", choices=TRANSPORTS, default="streamable-http")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16], help="Concurrency levels to sweep")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per concurrency level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted tool mix, e.g. get_playbook=3,get_latest_alerts=1")
+    parser.add_argument("--wazuh-url", default=os.getenv("WAZUH_MCP_URL"), help="Use a running Wazuh MCP server instead of starting one")
+    parser.add_argument("--mitre-url", default=os.getenv("MITRE_MCP_URL"), help="Use a running MITRE MCP server instead of starting one")
+    parser.add_argument("--scenarios-dir", default="scenarios", help="Alerts served by the mock Wazuh API")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between RSS samples")
+    parser.add_argument("--output", default="load_test_results.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_load_test(
+        transport=args.transport,
+        levels=args.clients,
+        duration=args.duration,
+        mix=parse_mix(args.mix),
+        wazuh_url=args.wazuh_url if args.transport != "stdio" else None,
+        mitre_url=args.mitre_url if args.transport != "stdio" else None,
+        scenarios_dir=args.scenarios_dir,
+        sample_interval=args.sample_interval,
+    ))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+    print(f"[+] Results saved to {args.output}")
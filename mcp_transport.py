@@ -0,0 +1,76 @@
+# mcp_transport.py
+"""
+Transport selection for the MCP servers and their clients.
+
+Servers (`python mitre_server.py --transport streamable-http --port 8002`) can run either
+as a per-client stdio subprocess (the default) or as one long-running network server per
+host that many clients share. Clients call `connect_mcp`, which connects by URL when
+WAZUH_MCP_URL / MITRE_MCP_URL is set and otherwise spawns the stdio subprocess as before:
+
+    WAZUH_MCP_URL=http://localhost:8001/mcp   (streamable HTTP)
+    MITRE_MCP_URL=http://localhost:8002/sse   (SSE: any URL ending in /sse)
+"""
+import os
+import argparse
+from contextlib import AsyncExitStack
+from typing import Optional
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
+
+TRANSPORTS = ("stdio", "sse", "streamable-http")
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+# Default network ports per server (stdio ignores them)
+DEFAULT_PORTS = {"wazuh": 8001, "mitre": 8002}
+
+# ==========================================
+# Server Side
+# ==========================================
+def run_server(mcp, name: str, argv=None) -> None:
+    """
+    Parses --transport/--host/--port (defaults from MCP_TRANSPORT / MCP_HOST / <NAME>_MCP_PORT)
+    and runs the FastMCP server with them.
+    """
+    parser = argparse.ArgumentParser(description=f"{mcp.name} MCP server")
+    parser.add_argument("--transport", choices=TRANSPORTS, default=os.getenv("MCP_TRANSPORT", "stdio"))
+    parser.add_argument("--host", default=os.getenv("MCP_HOST", "127.0.0.1"),
+                        help="Bind address for sse/streamable-http (0.0.0.0 to serve other containers)")
+    parser.add_argument("--port", type=int, default=int(os.getenv(f"{name.upper()}_MCP_PORT", DEFAULT_PORTS[name])))
+    args = parser.parse_args(argv)
+
+    if args.transport != "stdio":
+        mcp.settings.host = args.host
+        mcp.settings.port = args.port
+        if args.host not in LOOPBACK_HOSTS:
+            # FastMCP only enables DNS-rebinding protection for loopback hosts; the settings
+            # were built for the default 127.0.0.1, so drop it to accept other Host headers.
+            mcp.settings.transport_security = None
+    mcp.run(transport=args.transport)
+
+# ==========================================
+# Client Side
+# ==========================================
+def server_url(name: str) -> Optional[str]:
+    return os.getenv(f"{name.upper()}_MCP_URL") or None
+
+async def connect_mcp(stack: AsyncExitStack, name: str, stdio_params: StdioServerParameters) -> ClientSession:
+    """
+    Opens an initialized ClientSession to the `name` server ("wazuh" / "mitre") on `stack`:
+    over HTTP if <NAME>_MCP_URL is set, otherwise by spawning `stdio_params`.
+    """
+    return await open_session(stack, server_url(name), stdio_params)
+
+async def open_session(stack: AsyncExitStack, url: Optional[str], stdio_params: StdioServerParameters) -> ClientSession:
+    """Opens an initialized ClientSession to `url`, or over stdio when `url` is None."""
+    if url is None:
+        read, write = await stack.enter_async_context(stdio_client(stdio_params))
+    elif url.rstrip("/").endswith("/sse"):
+        read, write = await stack.enter_async_context(sse_client(url))
+    else:
+        read, write, _session_id = await stack.enter_async_context(streamablehttp_client(url))
+    session = await stack.enter_async_context(ClientSession(read, write))
+    await session.initialize()
+    return session
@@ -0,0 +1,246 @@
+# metrics.py
+"""
+Minimal Prometheus-style metrics for the MCP servers (no external dependency).
+
+Each server owns a `MetricsRegistry`. Metrics are exposed two ways:
+- the `get_metrics` MCP tool, which returns the Prometheus text format, and
+- optionally an HTTP endpoint (`GET /metrics`) on a local port, started with
+  `start_metrics_server(registry, port)` when WAZUH_METRICS_PORT / MITRE_METRICS_PORT is set.
+
+Helpers cover the common cases: `metered_tool` for per-tool latency/error counts,
+`time_upstream` for outbound HTTP calls, `record_lookup` for cache hit rates.
+"""
+import sys
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in sorted(self._values.items())]
+
+class Gauge(_Metric):
+    """A settable value, or a callback evaluated at scrape time (`set_function`)."""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+        self._function: Optional[Callable[[], Optional[float]]] = None
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def set_function(self, fn: Callable[[], Optional[float]]) -> None:
+        self._function = fn
+
+    def value(self, **labels) -> Optional[float]:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels))
+
+    def _samples(self):
+        if self._function is not None:
+            value = self._function()
+            return [] if value is None else [f"{self.name} {value}"]
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in sorted(self._values.items())]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List[float]] = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> float:
+        series = self._series.get(self._key(labels))
+        return series[-2] if series else 0.0
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for i, bound in enumerate(self.buckets):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': bound})} {series[i]}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+# ==========================================
+# Registry
+# ==========================================
+class MetricsRegistry:
+    """
+    Holds the metrics of one MCP server. The standard tool / upstream / cache metrics
+    are created up front; servers add their own gauges with `gauge()`.
+    """
+
+    def __init__(self, server: str):
+        self.server = server
+        self._metrics: Dict[str, _Metric] = {}
+        self.tool_calls = self.counter("mcp_tool_calls_total", "MCP tool calls by tool and outcome.", ["tool", "status"])
+        self.tool_duration = self.histogram("mcp_tool_duration_seconds", "MCP tool call latency.", ["tool"])
+        self.upstream_requests = self.counter("upstream_requests_total", "Outbound HTTP requests by upstream, operation and outcome.", ["upstream", "operation", "status"])
+        self.upstream_duration = self.histogram("upstream_request_duration_seconds", "Outbound HTTP request latency.", ["upstream", "operation"])
+        self.cache_lookups = self.counter("cache_lookups_total", "Cache lookups by cache and result (hit/miss).", ["cache", "result"])
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # --- Helpers ---
+    def record_lookup(self, cache: str, hit: bool) -> None:
+        self.cache_lookups.inc(cache=cache, result="hit" if hit else "miss")
+
+    @contextmanager
+    def time_upstream(self, upstream: str, operation: str):
+        """Times an outbound HTTP call; exceptions are counted as errors and re-raised."""
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self.upstream_duration.observe(time.perf_counter() - started, upstream=upstream, operation=operation)
+            self.upstream_requests.inc(upstream=upstream, operation=operation, status=status)
+
+def is_error_result(result) -> bool:
+    # Tools in this repo report failures in-band: "❌ ..." messages or a JSON {"error": ...} body
+    return isinstance(result, str) and (result.startswith("❌") or result.startswith('{"error"'))
+
+def metered_tool(registry: MetricsRegistry):
+    """Decorator for MCP tool functions: per-tool latency histogram and call/error counters."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status = "ok"
+            try:
+                result = fn(*args, **kwargs)
+                if is_error_result(result):
+                    status = "error"
+                return result
+            except Exception:
+                status = "exception"
+                raise
+            finally:
+                registry.tool_duration.observe(time.perf_counter() - started, tool=fn.__name__)
+                registry.tool_calls.inc(tool=fn.__name__, status=status)
+        return wrapper
+    return decorator
+
+# ==========================================
+# HTTP Exposition
+# ==========================================
+def start_metrics_server(registry: MetricsRegistry, port: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """
+    Serves GET /metrics on a background thread. Returns None (and logs) if the port is
+    taken, e.g. by another stdio copy of the same server.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        sys.stderr.write(f"[METRICS] {registry.server}: could not bind {host}:{port} ({e}); HTTP metrics disabled.\n")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f"{registry.server}-metrics", daemon=True).start()
+    sys.stderr.write(f"[METRICS] {registry.server}: serving http://{host}:{port}/metrics\n")
+    return server
@@ -2,17 +2,41 @@
 from mcp.server.fastmcp import FastMCP
 import requests
 import json
+import hashlib
+import os
 import sys
+import time
 from typing import Optional, Dict, Any
 
+from tracing import Tracer, traced_tool
+from metrics import MetricsRegistry, metered_tool, start_metrics_server
+from mcp_transport import run_server
+from context_cache import mark_mitre_snapshot
+from vector_index import VectorIndex
+from resilience import bind_metrics, get_upstream
+
 # Define MCP server for Threat Intel
 mcp = FastMCP("MITRE-Knowledge-Base")
 
+# Spans for tool calls join the client's trace via the request _meta (see tracing.py)
+tracer = Tracer("mitre-server")
+
+# Tool latency, download timings and cache stats (get_metrics tool, or HTTP if MITRE_METRICS_PORT is set)
+metrics = MetricsRegistry("mitre-server")
+
+# Download retries / circuit breaker (see resilience.py); breaker state is exported with the other metrics
+mitre_download = get_upstream("mitre-download")
+bind_metrics(metrics)
+
 # MITRE ATT&CK STIX data URL (Official MITRE STIX repository)
 MITRE_ATTACK_URL = "https://raw.githubusercontent.com/mitre-attack/attack-stix-data/master/enterprise-attack/enterprise-attack.json"
 
 # Global in-memory cache for MITRE data
 MITRE_CACHE: Optional[Dict[str, Any]] = None
+# Unix time of the last successful download (snapshot age metric)
+MITRE_LOADED_AT: Optional[float] = None
+# SHA-256 of the downloaded STIX bundle (part of the vector index signature)
+MITRE_DIGEST: Optional[str] = None
 
 def download_and_cache_mitre_data() -> bool:
     """
@@ -20,37 +44,30 @@ def download_and_cache_mitre_data() -> bool:
     Caches the data in memory for fast access.
     Returns True if successful, False otherwise.
     """
-    global MITRE_CACHE
+    global MITRE_CACHE, MITRE_LOADED_AT, MITRE_DIGEST
     
     sys.stderr.write("[MITRE SERVER] Downloading MITRE ATT&CK STIX data...\n")
     
     try:
-        response = requests.get(MITRE_ATTACK_URL, timeout=60)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Build a fast lookup dictionary: technique_id -> technique_object
-        global MITRE_CACHE
-        MITRE_CACHE = {}
+        def fetch():
+            with metrics.time_upstream("mitre", "download"):
+                response = requests.get(MITRE_ATTACK_URL, timeout=mitre_download.timeout)
+                response.raise_for_status()
+                return response
+
+        with tracer.span("mitre.download", url=MITRE_ATTACK_URL) as span:
+            response = mitre_download.call(fetch)
+            data = response.json()
+            digest = hashlib.sha256(response.content).hexdigest()
+            if span is not None:
+                span.set(bytes=len(response.content))
         
-        for obj in data.get('objects', []):
-            if obj.get('type') == 'attack-pattern':
-                # Extract the technique ID (e.g., T1110)
-                external_refs = obj.get('external_references', [])
-                for ref in external_refs:
-                    if ref.get('source_name') == 'mitre-attack':
-                        technique_id = ref.get('external_id')
-                        if technique_id:
-                            MITRE_CACHE[technique_id] = {
-                                'id': technique_id,
-                                'name': obj.get('name', 'Unknown'),
-                                'description': obj.get('description', 'No description available'),
-                                'url': ref.get('url', ''),
-                                'tactics': [phase['phase_name'] for phase in obj.get('kill_chain_phases', [])],
-                                'platforms': obj.get('x_mitre_platforms', []),
-                                'data_sources': obj.get('x_mitre_data_sources', [])
-                            }
-                        break
+        with tracer.span("mitre.index"):
+            MITRE_CACHE = build_technique_index(data)
+        MITRE_LOADED_AT = time.time()
+        MITRE_DIGEST = digest
+        # Tells clients' context caches (context_cache.py) that cached MITRE context is stale
+        mark_mitre_snapshot(digest, len(MITRE_CACHE))
         
         sys.stderr.write(f"[MITRE SERVER] Successfully loaded {len(MITRE_CACHE)} techniques into memory.\n")
         return True
@@ -60,11 +77,37 @@ def download_and_cache_mitre_data() -> bool:
         MITRE_CACHE = {}
         return False
 
+def build_technique_index(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Builds a fast lookup dictionary: technique_id -> technique_object."""
+    index = {}
+    for obj in data.get('objects', []):
+        if obj.get('type') == 'attack-pattern':
+            # Extract the technique ID (e.g., T1110)
+            external_refs = obj.get('external_references', [])
+            for ref in external_refs:
+                if ref.get('source_name') == 'mitre-attack':
+                    technique_id = ref.get('external_id')
+                    if technique_id:
+                        index[technique_id] = {
+                            'id': technique_id,
+                            'name': obj.get('name', 'Unknown'),
+                            'description': obj.get('description', 'No description available'),
+                            'url': ref.get('url', ''),
+                            'tactics': [phase['phase_name'] for phase in obj.get('kill_chain_phases', [])],
+                            'platforms': obj.get('x_mitre_platforms', []),
+                            'data_sources': obj.get('x_mitre_data_sources', [])
+                        }
+                    break
+    return index
+
 def get_technique_from_cache(technique_id: str) -> Optional[Dict[str, Any]]:
     """Retrieve technique data from in-memory cache."""
-    if MITRE_CACHE is None:
-        return None
-    return MITRE_CACHE.get(technique_id)
+    with tracer.span("mitre.lookup", technique_id=technique_id) as span:
+        technique = MITRE_CACHE.get(technique_id) if MITRE_CACHE is not None else None
+        metrics.record_lookup("mitre_techniques", technique is not None)
+        if span is not None:
+            span.set(hit=technique is not None)
+        return technique
 
 # =============================================================================
 # TIER 1: LOCAL PLAYBOOKS (Loaded from Config)
@@ -82,12 +125,69 @@ def load_playbooks() -> Dict[str, str]:
         return {}
 
 KNOWLEDGE_BASE = load_playbooks()
+# Content hash of the playbooks, part of the similarity index's knowledge signature
+KNOWLEDGE_HASH = hashlib.sha256(json.dumps(KNOWLEDGE_BASE, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+# =============================================================================
+# SIMILARITY SEARCH (alerts without a usable MITRE ID)
+# =============================================================================
+
+# Rows: playbooks, technique descriptions and finished triage reports (see vector_index.py)
+VECTOR_INDEX: Optional[VectorIndex] = None
+# New reports are pulled from the triage daemon's store at most this often
+VECTOR_SYNC_INTERVAL = float(os.getenv("VECTOR_SYNC_INTERVAL", "5"))
+# Upper bound for find_similar_entries' k
+MAX_SIMILAR_ENTRIES = 50
+_vector_synced_at = 0.0
+
+def get_vector_index() -> VectorIndex:
+    """Opens the index on first use and brings it up to date with the knowledge and reports."""
+    global VECTOR_INDEX, _vector_synced_at
+    if VECTOR_INDEX is None:
+        VECTOR_INDEX = VectorIndex()
+    signature = KNOWLEDGE_HASH
+    if MITRE_DIGEST:
+        signature += f":{MITRE_DIGEST}"  # Without a snapshot, keep whatever another process built
+    with tracer.span("vector_index.sync_knowledge") as span:
+        rebuilt = VECTOR_INDEX.sync_knowledge(KNOWLEDGE_BASE, MITRE_CACHE or {}, signature)
+        if span is not None:
+            span.set(rebuilt=rebuilt)
+    if time.monotonic() - _vector_synced_at >= VECTOR_SYNC_INTERVAL:
+        _vector_synced_at = time.monotonic()
+        try:
+            from triage_store import TriageStore
+            store = TriageStore(read_only=True)
+        except Exception:
+            store = None  # The triage daemon has not run yet: no reports to index
+        if store is not None:
+            try:
+                with tracer.span("vector_index.sync_reports"):
+                    VECTOR_INDEX.sync_reports(store)
+            finally:
+                store.close()
+    return VECTOR_INDEX
+
+# =============================================================================
+# METRICS
+# =============================================================================
+
+metrics.gauge("mitre_cache_techniques", "Techniques held in MITRE_CACHE.").set_function(lambda: len(MITRE_CACHE or {}))
+metrics.gauge("playbooks_loaded", "Tier 1 playbooks loaded from config.").set_function(lambda: len(KNOWLEDGE_BASE))
+metrics.gauge("mitre_snapshot_loaded_timestamp_seconds", "Unix time of the last successful MITRE download.").set_function(lambda: MITRE_LOADED_AT)
+metrics.gauge("mitre_snapshot_age_seconds", "Seconds since the last successful MITRE download.").set_function(
+    lambda: round(time.time() - MITRE_LOADED_AT, 3) if MITRE_LOADED_AT else None
+)
+metrics.gauge("vector_index_entries", "Rows in the similarity index (0 until first use).").set_function(
+    lambda: sum(len(s) for s in VECTOR_INDEX.segments.values()) if VECTOR_INDEX else 0
+)
 
 # =============================================================================
 # MCP TOOLS - 3-TIER ARCHITECTURE
 # =============================================================================
 
 @mcp.tool()
+@metered_tool(metrics)
+@traced_tool(tracer)
 def get_playbook(technique_id: str) -> str:
     """
     TIER 1: Local Playbook (Hardcoded SOC Response Procedures)
@@ -97,7 +197,9 @@ def get_playbook(technique_id: str) -> str:
     
     Example Input: "T1110"
     """
-    playbook = KNOWLEDGE_BASE.get(technique_id)
+    with tracer.span("playbook.lookup", technique_id=technique_id):
+        playbook = KNOWLEDGE_BASE.get(technique_id)
+    metrics.record_lookup("playbooks", playbook is not None)
     
     if playbook:
         return playbook
@@ -105,6 +207,8 @@ def get_playbook(technique_id: str) -> str:
         return f"❌ No custom playbook found for technique ID: {technique_id}.\n\nSuggestion: Create a playbook or use Tier 2/3 for official MITRE data."
 
 @mcp.tool()
+@metered_tool(metrics)
+@traced_tool(tracer)
 def get_tier2_mitre_data(technique_id: str) -> str:
     """
     TIER 2: Official MITRE Data (Full Intelligence)
@@ -138,6 +242,8 @@ def get_tier2_mitre_data(technique_id: str) -> str:
     return output
 
 @mcp.tool()
+@metered_tool(metrics)
+@traced_tool(tracer)
 def get_full_context(technique_id: str) -> str:
     """
     HYBRID: Full Context (Tier 1 Playbook + Tier 2 MITRE Data)
@@ -153,6 +259,7 @@ def get_full_context(technique_id: str) -> str:
     
     # Get Tier 1 (Playbook)
     playbook = KNOWLEDGE_BASE.get(technique_id)
+    metrics.record_lookup("playbooks", playbook is not None)
     
     if playbook:
         return f"{mitre_data}\n\n---\n\n## 🔧 CUSTOM SOC PLAYBOOK\n\n{playbook}"
@@ -160,6 +267,8 @@ def get_full_context(technique_id: str) -> str:
         return f"{mitre_data}\n\n---\n\n*No custom playbook available for this technique. Consider creating one based on your organization's procedures.*"
 
 @mcp.tool()
+@metered_tool(metrics)
+@traced_tool(tracer)
 def refresh_mitre_data() -> str:
     """
     Forces a refresh of the MITRE ATT&CK database from the official repository.
@@ -172,14 +281,61 @@ def refresh_mitre_data() -> str:
     else:
         return "❌ Failed to refresh MITRE data. Check your internet connection and server logs."
 
+@mcp.tool()
+@metered_tool(metrics)
+@traced_tool(tracer)
+def find_similar_entries(description: str, full_log: str = "", k: int = 5, kinds: str = "") -> str:
+    """
+    Similarity search for alerts WITHOUT a valid MITRE technique ID.
+    
+    Matches the alert text against local playbooks, official MITRE technique descriptions
+    and previously triaged incident reports, and returns the closest entries.
+    
+    Args:
+        description: The alert's rule.description
+        full_log: The alert's full_log (optional, improves matching)
+        k: Number of entries to return (default: 5, between 1 and 50)
+        kinds: Comma-separated filter: playbook, technique, report (default: all)
+    
+    Returns:
+        JSON string {"matches": [{"kind", "ref", "title", "snippet", "score"}, ...], "elapsed_ms": float}
+    """
+    started = time.perf_counter()
+    query = f"{description}\n{full_log}".strip()
+    if not query:
+        return json.dumps({"error": "description or full_log is required"})
+    k = max(1, min(int(k), MAX_SIMILAR_ENTRIES))
+    index = get_vector_index()
+    with tracer.span("vector_index.search", k=k) as span:
+        matches = index.search(query, k, [kind.strip() for kind in kinds.split(",") if kind.strip()] or None)
+        if span is not None:
+            span.set(returned=len(matches))
+    return json.dumps({
+        "matches": matches,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "index": index.stats(),
+    }, ensure_ascii=False)
+
+@mcp.tool()
+def get_metrics() -> str:
+    """
+    Returns this server's metrics in the Prometheus text format: per-tool call counts,
+    error counts and latency histograms, MITRE download timings, cache sizes,
+    cache hit/miss counts and the age of the MITRE snapshot.
+    """
+    return metrics.render()
+
 # =============================================================================
 # SERVER INITIALIZATION
 # =============================================================================
 
 # Download MITRE data on server startup
 sys.stderr.write("[MITRE SERVER] Initializing...\n")
+if os.getenv("MITRE_METRICS_PORT"):
+    start_metrics_server(metrics, int(os.getenv("MITRE_METRICS_PORT")))
 download_and_cache_mitre_data()
 sys.stderr.write("[MITRE SERVER] Ready to serve requests.\n")
 
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    # stdio by default; --transport streamable-http shares one ATT&CK cache between all clients
+    run_server(mcp, "mitre")
\ No newline at end of file
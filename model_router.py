@@ -0,0 +1,186 @@
+# model_router.py
+"""
+Latency-aware model routing for the triage agent.
+
+Picks which Ollama model answers each agent step instead of using one global model
+for the whole run. The rules live in config/model_routing.json:
+
+- small_model / large_model: the two candidates. A null large_model means "the model
+  selected in the UI" (the model the graph was built for).
+- steps: step name -> "small" | "large". Steps are:
+    tool_selection   - fetching the alert and choosing the Tier 1 lookup
+    playbook_report  - Tier 1 hit for every technique, the answer is mostly the playbooks rewritten
+    fallback         - Tier 1 missed at least one technique, Tier 2 / Tier 3 reasoning is needed
+- high_level_threshold: alerts at or above this rule.level always use the large model
+  once the alert is known.
+- latency_budget_seconds: if the recent (EWMA) latency of the chosen model exceeds the
+  budget and the step is not high severity, the router falls back to the small model.
+- probe_interval_seconds: a demoted model gets no new samples, so once its last sample is
+  this old one call is routed to it again to re-measure (a "probe"). A sample arriving
+  after such a gap replaces the stale EWMA instead of being averaged into it.
+
+Callers can steer a run (ModelRouter.route), in this order of precedence:
+- force ("small" | "large"): hard override of every rule, including the latency budget,
+- high severity: large model for every step after tool_selection,
+- prefer ("small" | "large"): soft, replaces the step rule except on the fallback step
+  (a Tier 1 miss always gets the step rule), e.g. the scheduler's per-class preference,
+- steps, then the latency budget.
+"""
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from alert_model import alerts_from_json
+
+ROUTING_CONFIG_FILE = "config/model_routing.json"
+
+DEFAULT_ROUTING_CONFIG: Dict[str, Any] = {
+    "small_model": "llama3.2",
+    "large_model": None,
+    "high_level_threshold": 12,
+    "latency_budget_seconds": 30.0,
+    "ewma_alpha": 0.3,
+    "probe_interval_seconds": 300.0,
+    "steps": {
+        "tool_selection": "small",
+        "playbook_report": "small",
+        "fallback": "large",
+    },
+}
+
+def load_routing_config(path: str = ROUTING_CONFIG_FILE) -> Dict[str, Any]:
+    """Loads the routing rules, falling back to the defaults for anything missing."""
+    config = json.loads(json.dumps(DEFAULT_ROUTING_CONFIG))
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            user_config = json.load(f)
+        steps = user_config.pop("steps", {})
+        config.update(user_config)
+        config["steps"].update(steps)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        sys.stderr.write(f"[ROUTER] Warning: Could not load routing rules from {path}: {e}\n")
+    return config
+
+# ==========================================
+# State Inspection
+# ==========================================
+def _tool_results(messages, tool_name: str) -> List[str]:
+    return [str(m.content) for m in messages if getattr(m, "type", None) == "tool" and m.name == tool_name]
+
+def alert_level(messages) -> Optional[int]:
+    """Returns rule.level of the fetched alert, or None if no alert was fetched yet."""
+    for content in _tool_results(messages, "fetch_wazuh_alerts"):
+        try:
+            return alerts_from_json(content)[0].level
+        except (ValueError, IndexError, TypeError):
+            continue
+    return None
+
+def tier1_hit(messages) -> Optional[bool]:
+    """True if every Tier 1 lookup returned a playbook, False if any missed, None if not called yet."""
+    results = _tool_results(messages, "get_tier1_playbook")
+    if not results:
+        return None
+    return all(r and not r.startswith(("❌", "Error", "O servidor MCP devolveu um erro")) for r in results)
+
+def classify_step(messages) -> str:
+    """Maps the conversation so far to one of the routing step names."""
+    hit = tier1_hit(messages)
+    if hit is None:
+        return "tool_selection"
+    return "playbook_report" if hit else "fallback"
+
+# ==========================================
+# Router
+# ==========================================
+class ModelRouter:
+    """
+    Chooses a model per agent step and keeps an EWMA of observed latency per model.
+    One router is shared by a compiled graph, so latency history spans runs.
+    """
+
+    def __init__(self, default_model: str, config: Optional[Dict[str, Any]] = None):
+        self.config = config or load_routing_config()
+        self.small_model = self.config.get("small_model") or default_model
+        self.large_model = self.config.get("large_model") or default_model
+        self._latency: Dict[str, float] = {}
+        self._measured_at: Dict[str, float] = {}
+        self._probed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def expected_latency(self, model: str) -> Optional[float]:
+        return self._latency.get(model)
+
+    def record_latency(self, model: str, seconds: float) -> None:
+        alpha = float(self.config.get("ewma_alpha", 0.3))
+        interval = self.config.get("probe_interval_seconds")
+        now = time.monotonic()
+        with self._lock:
+            previous = self._latency.get(model)
+            if interval and now - self._measured_at.get(model, now) >= interval:
+                previous = None  # Stale: the model may have recovered (or degraded) since
+            self._latency[model] = seconds if previous is None else alpha * seconds + (1 - alpha) * previous
+            self._measured_at[model] = now
+
+    def _claim_probe(self, model: str) -> bool:
+        """True (at most once per probe interval) if the over-budget `model` is due for a new sample."""
+        interval = self.config.get("probe_interval_seconds")
+        if not interval:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = max(self._measured_at.get(model, 0.0), self._probed_at.get(model, 0.0))
+            if now - last < interval:
+                return False
+            self._probed_at[model] = now  # Concurrent runs keep using the small model meanwhile
+            return True
+
+    def route(self, messages, prefer: Optional[str] = None, force: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns a routing decision: {"step", "model", "reason", "alert_level"}.
+        `force` ("small" | "large") overrides every rule; `prefer` only replaces the step
+        rule, and yields to the fallback step and the high-severity rule (see module doc).
+        """
+        step = classify_step(messages)
+        level = alert_level(messages)
+        size = self.config["steps"].get(step, "large")
+        reason = f"rule:{step}->{size}"
+        if force:
+            size, reason = force, f"force->{force}"
+        elif prefer and step != "fallback":
+            size, reason = prefer, f"prefer->{prefer}"
+
+        threshold = self.config.get("high_level_threshold")
+        high_severity = level is not None and threshold is not None and level >= threshold
+        if high_severity and step != "tool_selection" and not force:
+            size = "large"
+            reason = f"alert level {level} >= {threshold}"
+
+        model = self.large_model if size == "large" else self.small_model
+
+        budget = self.config.get("latency_budget_seconds")
+        observed = self.expected_latency(model)
+        if (budget and observed is not None and observed > budget
+                and model != self.small_model and not high_severity and not force):
+            if self._claim_probe(model):
+                reason += f"; probing {model} (EWMA {observed:.1f}s over {budget}s budget)"
+            else:
+                reason += f"; {model} EWMA {observed:.1f}s over {budget}s budget"
+                model = self.small_model
+
+        return {"step": step, "model": model, "reason": reason, "alert_level": level}
+
+    def timed(self, decision: Dict[str, Any], started: float) -> Dict[str, Any]:
+        """Records the latency of a routed call and returns the completed decision."""
+        elapsed = time.perf_counter() - started
+        self.record_latency(decision["model"], elapsed)
+        decision = {**decision, "latency_seconds": round(elapsed, 3)}
+        sys.stderr.write(
+            f"[ROUTER] step={decision['step']} model={decision['model']} "
+            f"latency={decision['latency_seconds']}s ({decision['reason']})\n"
+        )
+        return decision
@@ -0,0 +1,189 @@
+# ollama_warmup.py
+"""
+Ollama warm-up and keep-alive manager.
+
+- Preloads the models the agent will use, so the first triage after startup (or after
+  Ollama evicted an idle model) doesn't pay the model load time.
+- Keeps them resident: every request made by the app/agent carries the same keep_alive
+  (env OLLAMA_KEEP_ALIVE, default 30m; "-1" keeps models loaded forever).
+- Primes the KV cache with the agent's first request: the static triage system prompt
+  (prompts.py) AND the tool schema bound to that step. The chat template renders the
+  tools into the prompt, so a request without them would cache a prefix that no agent
+  request shares. Ollama reuses the cached prefix for later requests in the same model
+  slot, so only the part after it has to be prefilled.
+
+Run it standalone to measure cold vs warm time-to-first-token on that same request:
+
+    python ollama_warmup.py --models llama3.2 llama3.1:latest --measure
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import ollama
+
+from prompts import TRIAGE_SYSTEM_PROMPT, triage_start_message
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+
+def _parse_keep_alive(value: str):
+    # Ollama accepts durations ("30m") or seconds as a number (negative = forever)
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+DEFAULT_KEEP_ALIVE = _parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+
+def agent_step_tools() -> List[Dict[str, Any]]:
+    """
+    Tools the agent binds to its first step (fetch_wazuh_alerts), converted exactly as
+    ChatOllama.bind_tools sends them. Imported here because agent.py imports this module.
+    """
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+    from agent import create_agent_tools
+
+    return [convert_to_openai_tool(create_agent_tools()[0])]
+
+class OllamaWarmupManager:
+    """Preloads models, keeps them resident and measures time-to-first-token."""
+
+    def __init__(self, host: str = OLLAMA_HOST, keep_alive=DEFAULT_KEEP_ALIVE):
+        self.client = ollama.Client(host=host)
+        self.keep_alive = keep_alive
+        self.warm_models: Dict[str, float] = {}
+        self._pending: set = set()
+        self._lock = threading.Lock()
+        self._tools: Optional[List[Dict[str, Any]]] = None
+
+    def _agent_request(self) -> Dict[str, Any]:
+        """Messages and tools of the agent's first request (same prefix as every triage run)."""
+        if self._tools is None:
+            self._tools = agent_step_tools()
+        return {
+            "messages": [
+                {"role": "system", "content": TRIAGE_SYSTEM_PROMPT},
+                {"role": "user", "content": triage_start_message()},
+            ],
+            "tools": self._tools,
+        }
+
+    def preload(self, model: str, prime_prefix: bool = True) -> bool:
+        """Loads a model into memory and (optionally) caches the system-prompt prefix."""
+        started = time.perf_counter()
+        try:
+            # An empty prompt only loads the model
+            self.client.generate(model=model, prompt="", keep_alive=self.keep_alive)
+            if prime_prefix:
+                self.client.chat(
+                    model=model,
+                    keep_alive=self.keep_alive,
+                    options={"num_predict": 1},
+                    **self._agent_request(),
+                )
+        except Exception as e:
+            sys.stderr.write(f"[WARMUP] Could not preload {model}: {e}\n")
+            return False
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.warm_models[model] = time.time()
+        sys.stderr.write(f"[WARMUP] {model} resident (keep_alive={self.keep_alive}) in {elapsed:.2f}s\n")
+        return True
+
+    def preload_all(self, models: Iterable[str]) -> Dict[str, bool]:
+        return {model: self.preload(model) for model in dict.fromkeys(models)}
+
+    def preload_in_background(self, models: Iterable[str]) -> Optional[threading.Thread]:
+        """
+        Preloads without blocking the caller (e.g. the Streamlit first paint).
+        Models that are already warm or being loaded are skipped, so it is safe to call on every rerun.
+        """
+        with self._lock:
+            todo = [m for m in dict.fromkeys(models) if m and m not in self.warm_models and m not in self._pending]
+            self._pending.update(todo)
+        if not todo:
+            return None
+
+        def _run():
+            try:
+                self.preload_all(todo)
+            finally:
+                with self._lock:
+                    self._pending.difference_update(todo)
+
+        thread = threading.Thread(target=_run, name="ollama-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self, model: str) -> None:
+        """Evicts a model from memory (keep_alive=0)."""
+        try:
+            self.client.generate(model=model, prompt="", keep_alive=0)
+        except Exception as e:
+            sys.stderr.write(f"[WARMUP] Could not unload {model}: {e}\n")
+        with self._lock:
+            self.warm_models.pop(model, None)
+
+    def measure_ttft(self, model: str) -> Dict[str, Any]:
+        """
+        Streams the agent's first request and times the first chunk carrying content or
+        a tool call. Also returns Ollama's own load / prompt-eval timings from the final chunk.
+        """
+        started = time.perf_counter()
+        ttft = None
+        final: Dict[str, Any] = {}
+        for chunk in self.client.chat(
+            model=model,
+            keep_alive=self.keep_alive,
+            options={"num_predict": 32},
+            stream=True,
+            **self._agent_request(),
+        ):
+            message = chunk.get("message") or {}
+            if ttft is None and (message.get("content") or message.get("tool_calls")):
+                ttft = time.perf_counter() - started
+            if chunk.get("done"):
+                final = chunk
+        total = time.perf_counter() - started
+        return {
+            "ttft_seconds": round(ttft if ttft is not None else total, 3),
+            "total_seconds": round(total, 3),
+            "load_seconds": round((final.get("load_duration") or 0) / 1e9, 3),
+            "prompt_tokens": final.get("prompt_eval_count"),
+            "prompt_eval_seconds": round((final.get("prompt_eval_duration") or 0) / 1e9, 3),
+        }
+
+    def measure_cold_vs_warm(self, model: str) -> Dict[str, Any]:
+        """Unloads the model, then measures a cold request followed by a warm one."""
+        self.unload(model)
+        cold = self.measure_ttft(model)
+        warm = self.measure_ttft(model)
+        with self._lock:
+            self.warm_models[model] = time.time()
+        return {"model": model, "cold": cold, "warm": warm}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preload Ollama models and measure cold vs warm TTFT.")
+    parser.add_argument("--models", nargs="+", default=["llama3.2"])
+    parser.add_argument("--keep-alive", default=None, help="Override OLLAMA_KEEP_ALIVE (e.g. 30m, 3600, -1)")
+    parser.add_argument("--measure", action="store_true", help="Measure cold vs warm time-to-first-token")
+    args = parser.parse_args()
+
+    keep_alive = _parse_keep_alive(args.keep_alive) if args.keep_alive else DEFAULT_KEEP_ALIVE
+    manager = OllamaWarmupManager(keep_alive=keep_alive)
+
+    if args.measure:
+        for model in args.models:
+            print(f"[*] Measuring {model}...")
+            result = manager.measure_cold_vs_warm(model)
+            for phase in ("cold", "warm"):
+                r = result[phase]
+                print(f"    {phase:>4}: TTFT {r['ttft_seconds']:.3f}s | load {r['load_seconds']:.3f}s | "
+                      f"prompt eval {r['prompt_eval_seconds']:.3f}s ({r['prompt_tokens']} tokens)")
+    else:
+        print(f"[*] Preloading {', '.join(args.models)} (keep_alive={keep_alive})...")
+        results = manager.preload_all(args.models)
+        print(f"[+] {sum(results.values())}/{len(results)} models resident.")
@@ -0,0 +1,130 @@
+# replay_alerts.py
+"""
+Streams generated alerts into the alert source at a fixed rate.
+
+Reads JSONL shards (plain or .gz, e.g. from `generate_safe_scenarios.py --bulk`) and appends
+them to the alert stream spool (ALERT_STREAM_FILE, default alert_stream.jsonl) at
+`--rate` events/sec. wazuh_server.py serves the spool through its `get_alert_stream`
+tool; `--update-latest` also rewrites alert.json so `get_latest_alerts` follows along.
+
+    python replay_alerts.py bulk_alerts --rate 200 --duration 600
+"""
+import os
+import sys
+import gzip
+import time
+import argparse
+from datetime import datetime, timezone
+from typing import Iterator, List
+
+from alert_model import loads, dumps
+
+ALERT_STREAM_FILE = os.getenv("ALERT_STREAM_FILE", "alert_stream.jsonl")
+
+def alert_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith(".jsonl") or name.endswith(".jsonl.gz")
+            ))
+        else:
+            files.append(path)
+    return files
+
+def read_alert_lines(files: List[str], loop: bool = False) -> Iterator[str]:
+    """Raw JSONL lines from `files` in order, forever if `loop`."""
+    while True:
+        for path in files:
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield line.rstrip("\n")
+        if not loop:
+            return
+
+def _retime(line: str) -> str:
+    # Stamp the emit time so downstream latency (queue time, time-to-triage) is measurable
+    alert = loads(line)
+    alert["original_timestamp"] = alert.get("timestamp")
+    alert["timestamp"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "+0000"
+    return dumps(alert)
+
+def replay(files: List[str], rate: float, spool: str = ALERT_STREAM_FILE, duration: float = None,
+           limit: int = None, loop: bool = False, retime: bool = True, update_latest: str = None,
+           tick: float = 0.05) -> int:
+    """
+    Appends alerts to `spool` at `rate` events/sec, in batches every `tick` seconds. The
+    schedule is absolute (event n is due at start + n/rate), so a slow batch is caught
+    up on the next tick instead of lowering the sustained rate. Returns the events written.
+    """
+    lines = read_alert_lines(files, loop)
+    started = time.monotonic()
+    written = 0
+    last_report = started
+
+    with open(spool, "a", encoding="utf-8") as out:
+        while True:
+            now = time.monotonic()
+            if duration is not None and now - started >= duration:
+                break
+            due = int((now - started) * rate) - written
+            if limit is not None:
+                due = min(due, limit - written)
+            batch = []
+            if due > 0:
+                for line in lines:
+                    batch.append(_retime(line) if retime else line)
+                    if len(batch) >= due:
+                        break
+            if batch:
+                out.write("\n".join(batch) + "\n")
+                out.flush()
+                written += len(batch)
+                if update_latest:
+                    tmp = update_latest + ".tmp"
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        f.write(batch[-1])
+                    os.replace(tmp, update_latest)
+            elif due > 0:
+                break  # Source exhausted
+            if limit is not None and written >= limit:
+                break
+
+            if now - last_report >= 5:
+                print(f"[*] {written} events, {written / (now - started):.1f} events/s")
+                last_report = now
+            time.sleep(max(0.0, tick - (time.monotonic() - now)))
+
+    elapsed = time.monotonic() - started
+    print(f"[+] Replayed {written} events into {spool} in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.1f} events/s).")
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay JSONL alerts into the alert stream at a fixed rate.")
+    parser.add_argument("paths", nargs="+", help="JSONL files or directories of shards")
+    parser.add_argument("--rate", type=float, default=50.0, help="Events per second")
+    parser.add_argument("--spool", default=ALERT_STREAM_FILE, help="Alert stream file served by wazuh_server.py")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many events")
+    parser.add_argument("--loop", action="store_true", help="Restart from the first file when exhausted")
+    parser.add_argument("--keep-timestamps", action="store_true", help="Do not restamp alerts with the emit time")
+    parser.add_argument("--update-latest", nargs="?", const="alert.json", default=None,
+                        help="Also write the newest alert to this file (default alert.json)")
+    parser.add_argument("--truncate", action="store_true", help="Empty the spool before replaying")
+    args = parser.parse_args()
+
+    files = alert_files(args.paths)
+    if not files:
+        print("No JSONL alert files found.")
+        sys.exit(1)
+    if args.truncate:
+        open(args.spool, "w").close()
+
+    try:
+        replay(files, args.rate, args.spool, args.duration, args.limit, args.loop,
+               not args.keep_timestamps, args.update_latest)
+    except KeyboardInterrupt:
+        pass
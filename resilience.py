@@ -0,0 +1,351 @@
+# resilience.py
+"""
+Retries, rate limiting and circuit breaking for calls to upstream services.
+
+Each upstream (the Wazuh API, the MITRE STIX download, Ollama, and the MCP servers as
+seen from the agent) has one `Upstream` per process, which combines:
+
+- a token bucket (`rate_per_second`, `burst`; 0 = unlimited), so a burst of triage runs
+  can't flood a slow manager,
+- retries of transient failures (connection errors, timeouts, HTTP 429/5xx) with
+  full-jitter exponential backoff (`max_attempts`, `base_delay_seconds`, `max_delay_seconds`).
+  A retry is only made if a whole attempt (read timeout) still fits in
+  `retry_budget_seconds`, so a refused connection is retried quickly but a hung
+  upstream costs one timeout, not `max_attempts` of them,
+- a circuit breaker: after `failure_threshold` consecutive transient failures the
+  upstream counts as down, and calls fail fast with `CircuitOpenError` for
+  `reset_timeout_seconds`. After that one trial call goes through (half-open), and its
+  outcome closes the breaker or opens it again.
+
+Errors that are not transient (HTTP 4xx, bad arguments) are raised at once and don't
+count against the breaker, since the upstream did answer. When an upstream can't be
+reached (breaker open, or retries exhausted) callers get `UpstreamUnavailable` and
+can serve cached data or give up, instead of waiting out another timeout.
+
+Settings are in config/resilience.json: "default" plus per-upstream overrides.
+`bind_metrics` exports breaker state, retries and rejections to a MetricsRegistry.
+
+    wazuh = get_upstream("wazuh")
+    response = wazuh.call(requests.get, url, timeout=wazuh.timeout)
+    message = await get_upstream("ollama").acall(llm.ainvoke, messages)
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import MetricsRegistry
+
+RESILIENCE_CONFIG_FILE = "config/resilience.json"
+
+DEFAULT_RESILIENCE_CONFIG: Dict[str, Any] = {
+    "default": {
+        "max_attempts": 3,
+        "base_delay_seconds": 0.5,
+        "max_delay_seconds": 8.0,
+        "connect_timeout_seconds": 3.0,
+        "read_timeout_seconds": 10.0,
+        "rate_per_second": 0,
+        "burst": 10,
+        "failure_threshold": 5,
+        "reset_timeout_seconds": 30.0,
+        "retry_budget_seconds": 15.0,
+    },
+    "upstreams": {
+        "wazuh": {"rate_per_second": 10, "burst": 20},
+        "mitre-download": {"max_attempts": 2, "connect_timeout_seconds": 5.0, "read_timeout_seconds": 60.0,
+                           "failure_threshold": 2, "reset_timeout_seconds": 300.0, "retry_budget_seconds": 90.0},
+        "ollama": {"max_attempts": 2, "read_timeout_seconds": 300.0, "failure_threshold": 3, "reset_timeout_seconds": 15.0,
+                   "retry_budget_seconds": 330.0},
+        "wazuh-mcp": {"max_attempts": 2, "read_timeout_seconds": 60.0, "reset_timeout_seconds": 10.0, "retry_budget_seconds": 70.0},
+        "mitre-mcp": {"max_attempts": 2, "read_timeout_seconds": 60.0, "reset_timeout_seconds": 10.0, "retry_budget_seconds": 70.0},
+    },
+}
+
+def load_resilience_config(path: str = RESILIENCE_CONFIG_FILE) -> Dict[str, Any]:
+    """Loads the upstream settings, falling back to the defaults for anything missing."""
+    config = json.loads(json.dumps(DEFAULT_RESILIENCE_CONFIG))
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            user_config = json.load(f)
+        config["default"].update(user_config.get("default", {}))
+        for name, settings in user_config.get("upstreams", {}).items():
+            config["upstreams"].setdefault(name, {}).update(settings)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        sys.stderr.write(f"[RESILIENCE] Warning: Could not load settings from {path}: {e}\n")
+    return config
+
+# ==========================================
+# Errors
+# ==========================================
+class UpstreamUnavailable(Exception):
+    """The upstream could not be reached: its breaker is open or every retry failed."""
+
+    def __init__(self, upstream: str, reason: str):
+        super().__init__(f"{upstream} unavailable: {reason}")
+        self.upstream = upstream
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Raised without calling the upstream while its breaker is open."""
+
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(upstream, f"circuit open, next trial in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+# Transient failures by class name, so requests / httpx / anyio needn't be imported here
+_TRANSIENT_TYPES = {"ConnectionError", "Timeout", "TimeoutException", "TransportError",
+                    "ClosedResourceError", "BrokenResourceError", "EndOfStream"}
+
+def is_transient(exc: BaseException) -> bool:
+    """True for failures worth retrying: connection errors, timeouts, HTTP 429 and 5xx."""
+    status = getattr(exc, "status_code", None)
+    response = getattr(exc, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    if isinstance(exc, ValueError):
+        return False  # e.g. requests' InvalidURL: retrying won't change it
+    if isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_TYPES for cls in type(exc).__mro__)
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+# ==========================================
+# Token Bucket
+# ==========================================
+class TokenBucket:
+    """
+    `rate` tokens per second, up to `burst` saved. Callers reserve a token and sleep
+    for the returned wait, so waiters are served in order and nobody spins.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token and returns the seconds to wait before using it (0 if unlimited)."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> float:
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+# ==========================================
+# Circuit Breaker
+# ==========================================
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures -> half_open after `reset_timeout`."""
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 on_change: Optional[Callable[[str, str], None]] = None):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.on_change = on_change
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            sys.stderr.write(f"[RESILIENCE] {self.name}: circuit {state}\n")
+            if self.on_change:
+                self.on_change(self.name, state)
+
+    def retry_in(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go through now (in half-open state, only one trial at a time)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self.retry_in() > 0:
+                    return False
+                self._set(self.HALF_OPEN)
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            self._set(self.CLOSED)
+
+    def release(self) -> None:
+        """Gives back a half-open trial whose call was cancelled (no outcome to record)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set(self.OPEN)
+
+# ==========================================
+# Upstream
+# ==========================================
+STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+class Upstream:
+    """Rate limit + retry with backoff + circuit breaker around calls to one upstream."""
+
+    def __init__(self, name: str, settings: Dict[str, Any]):
+        self.name = name
+        self.settings = settings
+        self.max_attempts = max(1, int(settings["max_attempts"]))
+        self.bucket = TokenBucket(settings["rate_per_second"], settings["burst"])
+        self.breaker = CircuitBreaker(name, settings["failure_threshold"], settings["reset_timeout_seconds"],
+                                      on_change=_state_changed)
+        self.retries = 0
+        self.rejections = 0
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """(connect, read) timeout for requests."""
+        return (float(self.settings["connect_timeout_seconds"]), float(self.settings["read_timeout_seconds"]))
+
+    def _admit(self) -> None:
+        if not self.breaker.allow():
+            self.rejections += 1
+            _count("circuit_breaker_rejections_total", self.name)
+            raise CircuitOpenError(self.name, self.breaker.retry_in())
+
+    def _failed(self, exc: BaseException, attempt: int, started: float, attempt_timeout: Optional[float]) -> float:
+        """Records a failed attempt. Returns the backoff before the next one, or raises."""
+        if not is_transient(exc):
+            self.breaker.record_success()  # The upstream answered; the request was wrong
+            raise exc
+        self.breaker.record_failure()
+        delay = backoff_delay(attempt, float(self.settings["base_delay_seconds"]), float(self.settings["max_delay_seconds"]))
+        spent = time.monotonic() - started + delay + (attempt_timeout or self.timeout[1])
+        if (attempt + 1 >= self.max_attempts or self.breaker.state == CircuitBreaker.OPEN
+                or spent > float(self.settings["retry_budget_seconds"])):
+            raise UpstreamUnavailable(self.name, f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__) from exc
+        self.retries += 1
+        _count("upstream_retries_total", self.name)
+        return delay
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        started = time.monotonic()
+        for attempt in range(self.max_attempts):
+            self._admit()
+            self.bucket.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                time.sleep(self._failed(e, attempt, started, None))
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Async variant; `fn(*args, **kwargs)` must return an awaitable. `timeout` bounds each attempt."""
+        started = time.monotonic()
+        for attempt in range(self.max_attempts):
+            self._admit()
+            await self.bucket.acquire_async()
+            try:
+                result = await asyncio.wait_for(fn(*args, **kwargs), timeout)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                await asyncio.sleep(self._failed(e, attempt, started, timeout))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.breaker.state, "consecutive_failures": self.breaker.failures,
+                "retries": self.retries, "rejections": self.rejections}
+
+# ==========================================
+# Process-wide Registry
+# ==========================================
+_UPSTREAMS: Dict[str, Upstream] = {}
+_REGISTRIES: List[MetricsRegistry] = []
+_CONFIG: Optional[Dict[str, Any]] = None
+_LOCK = threading.Lock()
+
+def get_upstream(name: str) -> Upstream:
+    """Returns the shared Upstream for `name`, created from config/resilience.json on first use."""
+    global _CONFIG
+    with _LOCK:
+        upstream = _UPSTREAMS.get(name)
+        if upstream is None:
+            if _CONFIG is None:
+                _CONFIG = load_resilience_config()
+            settings = {**_CONFIG["default"], **_CONFIG["upstreams"].get(name, {})}
+            upstream = _UPSTREAMS[name] = Upstream(name, settings)
+            for registry in _REGISTRIES:
+                _gauge(registry).set(STATE_VALUES[upstream.breaker.state], upstream=name)
+        return upstream
+
+def snapshot_all() -> Dict[str, Dict[str, Any]]:
+    """State and counters of every upstream used so far in this process."""
+    return {name: upstream.snapshot() for name, upstream in sorted(_UPSTREAMS.items())}
+
+def bind_metrics(registry: MetricsRegistry) -> None:
+    """Exports breaker state (0 closed, 1 half-open, 2 open), retries and rejections to `registry`."""
+    with _LOCK:
+        if registry in _REGISTRIES:
+            return
+        _REGISTRIES.append(registry)
+        registry.counter("upstream_retries_total", "Retried upstream calls (transient failures).", ["upstream"])
+        registry.counter("circuit_breaker_rejections_total", "Calls failed fast by an open circuit breaker.", ["upstream"])
+        gauge = _gauge(registry)
+        for name, upstream in _UPSTREAMS.items():
+            gauge.set(STATE_VALUES[upstream.breaker.state], upstream=name)
+
+def _gauge(registry: MetricsRegistry):
+    return registry.get("circuit_breaker_state") or registry.gauge(
+        "circuit_breaker_state", "Circuit breaker state by upstream (0 closed, 1 half-open, 2 open).", ["upstream"])
+
+def _state_changed(name: str, state: str) -> None:
+    for registry in list(_REGISTRIES):
+        _gauge(registry).set(STATE_VALUES[state], upstream=name)
+
+def _count(metric: str, name: str) -> None:
+    for registry in list(_REGISTRIES):
+        counter = registry.get(metric)
+        if counter is not None:
+            counter.inc(upstream=name)
@@ -0,0 +1,39 @@
+# run_summary.py
+"""
+Summaries of a finished triage graph run, shared by evaluate_agent.py (per-scenario
+records) and triage_daemon.py (reports persisted to the triage store):
+- `summarize_run`: the tool-call trace, the routing decisions and the final report,
+- `run_stats`: step counts (LLM turns, tool calls, widest parallel batch) and wall time.
+"""
+
+def summarize_run(final_state, log):
+    """Extracts the tool-call trace and the final report from a finished graph state."""
+    agent_steps = []
+    # Parse the final state strictly to pull the actual history and the final report
+    for message in final_state["messages"][2:]: # Skip system prompt and human start prompt
+        if getattr(message, "tool_calls", None):
+            for tc in message.tool_calls:
+                agent_steps.append(f"Tool Call: {tc['name']} (args: {tc['args']})")
+        elif message.type == "tool":
+            agent_steps.append(f"Tool Result: {message.name} => {str(message.content)[:100]}...")
+        elif message.type == "human" and message.content.startswith("System Error"):
+            agent_steps.append(f"Correction Triggered: {message.content}")
+    for step in agent_steps:
+        log(f"  > {step}")
+
+    routing = final_state.get("routing", [])
+    for decision in routing:
+        log(f"  > Routed {decision['step']} -> {decision['model']} ({decision['latency_seconds']}s)")
+
+    # The final message is guaranteed to be the AI's last report before graph __end__
+    return agent_steps, routing, final_state["messages"][-1].content
+
+def run_stats(final_state, elapsed_seconds: float) -> dict:
+    """Step counts of a finished run: LLM turns, tool calls and the widest parallel batch."""
+    batches = [len(m.tool_calls) for m in final_state["messages"] if getattr(m, "tool_calls", None)]
+    return {
+        "Agent Turns": len(final_state.get("routing", [])),
+        "Tool Calls": sum(batches),
+        "Max Parallel Tool Calls": max(batches, default=0),
+        "Elapsed Seconds": round(elapsed_seconds, 3),
+    }
@@ -0,0 +1,126 @@
+# scenario_catalog.py
+"""
+Metadata index of the scenario folder for the app.py sidebar.
+
+Parsing every alert file on each Streamlit rerun does not scale to thousands of
+scenarios. `ScenarioCatalog` keeps one record per file (description, MITRE IDs, rule
+level, mtime) and persists it under .cache/, so:
+- the first build parses every file once,
+- `refresh()` only stats the folder and re-parses files whose mtime/size changed,
+- filtering by technique, severity and free text runs on the in-memory records.
+"""
+import os
+import json
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from alert_model import Alert
+
+CACHE_DIR = ".cache"
+INDEX_VERSION = 2  # 2: MITRE IDs normalised by alert_model
+
+def _index_path(directory: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(directory).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"scenario_catalog_{digest}.json")
+
+def read_metadata(path: str) -> Dict[str, Any]:
+    """Description, MITRE IDs and level of one alert file ("error" set if it can't be parsed)."""
+    try:
+        with open(path, "rb") as f:
+            alert = Alert.from_json(f.read())
+        return {
+            "description": alert.description,
+            "mitre_ids": list(alert.mitre_ids),
+            "level": alert.level,
+        }
+    except Exception as e:
+        return {"description": "", "mitre_ids": [], "level": 0, "error": str(e)}
+
+class ScenarioCatalog:
+    """Incrementally maintained index of `alert_*.json` files in one directory."""
+
+    def __init__(self, directory: str = "scenarios", index_file: Optional[str] = None):
+        self.directory = directory
+        self.index_file = index_file or _index_path(directory)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION:
+                self.entries = index["entries"]
+        except (OSError, ValueError, KeyError):
+            self.entries = {}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.index_file) or ".", exist_ok=True)
+        tmp = self.index_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "directory": self.directory, "entries": self.entries}, f)
+        os.replace(tmp, self.index_file)
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Syncs the index with the folder: new or modified files (by mtime and size) are parsed,
+        deleted ones dropped. Returns the number of added/updated/removed entries.
+        """
+        with self._lock:
+            seen = set()
+            added = updated = 0
+            if os.path.isdir(self.directory):
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        name = entry.name
+                        if not (name.startswith("alert_") and name.endswith(".json")):
+                            continue
+                        seen.add(name)
+                        stat = entry.stat()
+                        known = self.entries.get(name)
+                        if known and known["mtime_ns"] == stat.st_mtime_ns and known["size"] == stat.st_size:
+                            continue
+                        record = read_metadata(entry.path)
+                        record.update({"file": name, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size})
+                        self.entries[name] = record
+                        if known:
+                            updated += 1
+                        else:
+                            added += 1
+
+            removed = [name for name in self.entries if name not in seen]
+            for name in removed:
+                del self.entries[name]
+
+            if added or updated or removed:
+                self._save()
+            return {"added": added, "updated": updated, "removed": len(removed)}
+
+    # --- Queries ---
+    def techniques(self) -> List[str]:
+        return sorted({tid for e in self.entries.values() for tid in e["mitre_ids"]})
+
+    def filter(self, technique: Optional[str] = None, min_level: int = 0, max_level: int = 15,
+               query: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Entries sorted by file name. `technique` also matches sub-techniques
+        (T1110 -> T1110.001); `query` is a case-insensitive search over file name,
+        description and MITRE IDs.
+        """
+        query = (query or "").strip().lower()
+        results = []
+        for name in sorted(self.entries):
+            e = self.entries[name]
+            if technique and not any(tid == technique or tid.startswith(technique + ".") for tid in e["mitre_ids"]):
+                continue
+            if not (min_level <= e["level"] <= max_level):
+                continue
+            if query and query not in f"{name} {e['description']} {' '.join(e['mitre_ids'])}".lower():
+                continue
+            results.append(e)
+        return results
+
+    def __len__(self) -> int:
+        return len(self.entries)
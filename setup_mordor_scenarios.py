@@ -2,80 +2,226 @@ import os
 import io
 import json
 import zipfile
+import argparse
 import requests
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# URLs atualizados e testados do repositório OTRF/Security-Datasets (formato .zip)
-MORDOR_URLS = {
-    "T1059.001": {
-        "name": "PowerShell Command Execution",
-        "url": "https://raw.githubusercontent.com/OTRF/Security-Datasets/master/datasets/atomic/windows/execution/host/empire_launcher_vbs.zip"
-    },
-    "T1003.001": {
-        "name": "OS Credential Dumping: Mimikatz",
-        "url": "https://raw.githubusercontent.com/OTRF/Security-Datasets/master/datasets/atomic/windows/credential_access/host/empire_mimikatz_extract_keys.zip"
-    },
-    "T1021.006": {
-        "name": "Lateral Movement: Windows Remote Management",
-        "url": "https://raw.githubusercontent.com/OTRF/Security-Datasets/master/datasets/atomic/windows/lateral_movement/host/empire_psremoting_stager.zip"
-    },
-    "T1569.002": {
-        "name": "System Services: Service Execution",
-        "url": "https://raw.githubusercontent.com/OTRF/Security-Datasets/master/datasets/atomic/windows/lateral_movement/host/empire_psexec_dcerpc_tcp_svcctl.zip"
-    }
-}
+# Catálogo de datasets (nome do dataset -> técnica, nome, url, nível opcional; URLs do
+# repositório OTRF/Security-Datasets em formato .zip); acrescentar entradas aqui.
+# A chave é o nome do dataset porque a mesma técnica pode ter vários datasets.
+DATASETS_FILE = "config/mordor_datasets.json"
+
+# Cache local dos .zip (com ETag / Last-Modified para pedidos condicionais)
+CACHE_DIR = os.path.join(".cache", "mordor")
+
+# Alertas convertidos (um ficheiro JSONL por dataset, compatível com replay_alerts.py)
+OUTPUT_DIR = "mordor_alerts"
+
+def load_datasets(path=DATASETS_FILE):
+    """Carrega o catálogo de datasets (única fonte); devolve {} se o ficheiro não puder ser lido."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+    except Exception as e:
+        print(f"[-] Erro: não foi possível ler o catálogo {path} ({e}).")
+        return {}
+    datasets = {}
+    for dataset, info in catalog.items():
+        missing = [field for field in ("technique", "name", "url") if not info.get(field)]
+        if missing:
+            print(f"[-] Aviso: dataset {dataset} ignorado (faltam {', '.join(missing)}).")
+            continue
+        datasets[dataset] = info
+    return datasets
+
+# =============================================================================
+# DOWNLOAD (paralelo, com cache em disco)
+# =============================================================================
 
-def download_and_extract():
-    scenarios_dir = "scenarios"
-    if not os.path.exists(scenarios_dir):
-        os.makedirs(scenarios_dir)
-        print(f"[+] Diretório criado: {scenarios_dir}")
+def download_cached(url, cache_dir=CACHE_DIR, timeout=60):
+    """
+    Transfere `url` para a cache em streaming (sem carregar o zip em memória).
+    Envia If-None-Match / If-Modified-Since: se o servidor responder 304, reutiliza o ficheiro.
+    Devolve (caminho, alterado).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, os.path.basename(url))
+    meta_path = path + ".meta.json"
 
-    for technique_id, info in MORDOR_URLS.items():
-        print(f"[*] A transferir {info['name']} ({technique_id})...")
+    headers = {}
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return path, False
+        response.raise_for_status()
+        tmp_path = path + ".part"
         try:
-            # Transferir o ficheiro zip
-            response = requests.get(info['url'], timeout=15)
-            if response.status_code == 200:
-                print("    [+] Transferência concluída. A extrair...")
-                
-                # Abrir e extrair o ZIP na memória
-                with zipfile.ZipFile(io.BytesIO(response.content)) as z:
-                    # Encontrar o primeiro ficheiro .json dentro do zip
-                    json_filename = next((name for name in z.namelist() if name.endswith('.json')), None)
-                    
-                    if json_filename:
-                        with z.open(json_filename) as f:
-                            # Ler apenas a primeira linha (formato JSONL)
-                            first_line = f.readline().decode('utf-8')
-                            first_event = json.loads(first_line)
-                            
-                            # Converter e injetar o formato de alerta do Wazuh
-                            wazuh_alert = {
-                                "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
-                                "rule": {
-                                    "level": 12,
-                                    "description": f"MORDOR Simulation: {info['name']}",
-                                    "mitre": {
-                                        "id": [technique_id],
-                                        "technique": [info['name']]
-                                    }
-                                },
-                                "src_ip": first_event.get("SourceIP", "10.0.0.50"), # Fallback IP se não existir
-                                "full_log": json.dumps(first_event)
-                            }
-                            
-                            # Guardar na pasta scenarios
-                            out_path = os.path.join(scenarios_dir, f"alert_mordor_{technique_id.replace('.', '_')}.json")
-                            with open(out_path, "w") as out_f:
-                                json.dump(wazuh_alert, out_f, indent=2)
-                            print(f"    [+] Guardado com sucesso em {out_path}")
-                    else:
-                        print("    [-] Nenhum ficheiro .json encontrado dentro do zip.")
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            # Transferência interrompida: não deixar um .part incompleto na cache
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "downloaded_at": datetime.utcnow().isoformat(),
+            }, f)
+    return path, True
+
+# =============================================================================
+# CONVERSÃO (streaming: evento a evento, directamente do zip em disco)
+# =============================================================================
+
+def iter_zip_events(zip_path):
+    """Lê todos os eventos JSONL de todos os .json dentro do zip, linha a linha."""
+    with zipfile.ZipFile(zip_path) as z:
+        for name in z.namelist():
+            if not name.endswith(".json"):
+                continue
+            with z.open(name) as raw:
+                for line in io.TextIOWrapper(raw, encoding="utf-8", errors="replace"):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+def _first(event, *keys, default=None):
+    for key in keys:
+        value = event.get(key)
+        if value not in (None, "", "-"):
+            return value
+    return default
+
+def _event_timestamp(event):
+    # Os datasets usam @timestamp (ISO) ou TimeCreated / EventTime
+    value = _first(event, "@timestamp", "TimeCreated", "EventTime")
+    if not value:
+        return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+    value = str(value).replace(" ", "T")
+    if value.endswith("Z"):
+        value = value[:-1]
+    return value[:23] + "+0000"
+
+def event_to_alert(event, info):
+    """Converte um evento Windows/Sysmon do Mordor num alerta no formato do Wazuh."""
+    event_id = _first(event, "EventID", "event_id")
+    channel = _first(event, "Channel", "SourceName", default="Unknown")
+    computer = _first(event, "Hostname", "Computer", "host", default="mordor-host")
+    technique_id = info["technique"]
+    return {
+        "timestamp": _event_timestamp(event),
+        "rule": {
+            "level": info.get("level", 12),
+            "description": f"MORDOR Simulation: {info['name']}",
+            "mitre": {
+                "id": [technique_id],
+                "technique": [info['name']]
+            }
+        },
+        "agent": {"name": computer},
+        "data": {"win": {"system": {"eventID": event_id, "channel": channel, "computer": computer}}},
+        "src_ip": _first(event, "SourceIP", "SourceIp", "SourceAddress", "IpAddress", default="10.0.0.50"), # Fallback IP se não existir
+        "full_log": json.dumps(event, separators=(",", ":"))
+    }
+
+def output_path(dataset, out_dir=OUTPUT_DIR):
+    """Um ficheiro JSONL por dataset (não por técnica, para não se sobreporem)."""
+    return os.path.join(out_dir, f"mordor_{dataset}.jsonl")
+
+def convert_dataset(dataset, info, zip_path, out_dir=OUTPUT_DIR, scenarios_dir=None):
+    """Escreve todos os eventos do dataset como alertas JSONL. Devolve (caminho, nº de alertas)."""
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = output_path(dataset, out_dir)
+    tmp_path = out_path + ".part"
+    count = 0
+    first_alert = None
+    buffer = []
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as out_f:
+            for event in iter_zip_events(zip_path):
+                alert = event_to_alert(event, info)
+                if first_alert is None:
+                    first_alert = alert
+                buffer.append(json.dumps(alert, separators=(",", ":"), ensure_ascii=False))
+                count += 1
+                if len(buffer) >= 5000:
+                    out_f.write("\n".join(buffer) + "\n")
+                    buffer.clear()
+            if buffer:
+                out_f.write("\n".join(buffer) + "\n")
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        # Zip corrompido ou conversão interrompida: o JSONL anterior (se existir) fica intacto
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Cenário individual (primeiro evento) para o evaluate_agent.py, como antes
+    if scenarios_dir and first_alert:
+        os.makedirs(scenarios_dir, exist_ok=True)
+        scenario_path = os.path.join(scenarios_dir, f"alert_mordor_{dataset}.json")
+        with open(scenario_path, "w") as f:
+            json.dump(first_alert, f, indent=2)
+    return out_path, count
+
+def ingest_dataset(dataset, info, out_dir, scenarios_dir, force=False):
+    zip_path, changed = download_cached(info['url'])
+    out_path = output_path(dataset, out_dir)
+    if not changed and not force and os.path.exists(out_path):
+        return out_path, None  # Inalterado desde a última execução
+    return convert_dataset(dataset, info, zip_path, out_dir, scenarios_dir)
+
+def download_and_extract(workers=8, out_dir=OUTPUT_DIR, scenarios_dir="scenarios", force=False, datasets_file=DATASETS_FILE):
+    datasets = load_datasets(datasets_file)
+    if not datasets:
+        print("[-] Nenhum dataset para processar.")
+        return
+    print(f"[*] A processar {len(datasets)} datasets com {workers} transferências em paralelo...")
+
+    total = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(ingest_dataset, dataset, info, out_dir, scenarios_dir, force): (dataset, info)
+            for dataset, info in datasets.items()
+        }
+        for future in as_completed(futures):
+            dataset, info = futures[future]
+            try:
+                out_path, count = future.result()
+            except Exception as e:
+                print(f"    [-] Erro a processar o dataset {dataset} ({info.get('technique')}): {str(e)}")
+                continue
+            if count is None:
+                print(f"    [=] {dataset} ({info['technique']}): sem alterações, {out_path} mantido.")
             else:
-                print(f"    [-] Falha ao transferir: HTTP {response.status_code}")
-        except Exception as e:
-            print(f"    [-] Erro a processar a tática {technique_id}: {str(e)}")
+                total += count
+                print(f"    [+] {dataset} ({info['technique']}): {count} alertas guardados em {out_path}")
+    print(f"[+] Concluído. {total} novos alertas convertidos em '{out_dir}'.")
 
 if __name__ == "__main__":
-    download_and_extract()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingestão dos datasets Mordor (OTRF) como alertas do Wazuh em JSONL.")
+    parser.add_argument("--workers", type=int, default=8, help="Transferências/conversões em paralelo")
+    parser.add_argument("--out-dir", default=OUTPUT_DIR)
+    parser.add_argument("--no-scenarios", action="store_true", help="Não escrever o cenário individual em scenarios/")
+    parser.add_argument("--force", action="store_true", help="Reconverter mesmo que o zip não tenha mudado")
+    parser.add_argument("--datasets", default=DATASETS_FILE, help="Catálogo JSON (nome do dataset -> técnica, nome, url, nível)")
+    args = parser.parse_args()
+
+    download_and_extract(args.workers, args.out_dir, None if args.no_scenarios else "scenarios", args.force, args.datasets)
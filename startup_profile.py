@@ -0,0 +1,186 @@
+# startup_profile.py
+"""
+Startup profiling for app.py.
+
+Streamlit re-executes app.py on every interaction, so anything slow before the first
+element is drawn (imports, HTTP calls, folder scans) is paid on the first paint and on
+every rerun. `StartupProfile` times the phases of one script run and the lazy imports
+done during it; app.py marks "ui_ready" once the sidebar is drawn, and that time is
+checked against a budget:
+
+    APP_STARTUP_BUDGET_MS  (default 1500)  first run of a browser session (cold imports)
+    APP_RERUN_BUDGET_MS    (default 300)   every later rerun
+    APP_PROFILE=1          show the phase breakdown in the sidebar
+
+Long-running actions (MCP fetches, agent runs) happen after "ui_ready" and are recorded
+as phases but not counted against the budget.
+
+CLI: import-time and first-paint profile of the app, one fresh interpreter per
+measurement so nothing is already imported:
+    python startup_profile.py                   # table; exit code 1 if over budget
+    python startup_profile.py --output startup_profile.json
+"""
+import os
+import sys
+import json
+import time
+import importlib
+import subprocess
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+STARTUP_BUDGET_MS = float(os.getenv("APP_STARTUP_BUDGET_MS", "1500"))
+RERUN_BUDGET_MS = float(os.getenv("APP_RERUN_BUDGET_MS", "300"))
+
+# Modules app.py loads only in the modes that need them
+HEAVY_MODULES = ["agent", "mcp_transport", "ollama", "ollama_warmup", "prompts", "tracing", "langgraph", "langchain_core"]
+
+class StartupProfile:
+    """Phase timings of one Streamlit script run (milliseconds from script start)."""
+
+    def __init__(self, started: Optional[float] = None, first_run: bool = True):
+        self.started = started or time.perf_counter()
+        self.first_run = first_run
+        self.phases: List[Dict[str, Any]] = []
+        self.marks: Dict[str, float] = {}
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    @contextmanager
+    def phase(self, name: str):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({"phase": name, "ms": round((time.perf_counter() - begin) * 1000, 1)})
+
+    def lazy_import(self, module_name: str):
+        """Imports a module on first use, recording the cost the first time only."""
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+        with self.phase(f"import {module_name}"):
+            return importlib.import_module(module_name)
+
+    def mark(self, name: str) -> float:
+        self.marks[name] = round(self.elapsed_ms(), 1)
+        return self.marks[name]
+
+    @property
+    def budget_ms(self) -> float:
+        return STARTUP_BUDGET_MS if self.first_run else RERUN_BUDGET_MS
+
+    def check_budget(self, mark: str = "ui_ready") -> Optional[str]:
+        """Warning text if `mark` came later than the budget (also written to stderr), else None."""
+        spent = self.marks.get(mark)
+        if spent is None or spent <= self.budget_ms:
+            return None
+        slowest = sorted(self.phases, key=lambda p: p["ms"], reverse=True)[:3]
+        detail = ", ".join(f"{p['phase']} {p['ms']:.0f} ms" for p in slowest)
+        kind = "first paint" if self.first_run else "rerun"
+        warning = f"{kind} took {spent:.0f} ms (budget {self.budget_ms:.0f} ms); slowest: {detail}"
+        sys.stderr.write(f"[STARTUP] {warning}\n")
+        return warning
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "first_run": self.first_run,
+            "total_ms": round(self.elapsed_ms(), 1),
+            "budget_ms": self.budget_ms,
+            "marks": dict(self.marks),
+            "phases": list(self.phases),
+        }
+
+# ==========================================
+# CLI: import-time and first-paint profile
+# ==========================================
+_IMPORT_PROBE = """
+import time, importlib, streamlit
+t = time.perf_counter()
+importlib.import_module({module!r})
+print((time.perf_counter() - t) * 1000)
+"""
+
+_APP_PROBE = """
+import sys, json, time
+from streamlit.testing.v1 import AppTest
+started = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=180)
+at.run()
+result = {{"first_run": at.session_state["startup_profile"], "first_run_wall_ms": (time.perf_counter() - started) * 1000}}
+if {mode!r}:
+    at.sidebar.radio[0].set_value({mode!r}).run()
+    result["mode_switch"] = at.session_state["startup_profile"]
+at.run()
+result["rerun"] = at.session_state["startup_profile"]
+result["loaded"] = [m for m in {heavy!r} if m in sys.modules]
+result["exceptions"] = [str(e.value) for e in at.exception]
+print(json.dumps(result))
+"""
+
+def _probe(code: str) -> str:
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)) or ".", timeout=600)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "probe failed")
+    return out.stdout.strip().splitlines()[-1]
+
+def profile_imports(modules: List[str]) -> Dict[str, float]:
+    """Cold import time of each module on top of streamlit (fresh interpreter each)."""
+    return {m: round(float(_probe(_IMPORT_PROBE.format(module=m))), 1) for m in modules}
+
+def profile_app(app: str = "app.py", modes: Optional[List[str]] = None) -> Dict[str, Any]:
+    """First paint (default mode), rerun, and switching to each of `modes` in a fresh interpreter."""
+    results = {}
+    for mode in [None] + list(modes or []):
+        results[mode or "default"] = json.loads(_probe(_APP_PROBE.format(app=app, mode=mode, heavy=HEAVY_MODULES)))
+    return results
+
+def format_profile(imports: Dict[str, float], app: Dict[str, Any]) -> str:
+    lines = ["[*] Cold import cost (ms, on top of streamlit):"]
+    for module, ms in sorted(imports.items(), key=lambda kv: kv[1], reverse=True):
+        lines.append(f"    {module:<20}{ms:>8.0f}")
+    lines.append("[*] App script runs (ms until the sidebar is drawn / whole run):")
+    for mode, r in app.items():
+        first = r["first_run"]
+        lines.append(f"    {mode:<28} first paint {first['marks'].get('ui_ready', 0):>6.0f} / {first['total_ms']:>6.0f}"
+                     f"   rerun {r['rerun']['marks'].get('ui_ready', 0):>5.0f} / {r['rerun']['total_ms']:>6.0f}")
+        if "mode_switch" in r:
+            lines.append(f"    {'':<28} mode switch {r['mode_switch']['marks'].get('ui_ready', 0):>6.0f} / {r['mode_switch']['total_ms']:>6.0f}")
+        lines.append(f"    {'':<28} heavy modules loaded: {', '.join(r['loaded']) or 'none'}")
+        for e in r["exceptions"]:
+            lines.append(f"    [-] {e}")
+    return "\n".join(lines)
+
+def over_budget(app: Dict[str, Any]) -> List[str]:
+    problems = []
+    for mode, r in app.items():
+        for key in ("first_run", "mode_switch", "rerun"):
+            run = r.get(key)
+            if run and run["marks"].get("ui_ready", 0) > run["budget_ms"]:
+                problems.append(f"{mode} {key}: {run['marks']['ui_ready']:.0f} ms > {run['budget_ms']:.0f} ms")
+    return problems
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import-time and first-paint profile of the Streamlit app.")
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--modes", nargs="*", default=["Triage Daemon (Read-only)", "Static RAG (Interactive)"],
+                        help="Sidebar modes to switch to after the first run")
+    parser.add_argument("--output", default=None, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    imports = profile_imports(HEAVY_MODULES + ["scenario_catalog", "context_cache", "triage_store", "alert_model"])
+    app_results = profile_app(args.app, args.modes)
+    print(format_profile(imports, app_results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"imports_ms": imports, "app": app_results}, f, indent=4)
+        print(f"[+] Results saved to {args.output}")
+
+    problems = over_budget(app_results)
+    for problem in problems:
+        print(f"[-] Over budget: {problem}")
+    sys.exit(1 if problems else 0)
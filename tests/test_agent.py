@@ -0,0 +1,70 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import agent
+from fake_llm import ScriptedChatModel
+from prompts import triage_messages
+
+SCENARIO = os.path.join(os.path.dirname(__file__), "..", "scenarios", "alert_multi_technique.json")
+with open(SCENARIO, "r", encoding="utf-8") as f:
+    MULTI_TECHNIQUE_ALERT = json.load(f)
+
+PLAYBOOKS = {"T1110": "### MITRE T1110: block the source IP", "T1078": "### MITRE T1078: reset the credentials"}
+
+class MitreSession:
+    """Answers the MITRE server's tools like mitre_server.py does, without the MCP transport."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def call_tool(self, name, arguments=None, **kwargs):
+        technique = arguments["technique_id"]
+        self.calls.append((name, technique))
+        if name == "get_playbook":
+            text = PLAYBOOKS.get(technique, f"❌ No custom playbook found for technique ID: {technique}.")
+        else:
+            text = f"MITRE ATT&CK {technique}: official description"
+        return SimpleNamespace(isError=False, content=[SimpleNamespace(type="text", text=text)])
+
+class MistypingModel(ScriptedChatModel):
+    """Looks up a technique ID that is not in the alert on every Tier 1 turn."""
+
+    def _turn(self, messages):
+        output, prompt_tokens = super()._turn(messages)
+        if self.bound_tools == ["get_tier1_playbook"]:
+            output = {"content": "", "tool_calls": [{"name": "get_tier1_playbook", "args": {"technique_id": "T9999"}}]}
+        return output, prompt_tokens
+
+def triage(model="fake:agent-test", **configurable):
+    session = MitreSession()
+    graph = agent.build_react_agent(model)
+    config = agent.run_config(None, session, alert=MULTI_TECHNIQUE_ALERT, model_force="large", **configurable)
+    state = asyncio.run(graph.ainvoke({"messages": triage_messages()}, config))
+    turns = [[(tc["name"], tc["args"].get("technique_id")) for tc in m.tool_calls]
+             for m in state["messages"] if m.type == "ai"]
+    return state, turns, session
+
+def test_multi_technique_alert_looks_up_every_technique_in_one_turn():
+    state, turns, session = triage()
+    assert turns[0] == [("fetch_wazuh_alerts", None)]
+    assert turns[1] == [("get_tier1_playbook", t) for t in ("T1110", "T1078", "T1098")]
+    # Only the Tier 1 miss goes to Tier 2
+    assert turns[2] == [("get_tier2_mitre_data", "T1098")]
+    assert turns[3] == []
+    assert ("get_tier2_mitre_data", "T1098") in session.calls
+    assert "block the source IP" in state["messages"][-1].content
+
+def test_sequential_lookups_keep_tier1_until_every_technique_is_covered():
+    _, turns, _ = triage(parallel_tool_calls=False)
+    tier1 = [calls for calls in turns if calls and calls[0][0] == "get_tier1_playbook"]
+    assert tier1 == [[("get_tier1_playbook", t)] for t in ("T1110", "T1078", "T1098")]
+
+def test_mistyped_technique_id_does_not_loop(monkeypatch):
+    monkeypatch.setitem(agent._LLM_CACHE, "mistyping", MistypingModel(model="mistyping"))
+    state, turns, _ = triage("mistyping")
+    tier1 = [calls for calls in turns if calls and calls[0][0] == "get_tier1_playbook"]
+    # One call per technique plus one: then Tier 2 is offered instead
+    assert len(tier1) == len(MULTI_TECHNIQUE_ALERT["rule"]["mitre"]["id"]) + 1
+    assert state["messages"][-1].content.startswith("# SOC Triage Report")
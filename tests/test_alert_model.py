@@ -0,0 +1,21 @@
+from alert_model import Alert, normalize_technique_ids
+
+def test_normalize_upper_cases_and_strips():
+    assert normalize_technique_ids([" t1110 ", "T1059.001"]) == ("T1110", "T1059.001")
+
+def test_normalize_dedupes_in_order():
+    assert normalize_technique_ids(["T1098", "t1110", "T1098", "T1110"]) == ("T1098", "T1110")
+
+def test_normalize_drops_invalid_ids():
+    assert normalize_technique_ids(["T1110", "", "N/A", "TA0001", "1110", None]) == ("T1110",)
+    assert normalize_technique_ids(["not-an-id"]) == ()
+
+def test_normalize_accepts_scalars_and_empty():
+    assert normalize_technique_ids("t1078") == ("T1078",)
+    assert normalize_technique_ids(None) == ()
+    assert normalize_technique_ids([]) == ()
+
+def test_alert_from_dict_uses_normalized_ids():
+    alert = Alert.from_dict({"rule": {"level": "12", "mitre": {"id": ["t1110", "T1110", "bogus"]}}})
+    assert alert.level == 12
+    assert alert.mitre_ids == ("T1110",)
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from context_cache import ContextCache, alert_fingerprint, mark_mitre_snapshot
+
+ALERT = {"rule": {"level": 10, "mitre": {"id": ["T1110"]}}, "src_ip": "10.0.0.5"}
+
+@pytest.fixture
+def cache(tmp_path):
+    playbooks = tmp_path / "playbooks.json"
+    playbooks.write_text("{}")
+    return ContextCache(ttl_seconds=60, max_entries=2, snapshot_file=str(tmp_path / "snapshot.json"),
+                        playbooks_file=str(playbooks))
+
+def test_fingerprint_ignores_key_order():
+    reordered = {"src_ip": "10.0.0.5", "rule": {"mitre": {"id": ["T1110"]}, "level": 10}}
+    assert alert_fingerprint(ALERT) == alert_fingerprint(reordered)
+
+def test_hit_after_put_and_errors_not_cached(cache):
+    assert cache.get(ALERT, "T1110", "tier1") is None
+    cache.put(ALERT, "T1110", "tier1", "### playbook")
+    cache.put(ALERT, "T1110", "tier2", "❌ Technique not found")
+    assert cache.get(ALERT, "T1110", "tier1") == "### playbook"
+    assert cache.get(ALERT, "T1110", "tier2") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+def test_entries_expire_after_ttl(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("context_cache.time.monotonic", lambda: now[0])
+    cache.put(ALERT, "T1110", "tier1", "### playbook")
+    now[0] += 61
+    assert cache.get(ALERT, "T1110", "tier1") is None
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.put(ALERT, "T1110", "tier1", "a")
+    cache.put(ALERT, "T1110", "tier2", "b")
+    cache.get(ALERT, "T1110", "tier1")
+    cache.put(ALERT, "T1110", "full", "c")
+    assert cache.get(ALERT, "T1110", "tier2") is None
+    assert cache.get(ALERT, "T1110", "tier1") == "a"
+
+def test_new_mitre_snapshot_invalidates_entries(cache):
+    assert mark_mitre_snapshot("d1", 600, cache.snapshot_file) is True
+    cache.put(ALERT, "T1110", "tier2", "MITRE data")
+    # Same digest: the file is not rewritten, so the entry survives
+    assert mark_mitre_snapshot("d1", 600, cache.snapshot_file) is False
+    assert cache.get(ALERT, "T1110", "tier2") == "MITRE data"
+    os.utime(cache.snapshot_file, ns=(1, 1))
+    assert cache.get(ALERT, "T1110", "tier2") is None
+
+def test_playbooks_change_invalidates_entries(cache):
+    cache.put(ALERT, "T1110", "tier1", "### playbook")
+    os.utime(cache.playbooks_file, ns=(1, 1))
+    assert cache.get(ALERT, "T1110", "tier1") is None
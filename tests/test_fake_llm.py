@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from fake_llm import ScriptedChatModel, ScriptedTriagePolicy
+
+ALERT = {"rule": {"level": 10, "description": "Brute force", "mitre": {"id": ["T1110", "T1078"]}}, "src_ip": "10.0.0.5"}
+TOOLS = ["fetch_wazuh_alerts", "get_tier1_playbook", "get_tier2_mitre_data"]
+
+def conversation(*tier1_results):
+    messages = [
+        {"role": "user", "content": "start", "tool_calls": [], "name": None},
+        {"role": "assistant", "content": "", "tool_calls": [{"name": "fetch_wazuh_alerts", "args": {}}], "name": None},
+        {"role": "tool", "content": json.dumps([ALERT]), "tool_calls": [], "name": "fetch_wazuh_alerts"},
+    ]
+    if tier1_results:
+        calls = [{"name": "get_tier1_playbook", "args": {"technique_id": t}} for t in ("T1110", "T1078")]
+        messages.append({"role": "assistant", "content": "", "tool_calls": calls, "name": None})
+        messages += [{"role": "tool", "content": r, "tool_calls": [], "name": "get_tier1_playbook"} for r in tier1_results]
+    return messages
+
+# ==========================================
+# Scripted Policy
+# ==========================================
+def test_policy_looks_up_every_technique_in_one_turn():
+    turn = ScriptedTriagePolicy().next_turn(conversation(), TOOLS)
+    assert [tc["args"]["technique_id"] for tc in turn["tool_calls"]] == ["T1110", "T1078"]
+
+def test_policy_sends_only_tier1_misses_to_tier2_then_reports():
+    policy = ScriptedTriagePolicy()
+    turn = policy.next_turn(conversation("### T1110 playbook", "❌ No custom playbook found"), TOOLS)
+    assert turn["tool_calls"] == [{"name": "get_tier2_mitre_data", "args": {"technique_id": "T1078"}}]
+    report = policy.next_turn(conversation("### T1110 playbook", "### T1078 playbook"), TOOLS)
+    assert report["tool_calls"] == [] and "### T1110 playbook" in report["content"]
+
+def test_hallucination_depends_only_on_seed_and_tool_results():
+    outcomes = [ScriptedTriagePolicy(hallucination_rate=0.5, seed=seed).next_turn(conversation(), TOOLS)["tool_calls"] == []
+                for seed in range(20)]
+    again = [ScriptedTriagePolicy(hallucination_rate=0.5, seed=seed).next_turn(conversation(), TOOLS)["tool_calls"] == []
+             for seed in range(20)]
+    assert outcomes == again and any(outcomes) and not all(outcomes)
+
+# ==========================================
+# Chat Model Pacing
+# ==========================================
+class Tokens(BaseCallbackHandler):
+    def __init__(self):
+        self.tokens = []
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.tokens.append(token)
+
+def final_report_messages():
+    return [HumanMessage(content="start"),
+            AIMessage(content="", tool_calls=[{"name": "fetch_wazuh_alerts", "args": {}, "id": "f"}]),
+            ToolMessage(content=json.dumps([ALERT]), name="fetch_wazuh_alerts", tool_call_id="f")]
+
+def test_sync_and_async_share_the_same_token_pacing(monkeypatch):
+    sleeps = {"sync": [], "async": []}
+    monkeypatch.setattr("fake_llm.time.sleep", sleeps["sync"].append)
+
+    async def fake_async_sleep(delay):
+        sleeps["async"].append(delay)
+    monkeypatch.setattr("fake_llm.asyncio.sleep", fake_async_sleep)
+
+    model = ScriptedChatModel(token_latency=0.01, first_token_latency=0.5)
+    sync_tokens, async_tokens = Tokens(), Tokens()
+    sync_message = model.invoke(final_report_messages(), config={"callbacks": [sync_tokens]})
+    async_message = asyncio.run(model.ainvoke(final_report_messages(), config={"callbacks": [async_tokens]}))
+
+    assert sync_message.content == async_message.content
+    assert sync_tokens.tokens == async_tokens.tokens and "".join(sync_tokens.tokens) == sync_message.content
+    # Prefill once, then one sleep per token (not the whole latency in one block)
+    assert sleeps["sync"] == sleeps["async"] == [0.5] + [0.01] * len(sync_tokens.tokens)
+    assert sync_message.response_metadata == {**async_message.response_metadata,
+                                              "created_at": sync_message.response_metadata["created_at"]}
@@ -0,0 +1,59 @@
+import urllib.request
+
+import pytest
+
+from metrics import MetricsRegistry, is_error_result, metered_tool, start_metrics_server
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry("test-server")
+
+def test_is_error_result_matches_in_band_failures():
+    assert is_error_result("❌ No custom playbook found")
+    assert is_error_result('{"error": "timeout"}')
+    assert not is_error_result("### MITRE T1110")
+    assert not is_error_result({"error": "not a string"})
+
+def test_metered_tool_counts_outcomes(registry):
+    @metered_tool(registry)
+    def get_playbook(technique_id):
+        if technique_id == "boom":
+            raise RuntimeError("boom")
+        return "### playbook" if technique_id == "T1110" else "❌ not found"
+
+    get_playbook("T1110")
+    get_playbook("T9999")
+    with pytest.raises(RuntimeError):
+        get_playbook("boom")
+    assert [registry.tool_calls.value(tool="get_playbook", status=s) for s in ("ok", "error", "exception")] == [1, 1, 1]
+    assert registry.tool_duration.count(tool="get_playbook") == 3
+
+def test_time_upstream_records_errors_and_reraises(registry):
+    with registry.time_upstream("wazuh", "auth"):
+        pass
+    with pytest.raises(ValueError):
+        with registry.time_upstream("wazuh", "auth"):
+            raise ValueError("bad token")
+    assert registry.upstream_requests.value(upstream="wazuh", operation="auth", status="ok") == 1
+    assert registry.upstream_requests.value(upstream="wazuh", operation="auth", status="error") == 1
+
+def test_render_uses_prometheus_text_format(registry):
+    registry.record_lookup("mitre", hit=True)
+    registry.histogram("lookup_seconds", "Lookup latency.", buckets=(0.1, 1.0)).observe(0.5)
+    registry.gauge("techniques_loaded", "Techniques in memory.").set_function(lambda: 600)
+    text = registry.render()
+    assert '# TYPE cache_lookups_total counter' in text
+    assert 'cache_lookups_total{cache="mitre",result="hit"} 1.0' in text
+    assert 'lookup_seconds_bucket{le="0.1"} 0.0' in text and 'lookup_seconds_bucket{le="1.0"} 1.0' in text
+    assert 'lookup_seconds_bucket{le="+Inf"} 1.0' in text and "lookup_seconds_sum 0.5" in text
+    assert "techniques_loaded 600" in text
+
+def test_http_endpoint_serves_metrics(registry):
+    registry.record_lookup("mitre", hit=False)
+    server = start_metrics_server(registry, 0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert 'result="miss"' in response.read().decode("utf-8")
+    finally:
+        server.shutdown()
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+from model_router import DEFAULT_ROUTING_CONFIG, ModelRouter, classify_step, tier1_hit
+
+MISS = "❌ No custom playbook found for technique ID: T1078."
+
+def tool(name, content):
+    return ToolMessage(content=content, name=name, tool_call_id=f"{name}-{len(content)}")
+
+def fetched(level=5, techniques=("T1110",)):
+    alert = {"rule": {"level": level, "description": "test", "mitre": {"id": list(techniques)}}}
+    return [AIMessage(content="", tool_calls=[{"name": "fetch_wazuh_alerts", "args": {}, "id": "f"}]),
+            tool("fetch_wazuh_alerts", json.dumps([alert]))]
+
+def playbook(technique="T1110"):
+    return tool("get_tier1_playbook", f"### MITRE {technique}: playbook")
+
+@pytest.fixture
+def config():
+    config = json.loads(json.dumps(DEFAULT_ROUTING_CONFIG))
+    config.update(small_model="small", large_model="large", probe_interval_seconds=300.0)
+    return config
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("model_router.time.monotonic", lambda: now[0])
+    return now
+
+# ==========================================
+# Steps
+# ==========================================
+def test_classify_steps():
+    assert classify_step([]) == "tool_selection"
+    assert classify_step(fetched()) == "tool_selection"
+    assert classify_step(fetched() + [playbook()]) == "playbook_report"
+    assert classify_step(fetched() + [tool("get_tier1_playbook", MISS)]) == "fallback"
+
+def test_partial_tier1_hit_is_fallback():
+    assert tier1_hit([playbook(), tool("get_tier1_playbook", MISS)]) is False
+    assert classify_step(fetched(techniques=("T1110", "T1078")) + [playbook(), tool("get_tier1_playbook", MISS)]) == "fallback"
+
+def test_step_rules_pick_model(config):
+    router = ModelRouter("ui-model", config)
+    assert router.route(fetched())["model"] == "small"
+    assert router.route(fetched() + [playbook()])["model"] == "small"
+    assert router.route(fetched() + [tool("get_tier1_playbook", MISS)])["model"] == "large"
+
+def test_null_large_model_means_ui_model(config):
+    config["large_model"] = None
+    assert ModelRouter("ui-model", config).large_model == "ui-model"
+
+# ==========================================
+# Severity and caller preferences
+# ==========================================
+def test_high_severity_uses_large_model_after_tool_selection(config):
+    router = ModelRouter("ui-model", config)
+    assert router.route(fetched(level=12))["model"] == "small"
+    decision = router.route(fetched(level=12) + [playbook()])
+    assert decision["model"] == "large" and decision["alert_level"] == 12
+
+def test_prefer_replaces_step_rule(config):
+    router = ModelRouter("ui-model", config)
+    assert router.route(fetched() + [playbook()], prefer="large")["model"] == "large"
+    assert router.route(fetched(), prefer="large")["reason"] == "prefer->large"
+
+def test_prefer_yields_to_fallback_and_severity(config):
+    router = ModelRouter("ui-model", config)
+    assert router.route(fetched() + [tool("get_tier1_playbook", MISS)], prefer="small")["model"] == "large"
+    assert router.route(fetched(level=13) + [playbook()], prefer="small")["model"] == "large"
+    assert router.route(fetched(level=13), prefer="small")["model"] == "small"
+
+def test_force_overrides_every_rule(config):
+    router = ModelRouter("ui-model", config)
+    router.record_latency("large", 999)
+    assert router.route(fetched(level=13) + [tool("get_tier1_playbook", MISS)], force="small")["model"] == "small"
+    decision = router.route(fetched() + [playbook()], force="large")
+    assert decision["model"] == "large" and decision["reason"] == "force->large"
+
+# ==========================================
+# Latency budget
+# ==========================================
+def test_over_budget_model_is_demoted(config, clock):
+    router = ModelRouter("ui-model", config)
+    router.record_latency("large", 60)
+    decision = router.route(fetched() + [tool("get_tier1_playbook", MISS)])
+    assert decision["model"] == "small" and "over 30.0s budget" in decision["reason"]
+
+def test_high_severity_is_never_demoted(config, clock):
+    router = ModelRouter("ui-model", config)
+    router.record_latency("large", 60)
+    assert router.route(fetched(level=12) + [tool("get_tier1_playbook", MISS)])["model"] == "large"
+
+def test_demoted_model_is_probed_once_per_interval(config, clock):
+    router = ModelRouter("ui-model", config)
+    fallback = fetched() + [tool("get_tier1_playbook", MISS)]
+    router.record_latency("large", 60)
+    clock[0] += 299
+    assert router.route(fallback)["model"] == "small"
+    clock[0] += 1
+    probe = router.route(fallback)
+    assert probe["model"] == "large" and "probing large" in probe["reason"]
+    # The probe is in flight: other runs keep using the small model
+    assert router.route(fallback)["model"] == "small"
+
+def test_probe_sample_replaces_stale_ewma(config, clock):
+    router = ModelRouter("ui-model", config)
+    fallback = fetched() + [tool("get_tier1_playbook", MISS)]
+    router.record_latency("large", 60)
+    clock[0] += 300
+    assert router.route(fallback)["model"] == "large"
+    router.record_latency("large", 5)
+    assert router.expected_latency("large") == 5
+    assert router.route(fallback)["model"] == "large"
+
+def test_recent_samples_are_averaged(config, clock):
+    router = ModelRouter("ui-model", config)
+    router.record_latency("large", 10)
+    clock[0] += 10
+    router.record_latency("large", 20)
+    assert router.expected_latency("large") == pytest.approx(0.3 * 20 + 0.7 * 10)
@@ -0,0 +1,28 @@
+import pytest
+
+import fake_llm
+from ollama_warmup import OllamaWarmupManager, agent_step_tools
+
+@pytest.fixture
+def server():
+    server = fake_llm.serve("127.0.0.1", 0)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+def test_priming_request_binds_the_agent_first_step_tools():
+    request = OllamaWarmupManager(host="http://127.0.0.1:1")._agent_request()
+    assert [t["function"]["name"] for t in request["tools"]] == ["fetch_wazuh_alerts"]
+    assert request["tools"] == agent_step_tools()
+    assert request["messages"][0]["role"] == "system"
+
+def test_preload_and_measure_against_ollama_api(server):
+    manager = OllamaWarmupManager(host=server)
+    assert manager.preload("fake-small") is True
+    assert "fake-small" in manager.warm_models
+    # The fake model answers the bound tool with a tool call and no content
+    result = manager.measure_ttft("fake-small")
+    assert result["ttft_seconds"] <= result["total_seconds"]
+    assert result["prompt_tokens"] > 0
+
+def test_preload_reports_unreachable_host():
+    assert OllamaWarmupManager(host="http://127.0.0.1:1").preload("llama3.2") is False
@@ -0,0 +1,150 @@
+import time
+
+import pytest
+import requests
+
+from resilience import CircuitBreaker, TokenBucket, Upstream, UpstreamUnavailable, is_transient
+
+class Clock:
+    """Stands in for time.monotonic() in the resilience module."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("resilience.time.monotonic", clock)
+    return clock
+
+# ==========================================
+# Circuit Breaker
+# ==========================================
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # Resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() == pytest.approx(30)
+
+def test_breaker_half_open_allows_one_trial(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # Trial in flight
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+def test_breaker_failed_trial_reopens(clock):
+    changes = []
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30, on_change=lambda n, s: changes.append(s))
+    breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    assert changes == ["open", "half_open", "open"]
+
+def test_breaker_release_gives_back_the_trial(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=1)
+    breaker.record_failure()
+    clock.now += 1
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+# ==========================================
+# Token Bucket
+# ==========================================
+def test_bucket_allows_burst_then_spaces_calls(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    # Reservations queue up behind each other at 1 / rate
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+def test_bucket_refills_up_to_burst(clock):
+    bucket = TokenBucket(rate=1, burst=2)
+    bucket.reserve()
+    bucket.reserve()
+    clock.now += 100
+    assert [bucket.reserve() for _ in range(2)] == [0, 0]
+    assert bucket.reserve() == pytest.approx(1.0)
+
+def test_bucket_with_zero_rate_is_unlimited():
+    bucket = TokenBucket(rate=0, burst=1)
+    assert all(bucket.reserve() == 0 for _ in range(100))
+
+# ==========================================
+# Upstream
+# ==========================================
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(f"{status}", response=response)
+
+def test_is_transient_classification():
+    assert is_transient(requests.exceptions.ConnectionError())
+    assert is_transient(requests.exceptions.Timeout())
+    assert is_transient(http_error(503))
+    assert is_transient(http_error(429))
+    assert not is_transient(http_error(401))
+    assert not is_transient(http_error(404))
+    assert not is_transient(ValueError("bad input"))
+
+def upstream(**overrides):
+    settings = {"max_attempts": 3, "rate_per_second": 0, "burst": 1, "failure_threshold": 2,
+                "reset_timeout_seconds": 60, "connect_timeout_seconds": 1, "read_timeout_seconds": 1,
+                "base_delay_seconds": 0, "max_delay_seconds": 0, "retry_budget_seconds": 60}
+    settings.update(overrides)
+    return Upstream("test", settings)
+
+def test_upstream_retries_transient_then_succeeds():
+    api = upstream(failure_threshold=5)
+    calls = []
+
+    def flaky():
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            raise requests.exceptions.ConnectionError("refused")
+        return "ok"
+
+    assert api.call(flaky) == "ok"
+    assert len(calls) == 3 and api.retries == 2
+    assert api.breaker.state == CircuitBreaker.CLOSED
+
+def test_upstream_does_not_retry_client_errors():
+    api = upstream()
+    calls = []
+
+    def unauthorized():
+        calls.append(1)
+        raise http_error(401)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        api.call(unauthorized)
+    assert len(calls) == 1 and api.breaker.state == CircuitBreaker.CLOSED
+
+def test_upstream_opens_breaker_and_fails_fast():
+    api = upstream()
+
+    def down():
+        raise requests.exceptions.ConnectionError("refused")
+
+    with pytest.raises(UpstreamUnavailable):
+        api.call(down)
+    assert api.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(UpstreamUnavailable):
+        api.call(lambda: pytest.fail("called while the breaker is open"))
+    assert api.rejections == 1
@@ -0,0 +1,32 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from run_summary import run_stats, summarize_run
+
+def final_state():
+    return {
+        "messages": [
+            SystemMessage(content="system"),
+            HumanMessage(content="start"),
+            AIMessage(content="", tool_calls=[{"name": "fetch_wazuh_alerts", "args": {}, "id": "1"}]),
+            ToolMessage(content="[]", name="fetch_wazuh_alerts", tool_call_id="1"),
+            AIMessage(content="", tool_calls=[{"name": "get_tier1_playbook", "args": {"technique_id": t}, "id": t}
+                                              for t in ("T1110", "T1078")]),
+            ToolMessage(content="playbook", name="get_tier1_playbook", tool_call_id="T1110"),
+            ToolMessage(content="miss", name="get_tier1_playbook", tool_call_id="T1078"),
+            AIMessage(content="# Report"),
+        ],
+        "routing": [{"step": s, "model": "m", "latency_seconds": 0.1} for s in ("a", "b", "c")],
+    }
+
+def test_summarize_run_extracts_trace_and_report():
+    logged = []
+    steps, routing, report = summarize_run(final_state(), logged.append)
+    assert report == "# Report"
+    assert steps[0] == "Tool Call: fetch_wazuh_alerts (args: {})"
+    assert sum(step.startswith("Tool Call: get_tier1_playbook") for step in steps) == 2
+    assert len(routing) == 3 and len(logged) == len(steps) + len(routing)
+
+def test_run_stats_counts_turns_and_parallel_calls():
+    assert run_stats(final_state(), 1.23456) == {
+        "Agent Turns": 3, "Tool Calls": 3, "Max Parallel Tool Calls": 2, "Elapsed Seconds": 1.235,
+    }
@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+from scenario_catalog import ScenarioCatalog
+
+def write_alert(directory, name, level, techniques, description="Test alert"):
+    path = directory / name
+    path.write_text(json.dumps({"rule": {"level": level, "description": description, "mitre": {"id": techniques}}}))
+    return path
+
+@pytest.fixture
+def scenarios(tmp_path):
+    directory = tmp_path / "scenarios"
+    directory.mkdir()
+    write_alert(directory, "alert_brute.json", 10, ["T1110.001"], "SSH brute force")
+    write_alert(directory, "alert_scan.json", 5, ["T1595"], "Network scan")
+    (directory / "notes.json").write_text("{}")
+    return directory
+
+def catalog_for(scenarios):
+    return ScenarioCatalog(str(scenarios), index_file=str(scenarios.parent / "index.json"))
+
+def test_first_refresh_indexes_alert_files_only(scenarios):
+    catalog = catalog_for(scenarios)
+    assert catalog.refresh() == {"added": 2, "updated": 0, "removed": 0}
+    assert catalog.techniques() == ["T1110.001", "T1595"]
+
+def test_refresh_reparses_only_changed_files(scenarios):
+    catalog = catalog_for(scenarios)
+    catalog.refresh()
+    assert catalog.refresh() == {"added": 0, "updated": 0, "removed": 0}
+    path = write_alert(scenarios, "alert_scan.json", 12, ["T1046"], "Port scan burst")
+    os.utime(path, ns=(1, 1))
+    os.remove(scenarios / "alert_brute.json")
+    assert catalog.refresh() == {"added": 0, "updated": 1, "removed": 1}
+    assert catalog.entries["alert_scan.json"]["mitre_ids"] == ["T1046"]
+
+def test_index_persists_between_instances(scenarios):
+    catalog_for(scenarios).refresh()
+    reloaded = catalog_for(scenarios)
+    assert len(reloaded) == 2
+    assert reloaded.refresh() == {"added": 0, "updated": 0, "removed": 0}
+
+def test_filter_by_technique_level_and_text(scenarios):
+    catalog = catalog_for(scenarios)
+    catalog.refresh()
+    assert [e["file"] for e in catalog.filter(technique="T1110")] == ["alert_brute.json"]
+    assert [e["file"] for e in catalog.filter(min_level=8)] == ["alert_brute.json"]
+    assert [e["file"] for e in catalog.filter(query="network")] == ["alert_scan.json"]
+
+def test_unparsable_file_is_recorded_with_error(scenarios):
+    (scenarios / "alert_broken.json").write_text("{not json")
+    catalog = catalog_for(scenarios)
+    catalog.refresh()
+    assert "error" in catalog.entries["alert_broken.json"]
@@ -0,0 +1,27 @@
+import json
+import zipfile
+
+from setup_mordor_scenarios import DATASETS_FILE, convert_dataset, load_datasets
+
+def test_catalog_is_keyed_by_dataset():
+    datasets = load_datasets(DATASETS_FILE)
+    assert len(datasets) > 4
+    assert all(info["url"].endswith(f"/{name}.zip") for name, info in datasets.items())
+    techniques = [info["technique"] for info in datasets.values()]
+    # Several datasets for the same technique must not share an output file
+    assert len(set(techniques)) < len(techniques)
+
+def test_entries_without_technique_are_skipped(tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps({"T1110": {"name": "Old format", "url": "https://example/x.zip"}}))
+    assert load_datasets(str(path)) == {}
+
+def test_convert_names_outputs_per_dataset(tmp_path):
+    zip_path = tmp_path / "data.zip"
+    with zipfile.ZipFile(zip_path, "w") as z:
+        z.writestr("events.json", '{"EventID": 1, "Hostname": "ws01"}\nnot json\n{"EventID": 2}\n')
+    info = {"technique": "T1003.001", "name": "LSASS Memory", "url": "https://example/one.zip"}
+    out_path, count = convert_dataset("one", info, str(zip_path), str(tmp_path / "out"), str(tmp_path / "scenarios"))
+    assert count == 2 and out_path.endswith("mordor_one.jsonl")
+    scenario = json.loads((tmp_path / "scenarios" / "alert_mordor_one.json").read_text())
+    assert scenario["rule"]["mitre"]["id"] == ["T1003.001"] and scenario["agent"]["name"] == "ws01"
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import pytest
+
+import tracing
+from tracing import FileExporter, Tracer, parse_traceparent, to_chrome_trace, traced_call_tool
+
+class Collector:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span.to_dict())
+
+@pytest.fixture
+def spans(monkeypatch):
+    collector = Collector()
+    monkeypatch.setattr(tracing, "_EXPORTER", collector)
+    return collector.spans
+
+def test_parse_traceparent():
+    assert parse_traceparent("00-" + "a" * 32 + "-" + "b" * 16 + "-01") == ("a" * 32, "b" * 16)
+    assert parse_traceparent("garbage") == (None, None)
+    assert parse_traceparent(None) == (None, None)
+
+def test_disabled_tracing_yields_no_span(monkeypatch):
+    monkeypatch.setattr(tracing, "_EXPORTER", None)
+    with Tracer("agent").span("run") as span:
+        assert span is None
+
+def test_nested_spans_share_the_trace(spans):
+    tracer = Tracer("agent")
+    with tracer.span("run") as root:
+        with tracer.span("llm.call", model="small"):
+            pass
+    child, parent = spans
+    assert child["trace_id"] == parent["trace_id"] == root.trace_id
+    assert child["parent_id"] == parent["span_id"] and parent["parent_id"] is None
+    assert child["attributes"] == {"model": "small"}
+
+def test_traceparent_continues_a_remote_trace(spans):
+    with Tracer("mitre-server").span("tool.get_playbook", traceparent="00-" + "a" * 32 + "-" + "b" * 16 + "-01"):
+        pass
+    assert spans[0]["trace_id"] == "a" * 32 and spans[0]["parent_id"] == "b" * 16
+
+def test_exception_marks_span_as_error(spans):
+    with pytest.raises(RuntimeError):
+        with Tracer("agent").span("run"):
+            raise RuntimeError("boom")
+    assert spans[0]["status"] == "error" and spans[0]["attributes"]["error"] == "boom"
+
+def test_traced_node_wraps_async_nodes(spans):
+    async def agent(state):
+        return {"messages": state["messages"] + ["done"]}
+
+    node = Tracer("agent").traced_node("agent", agent)
+    assert asyncio.run(node({"messages": []})) == {"messages": ["done"]}
+    assert spans[0]["name"] == "node.agent"
+
+def test_call_tool_sends_traceparent_in_meta(spans):
+    class Session:
+        async def call_tool(self, name, arguments=None, meta=None):
+            self.meta = meta
+            return type("Result", (), {"isError": True})()
+
+    session = Session()
+    asyncio.run(traced_call_tool(session, "get_playbook", {"technique_id": "T1110"}))
+    span = spans[0]
+    assert session.meta == {"traceparent": f"00-{span['trace_id']}-{span['span_id']}-01"}
+    assert span["status"] == "error"
+
+def test_chrome_trace_export(tmp_path, monkeypatch):
+    spans_file = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(tracing, "_EXPORTER", FileExporter(str(spans_file)))
+    tracer = Tracer("agent")
+    with tracer.span("run") as root:
+        with tracer.span("node.agent"):
+            pass
+    with tracer.span("other-run"):
+        pass
+    out = tmp_path / "trace.json"
+    assert to_chrome_trace(str(spans_file), str(out), trace_id=root.trace_id) == 2
+    events = json.loads(out.read_text())["traceEvents"]
+    assert {e["name"] for e in events} == {"run", "node.agent"} and all(e["ph"] == "X" for e in events)
@@ -0,0 +1,117 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from triage_daemon import CURSOR_KEY, TriageDaemon
+from triage_scheduler import TriageScheduler
+from triage_store import TriageStore
+
+ASSETS = {"default": 1, "assets": {}, "prefixes": {}}
+
+class StreamSession:
+    """Serves get_alert_stream pages over a fixed list of alerts."""
+
+    def __init__(self, alerts):
+        self.alerts = alerts
+
+    async def call_tool(self, name, arguments=None, meta=None):
+        assert name == "get_alert_stream"
+        cursor, limit = arguments["cursor"], arguments["limit"]
+        page = self.alerts[cursor:cursor + limit]
+        text = json.dumps({"alerts": page, "next_cursor": cursor + len(page)})
+        return SimpleNamespace(content=[SimpleNamespace(text=text)], isError=False)
+
+def alerts(count):
+    return [{"id": i, "rule": {"level": 5, "description": f"alert {i}"}} for i in range(count)]
+
+@pytest.fixture
+def daemon(tmp_path):
+    store = TriageStore(str(tmp_path / "triage.db"))
+    daemon = TriageDaemon(store, "fake:test", source="stream", batch_size=3)
+    yield daemon
+    store.close()
+
+async def with_scheduler(daemon, body):
+    async def run(item):
+        return "report"
+
+    daemon.scheduler = TriageScheduler(run, config=daemon.config, assets=ASSETS, metrics=daemon.metrics)
+    daemon.scheduler.start()
+    try:
+        return await body()
+    finally:
+        await daemon.scheduler.drain()
+        await daemon.scheduler.close()
+
+def test_cursor_commits_after_each_stored_page(daemon):
+    session = StreamSession(alerts(5))
+
+    async def body():
+        return [await daemon.poll_once(session) for _ in range(3)]
+
+    assert asyncio.run(with_scheduler(daemon, body)) == [3, 2, 0]
+    assert daemon.store.get_state(CURSOR_KEY) == 5
+    assert daemon.store.counts()["queued"] + daemon.store.counts()["running"] + daemon.store.counts()["done"] == 5
+
+def test_cursor_not_committed_when_storing_fails(daemon, monkeypatch):
+    session = StreamSession(alerts(3))
+    add_alert = daemon.store.add_alert
+
+    def failing(alert, score, severity):
+        if alert["id"] == 2:
+            raise RuntimeError("disk full")
+        return add_alert(alert, score, severity)
+
+    monkeypatch.setattr(daemon.store, "add_alert", failing)
+    with pytest.raises(RuntimeError):
+        asyncio.run(with_scheduler(daemon, lambda: daemon.poll_once(session)))
+    assert daemon.store.get_state(CURSOR_KEY, 0) == 0
+
+def test_repolled_page_is_not_queued_twice(daemon):
+    session = StreamSession(alerts(2))
+
+    async def body():
+        await daemon.poll_once(session)
+        daemon.store.set_state(CURSOR_KEY, 0)  # e.g. crash before the commit
+        await daemon.poll_once(session)
+
+    asyncio.run(with_scheduler(daemon, body))
+    assert sum(daemon.store.counts().values()) == 2
+
+def test_heartbeat_continues_while_submit_blocks(daemon):
+    daemon.poll_interval = 0.05
+    daemon.config.update(max_queue=1, max_concurrent=1)
+
+    async def body():
+        heartbeats = asyncio.create_task(daemon._heartbeats())
+        try:
+            # The first alert runs (and never finishes), the second fills the queue,
+            # the third blocks the poll loop in submit
+            blocked = asyncio.create_task(daemon.poll_once(StreamSession(alerts(3))))
+            await asyncio.sleep(0.05)
+            assert not blocked.done()
+            before = daemon.store.state_age("daemon")
+            await asyncio.sleep(0.2)
+            assert daemon.store.state_age("daemon") < before
+            blocked.cancel()
+        finally:
+            heartbeats.cancel()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def run(item):
+            await release.wait()
+
+        daemon.scheduler = TriageScheduler(run, config=daemon.config, assets=ASSETS, metrics=daemon.metrics)
+        daemon.scheduler.start()
+        daemon.heartbeat()
+        try:
+            await body()
+        finally:
+            release.set()
+            await daemon.scheduler.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,153 @@
+import asyncio
+import json
+
+import pytest
+
+from triage_scheduler import (DEFAULT_SCHEDULER_CONFIG, QueueFullError, TriageScheduler, priority_score,
+                              severity_for)
+
+ASSETS = {"default": 1, "assets": {"dc01": 3}, "prefixes": {}}
+
+def make_config(**overrides):
+    config = json.loads(json.dumps(DEFAULT_SCHEDULER_CONFIG))
+    config.update({"max_concurrent": 1, "min_concurrent": 1}, **overrides)
+    return config
+
+def alert(name, level, techniques=(), agent="ws01"):
+    return {"id": name, "rule": {"level": level, "mitre": {"id": list(techniques)}}, "agent": {"name": agent}}
+
+async def run_in_order(config, alerts):
+    """Submits `alerts` while one blocking run holds the only slot; returns the order they ran in."""
+    started, order = asyncio.Event(), []
+    release = asyncio.Event()
+
+    async def run(item):
+        if item.alert["id"] == "blocker":
+            started.set()
+            await release.wait()
+        else:
+            order.append(item.alert["id"])
+
+    scheduler = TriageScheduler(run, config=config, assets=ASSETS)
+    scheduler.start()
+    await scheduler.submit(alert("blocker", 3))
+    await started.wait()
+    items = [await scheduler.submit(a, block=False) for a in alerts]
+    release.set()
+    await scheduler.drain()
+    await scheduler.close()
+    return order, items, scheduler
+
+# ==========================================
+# Prioritization
+# ==========================================
+def test_priority_score_adds_technique_weight_and_asset_criticality():
+    config = make_config(technique_weights={"T1003": 4})
+    # Sub-technique inherits the parent's weight; dc01 has criticality 3 (+4)
+    assert priority_score(alert("a", 8, ["T1003.001"], agent="dc01"), config, ASSETS) == 8 + 4 + 4
+    assert priority_score(alert("b", 8), config, ASSETS) == 8
+
+def test_severity_for_picks_highest_matching_class():
+    config = make_config()
+    assert severity_for(15, config)["name"] == "critical"
+    assert severity_for(10, config)["name"] == "high"
+    assert severity_for(3, config)["name"] == "low"
+
+# ==========================================
+# Ordering
+# ==========================================
+def test_preempting_class_runs_first_then_by_deadline():
+    order, _, _ = asyncio.run(run_in_order(make_config(), [
+        alert("low", 3), alert("medium", 8), alert("critical", 13), alert("high", 10),
+    ]))
+    assert order == ["critical", "high", "medium", "low"]
+
+def test_earliest_deadline_first_beats_higher_score():
+    config = make_config()
+    for severity in config["severities"]:
+        if severity["name"] == "low":
+            severity["deadline_seconds"] = 5  # Waited close to its target: due before medium
+    order, _, _ = asyncio.run(run_in_order(config, [alert("medium", 8), alert("low", 3)]))
+    assert order == ["low", "medium"]
+
+def test_same_class_is_fifo():
+    order, _, _ = asyncio.run(run_in_order(make_config(), [alert(f"a{i}", 8) for i in range(5)]))
+    assert order == [f"a{i}" for i in range(5)]
+
+# ==========================================
+# Backpressure
+# ==========================================
+def test_full_queue_sheds_lowest_for_more_urgent_alert():
+    order, items, scheduler = asyncio.run(run_in_order(make_config(max_queue=2), [
+        alert("low-1", 3), alert("low-2", 3), alert("critical", 13),
+    ]))
+    assert order == ["critical", "low-1"]
+    assert isinstance(items[1].future.exception(), QueueFullError)
+    assert scheduler.counts["shed"] == 1
+
+def test_full_queue_rejects_less_urgent_alert_without_blocking():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def run(item):
+            await release.wait()
+
+        scheduler = TriageScheduler(run, config=make_config(max_queue=1), assets=ASSETS)
+        scheduler.start()
+        await scheduler.submit(alert("running", 3))
+        await asyncio.sleep(0)
+        await scheduler.submit(alert("queued", 8))
+        with pytest.raises(QueueFullError):
+            await scheduler.submit(alert("rejected", 3), block=False)
+        release.set()
+        await scheduler.drain()
+        await scheduler.close()
+        return scheduler.counts
+
+    counts = asyncio.run(scenario())
+    assert counts["submitted"] == 2 and counts["completed"] == 2 and counts["shed"] == 0
+
+# ==========================================
+# Adaptive concurrency
+# ==========================================
+def test_adapt_shrinks_while_saturated_and_grows_back():
+    scheduler = TriageScheduler(None, config=make_config(max_concurrent=4, min_concurrent=1,
+                                                         saturation_seconds=10.0, ewma_alpha=1.0), assets=ASSETS)
+    for _ in range(5):
+        scheduler._adapt(30.0)
+    assert scheduler.limit == 1  # Never below min_concurrent
+    scheduler._adapt(8.0)  # Between saturation/2 and saturation: unchanged
+    assert scheduler.limit == 1
+    for _ in range(5):
+        scheduler._adapt(1.0)
+    assert scheduler.limit == 4  # Never above max_concurrent
+
+def test_adapt_uses_ewma_of_run_time():
+    scheduler = TriageScheduler(None, config=make_config(max_concurrent=4, saturation_seconds=10.0,
+                                                         ewma_alpha=0.5), assets=ASSETS)
+    scheduler._adapt(4.0)
+    scheduler._adapt(20.0)  # EWMA 12 > 10: one step down
+    assert scheduler.run_ewma == pytest.approx(12.0)
+    assert scheduler.limit == 3
+
+# ==========================================
+# Routing of scheduled alerts
+# ==========================================
+def test_critical_preference_keeps_large_model_for_fallback_and_report():
+    from langchain_core.messages import ToolMessage
+    from model_router import DEFAULT_ROUTING_CONFIG, ModelRouter
+
+    critical = alert("critical", 13, ["T1078"])
+    async def prioritize():
+        return TriageScheduler(None, config=make_config(), assets=ASSETS).prioritize(critical)
+    item = asyncio.run(prioritize())
+    assert item.severity["name"] == "critical" and item.model_preference == "small"
+
+    router = ModelRouter("large", {**DEFAULT_ROUTING_CONFIG, "small_model": "small", "large_model": "large"})
+    fetched = [ToolMessage(content=json.dumps([critical]), name="fetch_wazuh_alerts", tool_call_id="1")]
+    miss = ToolMessage(content="❌ No custom playbook found for technique ID: T1078.", name="get_tier1_playbook", tool_call_id="2")
+    hit = ToolMessage(content="### MITRE T1078: Valid Accounts", name="get_tier1_playbook", tool_call_id="3")
+
+    assert router.route(fetched, prefer=item.model_preference)["model"] == "small"
+    assert router.route(fetched + [miss], prefer=item.model_preference)["model"] == "large"
+    assert router.route(fetched + [hit], prefer=item.model_preference)["model"] == "large"
@@ -0,0 +1,47 @@
+import pytest
+
+from triage_store import TriageStore
+
+ALERT = {"rule": {"level": 10, "description": "SSH brute force", "mitre": {"id": ["T1110"]}}, "agent": {"name": "ws01"}}
+
+@pytest.fixture
+def store(tmp_path):
+    store = TriageStore(str(tmp_path / "triage.db"))
+    yield store
+    store.close()
+
+def test_add_alert_dedupes_by_content(store):
+    fingerprint = store.add_alert(ALERT, 10, "high")
+    assert fingerprint is not None
+    # Same content, different key order: already known
+    reordered = {"agent": {"name": "ws01"}, "rule": dict(reversed(list(ALERT["rule"].items())))}
+    assert store.add_alert(reordered, 10, "high") is None
+    assert store.counts()["queued"] == 1
+
+def test_status_transitions_and_unfinished(store):
+    done = store.add_alert(ALERT, 10, "high")
+    running = store.add_alert({**ALERT, "id": "2"}, 10, "high")
+    store.mark_running(done, "llama3.2")
+    store.record_result(done, "report", ["step"], [{"model": "llama3.2"}])
+    store.mark_running(running, "llama3.2")
+
+    assert [row["fingerprint"] for row in store.unfinished()] == [running]
+    row = store.get(done)
+    assert row["status"] == "done" and row["report"] == "report" and row["mitre_ids"] == ["T1110"]
+    assert [r["fingerprint"] for r in store.reports_since(0.0)] == [done]
+
+def test_state_round_trip_and_cursor_overwrite(store):
+    assert store.get_state("stream_cursor", 0) == 0
+    store.set_state("stream_cursor", 100)
+    store.set_state("stream_cursor", 250)
+    assert store.get_state("stream_cursor") == 250
+    assert store.state_age("stream_cursor") < 5
+    assert store.state_age("missing") is None
+
+def test_read_only_store_sees_writes(store):
+    store.add_alert(ALERT, 10, "high")
+    reader = TriageStore(store.path, read_only=True)
+    try:
+        assert reader.counts()["queued"] == 1
+    finally:
+        reader.close()
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from vector_index import HashingEmbedder, VectorIndex
+
+PLAYBOOKS = {
+    "T1110": "Brute force: block the source IP after repeated failed SSH password attempts.",
+    "T1059": "Command interpreter: review the PowerShell script block and the parent process.",
+}
+TECHNIQUES = {
+    "T1078": {"name": "Valid Accounts", "description": "Adversaries log in with stolen credentials at unusual hours.",
+              "tactics": ["initial-access"]},
+}
+
+def report(fingerprint, text, finished_at):
+    return {"fingerprint": fingerprint, "description": "Triage", "mitre_ids": ["T1110"],
+            "report": text, "finished_at": finished_at}
+
+@pytest.fixture
+def index(tmp_path):
+    return VectorIndex(str(tmp_path), HashingEmbedder())
+
+def generations(index, prefix):
+    return [name for name in os.listdir(index.directory) if name.startswith(prefix)]
+
+# ==========================================
+# Knowledge
+# ==========================================
+def test_sync_knowledge_builds_once_per_signature(index):
+    assert index.sync_knowledge(PLAYBOOKS, TECHNIQUES, "abc:d1") is True
+    assert index.stats()["knowledge"] == 3
+    assert index.sync_knowledge(PLAYBOOKS, TECHNIQUES, "abc:d1") is False
+    assert index.sync_knowledge(PLAYBOOKS, {}, "def:d1") is True
+    assert index.stats()["knowledge"] == 2
+
+def test_signature_without_digest_keeps_richer_index(index):
+    index.sync_knowledge(PLAYBOOKS, TECHNIQUES, "abc:d1")
+    # A process whose ATT&CK download failed must not drop the techniques
+    assert index.sync_knowledge(PLAYBOOKS, {}, "abc") is False
+    assert index.stats()["knowledge"] == 3
+
+def test_rebuild_publishes_a_new_generation_and_removes_the_old(index):
+    index.sync_knowledge(PLAYBOOKS, TECHNIQUES, "abc:d1")
+    first = generations(index, "knowledge-")
+    index.sync_knowledge(PLAYBOOKS, TECHNIQUES, "abc:d2")
+    second = generations(index, "knowledge-")
+    assert len(first) == len(second) == 1 and first != second
+    assert not generations(index, ".build-")
+
+# ==========================================
+# Search
+# ==========================================
+def test_search_ranks_closest_entry_first(index):
+    index.sync_knowledge(PLAYBOOKS, TECHNIQUES, "abc:d1")
+    hits = index.search("failed SSH password attempts from one source IP", k=2)
+    assert hits[0]["ref"] == "T1110" and hits[0]["kind"] == "playbook"
+    assert hits[0]["score"] > hits[1]["score"]
+
+def test_search_filters_by_kind_and_bounds_k(index):
+    index.sync_knowledge(PLAYBOOKS, TECHNIQUES, "abc:d1")
+    hits = index.search("login with stolen credentials", k=10, kinds=["technique"])
+    assert [h["ref"] for h in hits] == ["T1078"]
+    assert index.search("anything", k=0) == []
+
+def test_empty_index_returns_no_matches(index):
+    assert index.search("anything") == []
+
+# ==========================================
+# Reports
+# ==========================================
+def test_add_reports_dedupes_and_advances_watermark(index):
+    assert index.add_reports([report("a", "blocked brute force source", 10.0), report("b", "", 11.0)]) == 1
+    assert index.add_reports([report("a", "blocked brute force source", 10.0), report("c", "reset the password", 12.0)]) == 1
+    assert index.stats()["reports"] == 2
+    assert index.manifest["reports_watermark"] == 12.0
+
+def test_second_instance_sees_reports_appended_by_the_first(tmp_path):
+    writer = VectorIndex(str(tmp_path), HashingEmbedder())
+    reader = VectorIndex(str(tmp_path), HashingEmbedder())
+    writer.sync_knowledge(PLAYBOOKS, {}, "abc")
+    writer.add_reports([report("a", "isolated host after lateral movement", 1.0)])
+    # Any update re-reads what other processes wrote
+    assert reader.sync_knowledge(PLAYBOOKS, {}, "abc") is False
+    assert reader.search("lateral movement", k=1, kinds=["report"])[0]["ref"] == "a"
+    reader.add_reports([report("b", "second report", 2.0)])
+    writer.sync_knowledge(PLAYBOOKS, {}, "abc")
+    assert writer.stats()["reports"] == 2
+
+def test_embedder_change_discards_both_segments(tmp_path):
+    index = VectorIndex(str(tmp_path), HashingEmbedder())
+    index.sync_knowledge(PLAYBOOKS, TECHNIQUES, "abc:d1")
+    index.add_reports([report("a", "text", 1.0)])
+    changed = VectorIndex(str(tmp_path), HashingEmbedder(dim=64))
+    assert changed.stats() == {"embedder": "hashing-64", "dim": None, "knowledge": 0, "reports": 0}
+    assert changed.sync_knowledge(PLAYBOOKS, TECHNIQUES, "abc:d1") is True
+    assert changed.stats()["dim"] == 64
@@ -0,0 +1,305 @@
+# tracing.py
+"""
+Lightweight span-based tracing shared by the agent, the clients and the MCP servers.
+
+One trace per triage run, with spans for every LangGraph node, LLM call and MCP
+`call_tool`. The trace context travels inside the MCP request `_meta` as a W3C
+`traceparent`, so work done inside wazuh_server.py / mitre_server.py (auth, downloads,
+lookups) is recorded under the same trace by the server process.
+
+Configuration (environment, inherited by the MCP server subprocesses):
+    TRACE_EXPORT=file   -> append spans as JSONL to TRACE_FILE (default traces/spans.jsonl)
+    TRACE_EXPORT=otlp   -> POST spans as OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT
+                           (default http://localhost:4318/v1/traces)
+    unset / "none"      -> tracing disabled; spans cost a context-manager call and nothing else
+
+Flame graphs: `python tracing.py chrome traces/spans.jsonl trace.json` converts the spans
+to the Chrome trace-event format (open in https://ui.perfetto.dev or speedscope).
+"""
+import os
+import sys
+import json
+import time
+import queue
+import inspect
+import secrets
+import argparse
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import requests
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces/spans.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+
+# The span currently active in this thread / asyncio task
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "service", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, name: str, service: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.service = service
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": self.service,
+            "start_us": self.start_ns // 1000,
+            "duration_us": ((self.end_ns or time.time_ns()) - self.start_ns) // 1000,
+            "status": self.status,
+            "attributes": self.attributes,
+            "pid": os.getpid(),
+        }
+
+def parse_traceparent(value: Optional[str]):
+    """Returns (trace_id, parent_span_id) from a W3C traceparent header, or (None, None)."""
+    try:
+        version, trace_id, span_id, _flags = value.split("-")
+        if len(trace_id) == 32 and len(span_id) == 16:
+            return trace_id, span_id
+    except (AttributeError, ValueError):
+        pass
+    return None, None
+
+# ==========================================
+# Exporters
+# ==========================================
+class FileExporter:
+    """Appends finished spans to a JSONL file (safe to share between processes: one write per span)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+class OTLPExporter:
+    """Batches spans and POSTs them as OTLP/HTTP JSON from a background thread."""
+
+    def __init__(self, endpoint: str, batch_size: int = 64, interval: float = 2.0):
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        threading.Thread(target=self._run, name="otlp-exporter", daemon=True).start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # Never block the traced code on the collector
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                requests.post(self.endpoint, json=self._payload(batch), timeout=5)
+            except Exception as e:
+                sys.stderr.write(f"[TRACING] OTLP export failed: {e}\n")
+
+    @staticmethod
+    def _payload(batch):
+        by_service: Dict[str, list] = {}
+        for span in batch:
+            by_service.setdefault(span.service, []).append({
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in span.attributes.items()],
+                "status": {"code": 2 if span.status == "error" else 1},
+            })
+        return {"resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+                "scopeSpans": [{"scope": {"name": "soc-tracing"}, "spans": spans}],
+            }
+            for service, spans in by_service.items()
+        ]}
+
+def _build_exporter():
+    if TRACE_EXPORT == "file":
+        return FileExporter(TRACE_FILE)
+    if TRACE_EXPORT == "otlp":
+        return OTLPExporter(TRACE_OTLP_ENDPOINT)
+    return None
+
+_EXPORTER = _build_exporter()
+
+def tracing_enabled() -> bool:
+    return _EXPORTER is not None
+
+# ==========================================
+# Tracer
+# ==========================================
+class Tracer:
+    """Creates spans for one service (e.g. "agent", "mitre-server")."""
+
+    def __init__(self, service: str):
+        self.service = service
+
+    @contextmanager
+    def span(self, name: str, traceparent: Optional[str] = None, **attributes):
+        """
+        Opens a span as a child of the current one (or of `traceparent`, for spans that
+        continue a trace started in another process). Starts a new trace if neither exists.
+        """
+        if _EXPORTER is None:
+            yield None
+            return
+
+        parent = _current_span.get()
+        trace_id, parent_id = parse_traceparent(traceparent)
+        if trace_id is None:
+            trace_id = parent.trace_id if parent else secrets.token_hex(16)
+            parent_id = parent.span_id if parent else None
+
+        span = Span(name, self.service, trace_id, parent_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = str(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            _EXPORTER.export(span)
+
+    def traced_node(self, name: str, fn):
+        """Wraps a LangGraph node (sync or async) in a `node.<name>` span, keeping its signature."""
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with self.span(f"node.{name}"):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.span(f"node.{name}"):
+                return fn(*args, **kwargs)
+        return wrapper
+
+def current_traceparent() -> Optional[str]:
+    span = _current_span.get()
+    return span.traceparent if span else None
+
+# ==========================================
+# MCP Propagation
+# ==========================================
+_client_tracer = Tracer("mcp-client")
+
+async def traced_call_tool(session, name: str, arguments: Optional[Dict[str, Any]] = None):
+    """
+    `session.call_tool` wrapped in an `mcp.call_tool` span whose traceparent is sent in the
+    request `_meta`, so the server side of the call joins the same trace.
+    """
+    with _client_tracer.span("mcp.call_tool", tool=name) as span:
+        if span is None:
+            return await session.call_tool(name, arguments=arguments or {})
+        result = await session.call_tool(name, arguments=arguments or {}, meta={"traceparent": span.traceparent})
+        if getattr(result, "isError", False):
+            span.status = "error"
+        return result
+
+def _request_traceparent() -> Optional[str]:
+    """traceparent from the `_meta` of the MCP request being handled, if any."""
+    try:
+        from mcp.server.lowlevel.server import request_ctx
+        meta = request_ctx.get().meta
+    except (ImportError, LookupError):
+        return None
+    if meta is None:
+        return None
+    extra = getattr(meta, "model_extra", None) or {}
+    return extra.get("traceparent")
+
+def traced_tool(tracer: Tracer):
+    """
+    Decorator for MCP server tool functions (apply below @mcp.tool()). Continues the
+    caller's trace from the request `_meta` and records a `tool.<name>` span.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(f"tool.{fn.__name__}", traceparent=_request_traceparent(), **kwargs):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ==========================================
+# Flame Graph Export
+# ==========================================
+def to_chrome_trace(spans_file: str, out_file: str, trace_id: Optional[str] = None) -> int:
+    """Converts JSONL spans to Chrome trace-event JSON ("X" complete events). Returns the span count."""
+    events = []
+    with open(spans_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            span = json.loads(line)
+            if trace_id and span["trace_id"] != trace_id:
+                continue
+            events.append({
+                "name": span["name"],
+                "cat": span["service"],
+                "ph": "X",
+                "ts": span["start_us"],
+                "dur": span["duration_us"],
+                "pid": f"{span['service']} ({span['pid']})",
+                "tid": span["trace_id"][:8],
+                "args": {**span["attributes"], "span_id": span["span_id"], "parent_id": span["parent_id"]},
+            })
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trace export utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    chrome = sub.add_parser("chrome", help="Convert JSONL spans to Chrome trace-event JSON for flame graphs")
+    chrome.add_argument("spans_file")
+    chrome.add_argument("out_file")
+    chrome.add_argument("--trace-id", default=None, help="Only export one trace")
+    args = parser.parse_args()
+
+    count = to_chrome_trace(args.spans_file, args.out_file, args.trace_id)
+    print(f"[+] Wrote {count} spans to {args.out_file}")
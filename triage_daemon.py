@@ -0,0 +1,252 @@
+# triage_daemon.py
+"""
+Headless continuous triage service.
+
+Polls the Wazuh MCP server for new alerts, runs each one through the LangGraph agent
+(build_react_agent) via the priority scheduler (triage_scheduler.py) with a pool of
+concurrent runs, and persists status and reports to the SQLite store (triage_store.py).
+The Streamlit app reads that store in its "Triage Daemon" mode, so triage throughput no
+longer depends on UI reruns or an open browser tab.
+
+Alert sources (--source):
+- stream: the get_alert_stream spool (replay_alerts.py / a log shipper); the cursor is
+          persisted, so a restart resumes where the last run stopped
+- latest: get_latest_alerts (the injected mock alert)
+- wazuh:  get_real_wazuh_alerts (Wazuh Manager API)
+Alerts already in the store are skipped, so re-polling the same alert is harmless, and
+alerts left queued/running by a crashed run are resubmitted on startup.
+
+Usage:
+    python triage_daemon.py --source stream --model llama3.1:latest
+    WAZUH_MCP_URL=http://127.0.0.1:8001/mcp python triage_daemon.py   # shared HTTP server
+"""
+import os
+import sys
+import json
+import signal
+import asyncio
+import argparse
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Optional
+
+from mcp import StdioServerParameters
+
+from agent import get_react_agent
+from context_cache import alert_fingerprint
+from fake_llm import use_fake_llm
+from mcp_transport import connect_mcp
+from metrics import MetricsRegistry, start_metrics_server
+from model_router import load_routing_config
+from ollama_warmup import OllamaWarmupManager
+from resilience import bind_metrics, snapshot_all
+from run_summary import summarize_run
+from tracing import Tracer, traced_call_tool
+from triage_scheduler import (TriageScheduler, QueueFullError, agent_runner, load_scheduler_config,
+                              priority_score, severity_for)
+from triage_store import TriageStore, TRIAGE_DB_FILE
+
+SOURCES = ("stream", "latest", "wazuh")
+HEARTBEAT_KEY = "daemon"
+CURSOR_KEY = "stream_cursor"
+
+wazuh_server_params = StdioServerParameters(command=sys.executable, args=["wazuh_server.py"], env=dict(os.environ))
+mitre_server_params = StdioServerParameters(command=sys.executable, args=["mitre_server.py"], env=dict(os.environ))
+
+tracer = Tracer("triage-daemon")
+
+class TriageDaemon:
+    def __init__(self, store: TriageStore, model: str, source: str = "stream", poll_interval: float = 5.0,
+                 batch_size: int = 100, workers: Optional[int] = None, recursion_limit: int = 15):
+        self.store = store
+        self.model = model
+        self.source = source
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.recursion_limit = recursion_limit
+        self.config = load_scheduler_config()
+        if workers:
+            self.config["max_concurrent"] = workers
+        self.metrics = MetricsRegistry("triage-daemon")
+        self._polled = self.metrics.counter("triage_alerts_polled_total", "Alerts returned by the Wazuh server.", ["source", "result"])
+        # Ollama / MCP circuit breakers of the agent runs in this process
+        bind_metrics(self.metrics)
+        self.scheduler: Optional[TriageScheduler] = None
+        self._next_cursor: Optional[int] = None
+        self._stop = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # --- Polling ---
+    async def poll(self, wazuh_session) -> List[Dict[str, Any]]:
+        """One poll of the configured source; returns the alerts (new or not)."""
+        if self.source == "stream":
+            cursor = self.store.get_state(CURSOR_KEY, 0)
+            result = await traced_call_tool(wazuh_session, "get_alert_stream", {"cursor": cursor, "limit": self.batch_size})
+            page = json.loads(result.content[0].text)
+            # Committed once the page is stored (see poll_once())
+            self._next_cursor = page["next_cursor"]
+            return page["alerts"]
+        if self.source == "wazuh":
+            result = await traced_call_tool(wazuh_session, "get_real_wazuh_alerts", {"limit": self.batch_size})
+            data = json.loads(result.content[0].text)
+            if "error" in data:
+                raise RuntimeError(data["error"])
+            return data.get("data", {}).get("affected_items", [])
+        result = await traced_call_tool(wazuh_session, "get_latest_alerts", {})
+        return json.loads(result.content[0].text)
+
+    async def poll_once(self, wazuh_session) -> int:
+        """Polls, stores and schedules the new alerts, then commits the stream cursor. Returns the alerts polled."""
+        try:
+            alerts = await self.poll(wazuh_session)
+        except Exception as e:
+            print(f"[-] Poll failed: {e}")
+            return 0
+        new = 0
+        for alert in alerts:
+            new += await self.enqueue(alert)
+        # Only once the whole page is stored: a crash before this re-polls it (duplicates are skipped)
+        if self._next_cursor is not None:
+            self.store.set_state(CURSOR_KEY, self._next_cursor)
+            self._next_cursor = None
+        if new:
+            print(f"[*] {new} new alerts queued ({len(alerts) - new} already known).")
+        return len(alerts)
+
+    async def enqueue(self, alert: Dict[str, Any]) -> bool:
+        """Stores and schedules a new alert; False if it was already known."""
+        score = priority_score(alert, self.scheduler.config, self.scheduler.assets)
+        fingerprint = self.store.add_alert(alert, score, severity_for(score, self.scheduler.config)["name"])
+        if fingerprint is None:
+            self._polled.inc(source=self.source, result="duplicate")
+            return False
+        self._polled.inc(source=self.source, result="new")
+        await self._submit(fingerprint, alert)
+        return True
+
+    async def _submit(self, fingerprint: str, alert: Dict[str, Any]) -> None:
+        # Blocks while the queue is full: polling pauses instead of growing memory
+        item = await self.scheduler.submit(alert)
+        item.future.add_done_callback(lambda f: self._on_shed(fingerprint, f))
+
+    def _on_shed(self, fingerprint: str, future: asyncio.Future) -> None:
+        if not future.cancelled() and isinstance(future.exception(), QueueFullError):
+            self.store.record_failure(fingerprint, str(future.exception()), status="shed")
+
+    # --- Triage ---
+    def runner(self, agent, mitre_session, wazuh_session):
+        """Wraps agent_runner so every run's status and report land in the store."""
+        run = agent_runner(agent, mitre_session, wazuh_session, self.recursion_limit, tracer)
+
+        async def persisted(item):
+            fingerprint = alert_fingerprint(item.alert)
+            model = f"{self.model} (prefer {item.model_preference})" if item.model_preference else self.model
+            self.store.mark_running(fingerprint, model)
+            try:
+                final_state = await run(item)
+            except Exception as e:
+                self.store.record_failure(fingerprint, f"EXECUTION_ERROR: {e}")
+                raise
+            steps, routing, report = summarize_run(final_state, lambda msg: None)
+            self.store.record_result(fingerprint, report, steps, routing)
+            return report
+        return persisted
+
+    def heartbeat(self) -> None:
+        self.store.set_state(HEARTBEAT_KEY, {
+            "pid": os.getpid(),
+            "source": self.source,
+            "model": self.model,
+            "poll_interval": self.poll_interval,
+            "scheduler": self.scheduler.stats(),
+            "upstreams": snapshot_all(),
+        })
+
+    async def _heartbeats(self) -> None:
+        # Own task: the poll loop can sit in a blocking submit for a long time under backpressure
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"[-] Heartbeat failed: {e}")
+
+    # --- Main loop ---
+    async def run(self) -> None:
+        if not use_fake_llm(self.model):
+            print("[*] Warming up Ollama models...")
+            OllamaWarmupManager().preload_all([self.model, load_routing_config()["small_model"]])
+
+        async with AsyncExitStack() as stack:
+            print("[*] Initializing MCP connections...")
+            wazuh_session = await connect_mcp(stack, "wazuh", wazuh_server_params)
+            mitre_session = await connect_mcp(stack, "mitre", mitre_server_params)
+
+            agent = get_react_agent(self.model)
+            self.scheduler = TriageScheduler(self.runner(agent, mitre_session, wazuh_session),
+                                             config=self.config, metrics=self.metrics)
+            self.scheduler.start()
+            self.heartbeat()
+            heartbeats = asyncio.create_task(self._heartbeats())
+
+            try:
+                leftovers = self.store.unfinished()
+                if leftovers:
+                    print(f"[*] Resubmitting {len(leftovers)} alerts left unfinished by the previous run.")
+                    for row in leftovers:
+                        await self._submit(row["fingerprint"], row["alert"])
+
+                print(f"[+] Triage daemon running (source={self.source}, model={self.model}, "
+                      f"workers={self.config['max_concurrent']}, store={self.store.path}).")
+                while not self._stop.is_set():
+                    polled = await self.poll_once(wazuh_session)
+                    # A full stream page means there is a backlog: poll again right away
+                    if self.source == "stream" and polled >= self.batch_size:
+                        continue
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                heartbeats.cancel()
+                print("[*] Stopping: waiting for runs in progress...")
+                # Queued alerts stay 'queued' in the store and are resubmitted on the next start
+                await self.scheduler.close()
+                self.heartbeat()
+
+async def main(args) -> None:
+    store = TriageStore(args.db)
+    daemon = TriageDaemon(store, args.model, args.source, args.poll_interval, args.batch_size,
+                          args.workers, args.recursion_limit)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, daemon.stop)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+    if args.metrics_port:
+        start_metrics_server(daemon.metrics, args.metrics_port)
+    try:
+        await daemon.run()
+    finally:
+        store.close()
+        print("[+] Triage daemon stopped.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continuously triage Wazuh alerts and store the reports.")
+    parser.add_argument("--source", choices=SOURCES, default=os.getenv("TRIAGE_SOURCE", "stream"))
+    parser.add_argument("--model", default="llama3.1:latest")
+    parser.add_argument("--db", default=TRIAGE_DB_FILE, help="SQLite store read by the Streamlit app")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between polls when idle")
+    parser.add_argument("--batch-size", type=int, default=100, help="Alerts requested per poll")
+    parser.add_argument("--workers", type=int, default=None, help="Max concurrent agent runs (default: config/triage_scheduler.json)")
+    parser.add_argument("--recursion-limit", type=int, default=15)
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("TRIAGE_METRICS_PORT", "0")),
+                        help="Serve Prometheus metrics on this port (0 = off)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
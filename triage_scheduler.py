@@ -0,0 +1,371 @@
+# triage_scheduler.py
+"""
+Priority-aware scheduler in front of the triage agent.
+
+Alerts are not handled in fetch order. Each alert gets a priority score:
+
+    score = rule.level + technique weight + 2 * (asset criticality - 1)
+
+(technique weights in config/triage_scheduler.json, asset criticality in
+config/asset_criticality.json). The score picks a severity class (critical / high /
+medium / low), and each class has a latency target (deadline):
+- classes marked "preempt" (critical) always run before everything else,
+- within the rest, alerts run earliest-deadline-first, so a low alert that has waited
+  close to its target is not starved by a stream of medium ones,
+- a class may set model_preference, passed to the agent's ModelRouter as a soft
+  preference for that run (critical -> small model for the cheap steps): Tier 1 misses
+  and alerts at or above the router's high_level_threshold still get the large model.
+
+Backpressure: the queue is bounded (a full queue sheds its lowest-priority alert for a
+more urgent one, otherwise the producer waits), and the number of concurrent runs adapts
+to the LLM backend: it shrinks while the run-time EWMA exceeds `saturation_seconds` and
+grows back when runs are fast again. Queue depth, time-in-queue, deadline misses and shed
+counts are exposed via `stats()` and a metrics registry (see metrics.py).
+"""
+import os
+import sys
+import json
+import time
+import heapq
+import asyncio
+import argparse
+import itertools
+from collections import deque
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from alert_model import Alert, as_alert
+from metrics import MetricsRegistry
+from benchmark import distribution
+
+SCHEDULER_CONFIG_FILE = "config/triage_scheduler.json"
+ASSET_CRITICALITY_FILE = "config/asset_criticality.json"
+
+DEFAULT_SCHEDULER_CONFIG: Dict[str, Any] = {
+    "max_queue": 1000,
+    "max_concurrent": 4,
+    "min_concurrent": 1,
+    "saturation_seconds": 60.0,
+    "ewma_alpha": 0.3,
+    "severities": [
+        {"name": "critical", "min_level": 12, "deadline_seconds": 60, "preempt": True, "model_preference": "small"},
+        {"name": "high", "min_level": 10, "deadline_seconds": 300, "preempt": False, "model_preference": None},
+        {"name": "medium", "min_level": 7, "deadline_seconds": 900, "preempt": False, "model_preference": None},
+        {"name": "low", "min_level": 0, "deadline_seconds": 3600, "preempt": False, "model_preference": None},
+    ],
+    "technique_weights": {},
+}
+
+def _load_json(path: str, default: Dict[str, Any]) -> Dict[str, Any]:
+    config = json.loads(json.dumps(default))
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        sys.stderr.write(f"[SCHEDULER] Warning: Could not load {path}: {e}\n")
+    return config
+
+def load_scheduler_config(path: str = SCHEDULER_CONFIG_FILE) -> Dict[str, Any]:
+    return _load_json(path, DEFAULT_SCHEDULER_CONFIG)
+
+def load_asset_criticality(path: str = ASSET_CRITICALITY_FILE) -> Dict[str, Any]:
+    return _load_json(path, {"default": 1, "assets": {}, "prefixes": {}})
+
+class QueueFullError(Exception):
+    """Raised by a non-blocking submit on a full queue, or set on alerts shed for urgent ones."""
+
+# ==========================================
+# Prioritization
+# ==========================================
+def asset_criticality(alert: Alert, assets: Dict[str, Any]) -> int:
+    for key in (alert.agent_name, alert.agent_ip):
+        if key and key in assets.get("assets", {}):
+            return int(assets["assets"][key])
+    name = alert.agent_name or ""
+    for prefix, value in assets.get("prefixes", {}).items():
+        if name.startswith(prefix):
+            return int(value)
+    return int(assets.get("default", 1))
+
+def priority_score(alert, config: Dict[str, Any], assets: Dict[str, Any]) -> int:
+    """`alert` is a raw alert dict or an alert_model.Alert."""
+    alert = as_alert(alert)
+    weights = config.get("technique_weights", {})
+    # Sub-techniques inherit their parent's weight (T1003.001 -> T1003)
+    technique_bonus = max(
+        (weights.get(tid, weights.get(tid.split(".")[0], 0)) for tid in alert.mitre_ids),
+        default=0,
+    )
+    return alert.level + technique_bonus + 2 * (asset_criticality(alert, assets) - 1)
+
+def severity_for(score: int, config: Dict[str, Any]) -> Dict[str, Any]:
+    for severity in sorted(config["severities"], key=lambda s: s["min_level"], reverse=True):
+        if score >= severity["min_level"]:
+            return severity
+    return config["severities"][-1]
+
+class ScheduledAlert:
+    """One queued alert. `future` resolves to the run result (or the run's exception)."""
+    __slots__ = ("alert", "score", "severity", "enqueued_at", "deadline", "seq", "future", "started_at", "removed")
+
+    def __init__(self, alert, score, severity, seq, future):
+        self.alert = alert
+        self.score = score
+        self.severity = severity
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at + float(severity["deadline_seconds"])
+        self.seq = seq
+        self.future = future
+        self.started_at: Optional[float] = None
+        self.removed = False
+
+    @property
+    def model_preference(self) -> Optional[str]:
+        return self.severity.get("model_preference")
+
+    def sort_key(self):
+        # Preempting classes first, then earliest deadline, then highest score, then FIFO
+        return (0 if self.severity.get("preempt") else 1, self.deadline, -self.score, self.seq)
+
+# ==========================================
+# Scheduler
+# ==========================================
+class TriageScheduler:
+    """
+    Runs `run_fn(item)` for queued alerts in priority order with adaptive concurrency.
+    Use from one event loop: `start()`, then `await submit(alert)`; `await drain()` waits
+    for everything queued so far.
+    """
+
+    def __init__(self, run_fn: Callable[[ScheduledAlert], Awaitable[Any]],
+                 config: Optional[Dict[str, Any]] = None, assets: Optional[Dict[str, Any]] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.run_fn = run_fn
+        self.config = config or load_scheduler_config()
+        self.assets = assets or load_asset_criticality()
+        self.max_queue = int(self.config["max_queue"])
+        self.max_concurrent = int(self.config["max_concurrent"])
+        self.min_concurrent = int(self.config["min_concurrent"])
+        self.limit = self.max_concurrent
+        self.in_flight = 0
+        self.run_ewma: Optional[float] = None
+
+        self._heap: List = []
+        self._live = 0
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks = set()
+        self._waits: Dict[str, deque] = {s["name"]: deque(maxlen=1000) for s in self.config["severities"]}
+        self._depth_counts: Dict[str, int] = {s["name"]: 0 for s in self.config["severities"]}
+        self.counts = {"submitted": 0, "completed": 0, "failed": 0, "shed": 0, "deadline_missed": 0}
+
+        self.metrics = metrics or MetricsRegistry("triage-scheduler")
+        self._depth = self.metrics.gauge("triage_queue_depth", "Alerts waiting, by severity.", ["severity"])
+        self._in_flight_gauge = self.metrics.gauge("triage_in_flight", "Triage runs in progress.")
+        self._in_flight_gauge.set_function(lambda: self.in_flight)
+        self._limit_gauge = self.metrics.gauge("triage_concurrency_limit", "Current adaptive concurrency limit.")
+        self._limit_gauge.set_function(lambda: self.limit)
+        self._wait_hist = self.metrics.histogram("triage_time_in_queue_seconds", "Time from submit to run start.", ["severity"])
+        self._run_hist = self.metrics.histogram("triage_run_seconds", "Agent run duration.", ["severity"])
+        self._outcomes = self.metrics.counter("triage_alerts_total", "Alerts by severity and outcome.", ["severity", "outcome"])
+        self._misses = self.metrics.counter("triage_deadline_missed_total", "Alerts finished after their latency target.", ["severity"])
+
+    # --- Lifecycle ---
+    def start(self) -> None:
+        self._cond = asyncio.Condition()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def close(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def drain(self) -> None:
+        """Waits until the queue is empty and no run is in flight."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._live == 0 and self.in_flight == 0)
+
+    # --- Queue ---
+    def prioritize(self, alert: Dict[str, Any]) -> ScheduledAlert:
+        score = priority_score(alert, self.config, self.assets)
+        return ScheduledAlert(alert, score, severity_for(score, self.config), next(self._seq),
+                              asyncio.get_running_loop().create_future())
+
+    def _count(self, item: ScheduledAlert, delta: int) -> None:
+        name = item.severity["name"]
+        self._live += delta
+        self._depth_counts[name] += delta
+        self._depth.set(self._depth_counts[name], severity=name)
+
+    def _push(self, item: ScheduledAlert) -> None:
+        heapq.heappush(self._heap, (item.sort_key(), item))
+        self._count(item, +1)
+
+    def _pop(self) -> Optional[ScheduledAlert]:
+        while self._heap:
+            _, item = heapq.heappop(self._heap)
+            if not item.removed:
+                self._count(item, -1)
+                return item
+        return None
+
+    def _lowest(self) -> Optional[ScheduledAlert]:
+        live = [item for _, item in self._heap if not item.removed]
+        return max(live, key=lambda i: i.sort_key()) if live else None
+
+    async def submit(self, alert: Dict[str, Any], block: bool = True) -> ScheduledAlert:
+        """
+        Queues an alert and returns its ScheduledAlert (await `item.future` for the result).
+        On a full queue, an alert that outranks the lowest queued one replaces it (the shed
+        alert's future fails with QueueFullError); otherwise the call waits for space, or
+        raises QueueFullError if `block` is False.
+        """
+        item = self.prioritize(alert)
+        async with self._cond:
+            if self._live >= self.max_queue:
+                lowest = self._lowest()
+                if lowest is not None and item.sort_key() < lowest.sort_key():
+                    lowest.removed = True
+                    self._count(lowest, -1)
+                    self.counts["shed"] += 1
+                    self._outcomes.inc(severity=lowest.severity["name"], outcome="shed")
+                    lowest.future.set_exception(QueueFullError("shed for a higher-priority alert"))
+                    lowest.future.exception()  # Mark retrieved: nobody may be awaiting it
+                elif not block:
+                    raise QueueFullError(f"triage queue full ({self.max_queue})")
+                else:
+                    await self._cond.wait_for(lambda: self._live < self.max_queue)
+            self._push(item)
+            self.counts["submitted"] += 1
+            self._cond.notify_all()
+        return item
+
+    # --- Dispatch ---
+    async def _dispatch(self) -> None:
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._live > 0 and self.in_flight < self.limit)
+                item = self._pop()
+                self.in_flight += 1
+                self._cond.notify_all()  # Space freed for blocked producers
+            task = asyncio.create_task(self._run(item))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, item: ScheduledAlert) -> None:
+        severity = item.severity["name"]
+        item.started_at = time.monotonic()
+        waited = item.started_at - item.enqueued_at
+        self._waits[severity].append(waited)
+        self._wait_hist.observe(waited, severity=severity)
+        outcome = "ok"
+        try:
+            result = await self.run_fn(item)
+            if not item.future.done():
+                item.future.set_result(result)
+        except Exception as e:
+            outcome = "error"
+            if not item.future.done():
+                item.future.set_exception(e)
+                item.future.exception()
+        finally:
+            finished = time.monotonic()
+            run_seconds = finished - item.started_at
+            self._run_hist.observe(run_seconds, severity=severity)
+            self._outcomes.inc(severity=severity, outcome=outcome)
+            self.counts["completed" if outcome == "ok" else "failed"] += 1
+            if finished > item.deadline:
+                self.counts["deadline_missed"] += 1
+                self._misses.inc(severity=severity)
+            async with self._cond:
+                self.in_flight -= 1
+                self._adapt(run_seconds)
+                self._cond.notify_all()
+
+    def _adapt(self, run_seconds: float) -> None:
+        """Shrinks concurrency while runs are slow (backend saturated), grows it back when fast."""
+        alpha = float(self.config.get("ewma_alpha", 0.3))
+        self.run_ewma = run_seconds if self.run_ewma is None else alpha * run_seconds + (1 - alpha) * self.run_ewma
+        saturation = float(self.config["saturation_seconds"])
+        if self.run_ewma > saturation and self.limit > self.min_concurrent:
+            self.limit -= 1
+            sys.stderr.write(f"[SCHEDULER] Backend saturated (run EWMA {self.run_ewma:.1f}s): concurrency -> {self.limit}\n")
+        elif self.run_ewma < saturation / 2 and self.limit < self.max_concurrent:
+            self.limit += 1
+
+    # --- Reporting ---
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": dict(self._depth_counts),
+            "in_flight": self.in_flight,
+            "concurrency_limit": self.limit,
+            "run_ewma_seconds": round(self.run_ewma, 3) if self.run_ewma is not None else None,
+            "time_in_queue_seconds": {name: distribution(waits) for name, waits in self._waits.items()},
+            **self.counts,
+        }
+
+# ==========================================
+# Agent Integration
+# ==========================================
+def agent_runner(agent, mitre_session, wazuh_session=None, recursion_limit: int = 15, tracer=None):
+    """
+    `run_fn` for TriageScheduler: triages the scheduled alert itself (no Wazuh fetch) with
+    the severity's model preference. Returns the final graph state.
+    """
+    from agent import run_config
+    from prompts import triage_messages
+
+    async def run(item: ScheduledAlert):
+        config = run_config(wazuh_session, mitre_session, recursion_limit,
+                            alert=item.alert, model_preference=item.model_preference)
+        state = {"messages": triage_messages()}
+        if tracer is None:
+            return await agent.ainvoke(state, config)
+        with tracer.span("triage.run", severity=item.severity["name"], score=item.score):
+            return await agent.ainvoke(state, config)
+    return run
+
+async def schedule_file(alerts_file: str, limit: int, model: str) -> Dict[str, Any]:
+    """Triages the first `limit` alerts of a JSONL file through the scheduler and returns stats."""
+    from mcp import StdioServerParameters
+    from agent import get_react_agent
+    from mcp_transport import connect_mcp
+    from tracing import Tracer
+
+    alerts = []
+    with open(alerts_file, "r", encoding="utf-8") as f:
+        for line in itertools.islice(f, limit):
+            if line.strip():
+                alerts.append(json.loads(line))
+
+    mitre_params = StdioServerParameters(command=sys.executable, args=["mitre_server.py"], env=dict(os.environ))
+    async with AsyncExitStack() as stack:
+        mitre_session = await connect_mcp(stack, "mitre", mitre_params)
+        scheduler = TriageScheduler(agent_runner(get_react_agent(model), mitre_session, tracer=Tracer("triage-scheduler")))
+        scheduler.start()
+        items = [await scheduler.submit(alert) for alert in alerts]
+        await scheduler.drain()
+        await scheduler.close()
+        for item in items:
+            status = "shed" if isinstance(item.future.exception(), QueueFullError) else ("error" if item.future.exception() else "ok")
+            waited = (item.started_at - item.enqueued_at) if item.started_at else None
+            print(f"  [{item.severity['name']:<8}] score {item.score:>3} waited {waited if waited is None else round(waited, 2)}s -> {status}")
+        return scheduler.stats()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Triage a JSONL file of alerts through the priority scheduler.")
+    parser.add_argument("alerts_file")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--model", default="llama3.1:latest")
+    args = parser.parse_args()
+
+    stats = asyncio.run(schedule_file(args.alerts_file, args.limit, args.model))
+    print(json.dumps(stats, indent=4))
@@ -0,0 +1,179 @@
+# triage_store.py
+"""
+SQLite store shared by the headless triage daemon (writer) and the Streamlit app (reader).
+
+One row per alert, keyed by its content fingerprint (see context_cache.alert_fingerprint),
+so an alert polled twice is only triaged once. A row moves through
+queued -> running -> done | error | shed and keeps the final report, the tool-call trace,
+the routing decisions and the timings. A small key/value table holds daemon state: the
+alert stream cursor (so a restart resumes where it stopped) and a heartbeat with the
+scheduler stats.
+
+The database runs in WAL mode, so the viewer can read while the daemon writes.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from alert_model import Alert, loads, dumps
+from context_cache import alert_fingerprint
+
+TRIAGE_DB_FILE = os.getenv("TRIAGE_DB_FILE", "triage.db")
+
+STATUSES = ("queued", "running", "done", "error", "shed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    fingerprint   TEXT PRIMARY KEY,
+    alert         TEXT NOT NULL,
+    description   TEXT,
+    mitre_ids     TEXT,
+    rule_level    INTEGER,
+    agent_name    TEXT,
+    score         INTEGER,
+    severity      TEXT,
+    status        TEXT NOT NULL,
+    model         TEXT,
+    report        TEXT,
+    steps         TEXT,
+    routing       TEXT,
+    error         TEXT,
+    received_at   REAL NOT NULL,
+    started_at    REAL,
+    finished_at   REAL
+);
+CREATE INDEX IF NOT EXISTS alerts_status ON alerts (status);
+CREATE INDEX IF NOT EXISTS alerts_received ON alerts (received_at);
+CREATE TABLE IF NOT EXISTS state (
+    key        TEXT PRIMARY KEY,
+    value      TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+class TriageStore:
+    """
+    Thread-safe wrapper around one SQLite connection. `read_only=True` opens the file with
+    mode=ro (the app never writes, and does not create the database if the daemon has not
+    run yet: the constructor raises sqlite3.OperationalError instead).
+    """
+
+    def __init__(self, path: str = TRIAGE_DB_FILE, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        if read_only:
+            uri = f"file:{os.path.abspath(path)}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params)
+
+    def _read(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # --- Writer side (daemon) ---
+    def add_alert(self, alert: Dict[str, Any], score: int, severity: str) -> Optional[str]:
+        """Records a newly polled alert as queued. Returns its fingerprint, or None if already known."""
+        fingerprint = alert_fingerprint(alert)
+        parsed = Alert.from_dict(alert)
+        cursor = self._write(
+            "INSERT OR IGNORE INTO alerts (fingerprint, alert, description, mitre_ids, rule_level, agent_name,"
+            " score, severity, status, received_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?)",
+            (fingerprint, dumps(alert), parsed.description, dumps(parsed.mitre_ids), parsed.level,
+             parsed.agent_name, score, severity, time.time()),
+        )
+        return fingerprint if cursor.rowcount else None
+
+    def mark_running(self, fingerprint: str, model: Optional[str]) -> None:
+        self._write("UPDATE alerts SET status = 'running', model = ?, started_at = ? WHERE fingerprint = ?",
+                    (model, time.time(), fingerprint))
+
+    def record_result(self, fingerprint: str, report: str, steps: List[str], routing: List[Dict[str, Any]]) -> None:
+        self._write("UPDATE alerts SET status = 'done', report = ?, steps = ?, routing = ?, error = NULL,"
+                    " finished_at = ? WHERE fingerprint = ?",
+                    (report, json.dumps(steps, ensure_ascii=False), json.dumps(routing), time.time(), fingerprint))
+
+    def record_failure(self, fingerprint: str, error: str, status: str = "error") -> None:
+        self._write("UPDATE alerts SET status = ?, error = ?, finished_at = ? WHERE fingerprint = ?",
+                    (status, error, time.time(), fingerprint))
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Alerts left queued or running by a previous daemon process (to be resubmitted)."""
+        rows = self._read("SELECT fingerprint, alert FROM alerts WHERE status IN ('queued', 'running') ORDER BY received_at")
+        return [{"fingerprint": r["fingerprint"], "alert": loads(r["alert"])} for r in rows]
+
+    def set_state(self, key: str, value: Any) -> None:
+        self._write("INSERT INTO state (key, value, updated_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                    (key, json.dumps(value), time.time()))
+
+    # --- Reader side (daemon and viewer) ---
+    def get_state(self, key: str, default: Any = None) -> Any:
+        rows = self._read("SELECT value FROM state WHERE key = ?", (key,))
+        return json.loads(rows[0]["value"]) if rows else default
+
+    def state_age(self, key: str) -> Optional[float]:
+        """Seconds since `key` was last written (e.g. the daemon heartbeat), None if never."""
+        rows = self._read("SELECT updated_at FROM state WHERE key = ?", (key,))
+        return time.time() - rows[0]["updated_at"] if rows else None
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._read("SELECT status, COUNT(*) AS n FROM alerts GROUP BY status")
+        counts = {status: 0 for status in STATUSES}
+        counts.update({r["status"]: r["n"] for r in rows})
+        return counts
+
+    def recent(self, limit: int = 100, status: Optional[str] = None, severity: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Newest alerts first, without the heavy columns (alert body, report, steps)."""
+        sql = ("SELECT fingerprint, description, mitre_ids, rule_level, agent_name, score, severity, status,"
+               " model, received_at, started_at, finished_at FROM alerts")
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if severity:
+            clauses.append("severity = ?")
+            params.append(severity)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY received_at DESC LIMIT ?"
+        params.append(limit)
+        results = []
+        for r in self._read(sql, params):
+            row = dict(r)
+            row["mitre_ids"] = json.loads(row["mitre_ids"] or "[]")
+            results.append(row)
+        return results
+
+    def reports_since(self, finished_after: float) -> List[Dict[str, Any]]:
+        """Finished reports with finished_at >= `finished_after`, oldest first (vector_index.py)."""
+        rows = self._read("SELECT fingerprint, description, mitre_ids, report, finished_at FROM alerts"
+                          " WHERE status = 'done' AND finished_at >= ? ORDER BY finished_at", (finished_after,))
+        return [{**dict(r), "mitre_ids": json.loads(r["mitre_ids"] or "[]")} for r in rows]
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        rows = self._read("SELECT * FROM alerts WHERE fingerprint = ?", (fingerprint,))
+        if not rows:
+            return None
+        row = dict(rows[0])
+        row["alert"] = loads(row["alert"])
+        for key in ("mitre_ids", "steps", "routing"):
+            row[key] = json.loads(row[key]) if row[key] else []
+        return row
@@ -0,0 +1,425 @@
+# vector_index.py
+"""
+Local embedding index over playbooks, MITRE technique descriptions and past triage reports.
+
+Used by mitre_server.py's `find_similar_entries` tool to match alerts that carry no (valid)
+MITRE ID: the alert's rule.description / full_log is embedded and compared against every
+entry with one matrix-vector product (rows are L2-normalised, so the dot product is the
+cosine similarity).
+
+Embeddings:
+- "hashing" (default): signed feature hashing of words and word bigrams into a fixed
+  number of dimensions. Deterministic, offline, no model to load.
+- "ollama:<model>" (VECTOR_EMBEDDER=ollama:nomic-embed-text): dense embeddings from Ollama.
+
+Storage: two segments under INDEX_DIR, each a generation directory (<name>-<id>/) holding a
+raw float32 matrix (vectors.f32, opened with np.memmap) plus one JSON line of metadata per
+row (meta.jsonl); manifest.json names the current generations:
+- "knowledge": playbooks + techniques, rebuilt only when their signature (playbooks content
+  hash, ATT&CK snapshot digest) changes. A rebuild is written to a temporary directory and
+  renamed into place, so files other processes have mapped are never modified,
+- "reports": append-only; `sync_reports` adds reports finished since the last sync.
+Every mitre_server.py process shares the directory: updates hold an exclusive file lock
+(.lock) and re-read the manifest first. Switching the embedder discards both segments.
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import zlib
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(".cache", "vector_index"))
+DEFAULT_EMBEDDER = os.getenv("VECTOR_EMBEDDER", "hashing")
+HASHING_DIM = 1024
+SNIPPET_CHARS = 300
+MAX_TEXT_CHARS = 4000
+
+SEGMENTS = ("knowledge", "reports")
+MANIFEST_VERSION = 2
+VECTORS_FILE = "vectors.f32"
+META_FILE = "meta.jsonl"
+# Entries this module creates in INDEX_DIR (anything else there is left alone)
+_GENERATED_PREFIXES = ("knowledge-", "reports-", ".build-")
+_LEGACY_FILES = {"knowledge.f32", "knowledge.jsonl", "reports.f32", "reports.jsonl"}
+
+# ==========================================
+# Embedders
+# ==========================================
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9_.\-]*[a-z0-9]|[a-z0-9]")
+
+def tokenize(text: str) -> List[str]:
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+class HashingEmbedder:
+    """Signed feature hashing (crc32) with log-scaled term counts."""
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for token in tokenize(text[:MAX_TEXT_CHARS]):
+                h = zlib.crc32(token.encode("utf-8"))
+                rows.append(row)
+                cols.append(h % self.dim)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+        flat = np.asarray(rows, dtype=np.int64) * self.dim + np.asarray(cols, dtype=np.int64)
+        counts = np.bincount(flat, weights=np.asarray(signs), minlength=len(texts) * self.dim)
+        matrix = counts.reshape(len(texts), self.dim).astype(np.float32)
+        np.copyto(matrix, np.sign(matrix) * np.log1p(np.abs(matrix)))
+        return _normalize(matrix)
+
+class OllamaEmbedder:
+    """Dense embeddings from an Ollama embedding model (dimension discovered on first call)."""
+
+    def __init__(self, model: str, host: Optional[str] = None):
+        import ollama
+        self.model = model
+        self.name = f"ollama:{model}"
+        self.client = ollama.Client(host=host or os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+        self.dim: Optional[int] = None
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        response = self.client.embed(model=self.model, input=[t[:MAX_TEXT_CHARS] for t in texts])
+        matrix = np.asarray(response["embeddings"], dtype=np.float32)
+        self.dim = matrix.shape[1]
+        return _normalize(matrix)
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def make_embedder(spec: str = DEFAULT_EMBEDDER):
+    if spec.startswith("ollama:"):
+        return OllamaEmbedder(spec.split(":", 1)[1])
+    return HashingEmbedder()
+
+# ==========================================
+# Segments
+# ==========================================
+class _FileLock:
+    """Exclusive lock shared by every process using the index directory (flock / msvcrt)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a+b")
+        if os.name == "nt":
+            import msvcrt
+            self._file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10 s: keep waiting
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+def _write_rows(directory: str, vectors: np.ndarray, meta: List[Dict[str, Any]]) -> None:
+    with open(os.path.join(directory, VECTORS_FILE), "ab") as f:
+        f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+    with open(os.path.join(directory, META_FILE), "ab") as f:
+        f.write("".join(json.dumps(m, ensure_ascii=False) + "\n" for m in meta).encode("utf-8"))
+
+class _Segment:
+    """
+    One generation directory: float32 matrix (memory-mapped for search) + metadata rows.
+    Writers hold the index's file lock; readers only see the rows they loaded.
+    """
+
+    def __init__(self, mmap: bool = True):
+        self.path: Optional[str] = None
+        self.mmap = mmap
+        self.dim: Optional[int] = None
+        self.matrix: Optional[np.ndarray] = None
+        self.meta: List[Dict[str, Any]] = []
+        self.kinds = np.empty(0, dtype=object)
+        self._meta_bytes = 0
+
+    def open(self, path: Optional[str], dim: Optional[int]) -> None:
+        self.matrix = None  # Release the previous generation's memmap
+        self.path, self.dim = path, dim
+        self.meta, self._meta_bytes = [], 0
+        if path and dim:
+            lines = []
+            try:
+                with open(os.path.join(path, META_FILE), "rb") as f:
+                    lines = [line for line in f if line.endswith(b"\n")]
+            except OSError:
+                pass
+            vectors_path = os.path.join(path, VECTORS_FILE)
+            rows = os.path.getsize(vectors_path) // (4 * dim) if os.path.exists(vectors_path) else 0
+            # A crash between the two appends leaves one side longer: keep the common prefix
+            lines = lines[:min(rows, len(lines))]
+            self.meta = [json.loads(line) for line in lines]
+            self._meta_bytes = sum(len(line) for line in lines)
+        self.kinds = np.array([m["kind"] for m in self.meta], dtype=object)
+        self._map()
+
+    def _map(self) -> None:
+        count = len(self.meta)
+        if count == 0:
+            self.matrix = np.empty((0, self.dim or 0), dtype=np.float32)
+        elif self.mmap:
+            self.matrix = np.memmap(os.path.join(self.path, VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, self.dim))
+        else:
+            self.matrix = np.fromfile(os.path.join(self.path, VECTORS_FILE), dtype=np.float32, count=count * self.dim).reshape(count, self.dim)
+
+    def stale(self) -> bool:
+        """True if another process appended rows since this segment was loaded."""
+        if not self.path:
+            return False
+        try:
+            return os.path.getsize(os.path.join(self.path, META_FILE)) != self._meta_bytes
+        except OSError:
+            return False
+
+    def append(self, vectors: np.ndarray, meta: List[Dict[str, Any]]) -> None:
+        # Drop a torn tail first so the new rows line up with their metadata
+        for name, size in ((VECTORS_FILE, len(self.meta) * vectors.shape[1] * 4), (META_FILE, self._meta_bytes)):
+            path = os.path.join(self.path, name)
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                self.matrix = None
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        _write_rows(self.path, vectors, meta)
+        self.dim = vectors.shape[1]
+        self.meta.extend(meta)
+        self._meta_bytes += sum(len((json.dumps(m, ensure_ascii=False) + "\n").encode("utf-8")) for m in meta)
+        self.kinds = np.concatenate([self.kinds, np.array([m["kind"] for m in meta], dtype=object)])
+        self._map()
+
+    def __len__(self) -> int:
+        return len(self.meta)
+
+# ==========================================
+# Index
+# ==========================================
+def _entry(kind: str, ref: str, title: str, text: str) -> Dict[str, Any]:
+    snippet = " ".join(text.split())[:SNIPPET_CHARS]
+    return {"kind": kind, "ref": ref, "title": title, "snippet": snippet}
+
+class VectorIndex:
+    """Top-k cosine similarity search over the knowledge and reports segments."""
+
+    def __init__(self, directory: str = INDEX_DIR, embedder=None, mmap: bool = True):
+        self.directory = directory
+        self.embedder = embedder or make_embedder()
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        os.makedirs(directory, exist_ok=True)
+        self.segments = {name: _Segment(mmap) for name in SEGMENTS}
+        self.manifest: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._file_lock = _FileLock(os.path.join(directory, ".lock"))
+        with self._lock, self._file_lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        """Re-reads the manifest (any process may have written it) and reopens changed segments. Holds both locks."""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        if not manifest or manifest.get("version") != MANIFEST_VERSION or manifest.get("embedder") != self.embedder.name:
+            if manifest and manifest.get("embedder") != self.embedder.name:
+                sys.stderr.write(f"[VECTOR INDEX] Embedder changed ({manifest.get('embedder')} -> {self.embedder.name}): rebuilding.\n")
+            manifest = {"version": MANIFEST_VERSION, "embedder": self.embedder.name, "dim": None,
+                        "knowledge": None, "reports": None, "knowledge_signature": None, "reports_watermark": 0.0}
+            self.manifest = manifest
+            self._save_manifest()
+        self.manifest = manifest
+        for name, segment in self.segments.items():
+            path = os.path.join(self.directory, manifest[name]) if manifest.get(name) else None
+            if path != segment.path:
+                segment.open(path, manifest.get("dim"))
+                self._cleanup()
+            elif segment.stale():
+                segment.open(path, manifest.get("dim"))
+
+    def _save_manifest(self) -> None:
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self.manifest_path)
+
+    def _cleanup(self) -> None:
+        """Removes superseded generations, interrupted builds and the pre-generation layout."""
+        current = {self.manifest.get(name) for name in SEGMENTS}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name in current or not (name.startswith(_GENERATED_PREFIXES) or name in _LEGACY_FILES):
+                continue
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError:
+                pass  # Still mapped by another process (Windows): a later cleanup removes it
+
+    def _new_generation(self, segment: str, build) -> None:
+        """Writes a generation into a temporary directory, renames it into place, then publishes it."""
+        tmp = tempfile.mkdtemp(prefix=".build-", dir=self.directory)
+        try:
+            build(tmp)
+            generation = f"{segment}-{uuid.uuid4().hex[:12]}"
+            os.rename(tmp, os.path.join(self.directory, generation))
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.manifest[segment] = generation
+        self.segments[segment].open(os.path.join(self.directory, generation), self.manifest["dim"])
+
+    def _embed(self, texts: List[str], batch_size: int = 256) -> np.ndarray:
+        batches = [self.embedder.embed(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        if not batches:
+            return np.empty((0, self.manifest.get("dim") or 0), dtype=np.float32)
+        vectors = np.vstack(batches)
+        if not self.manifest["dim"]:
+            self.manifest["dim"] = int(vectors.shape[1])
+        return vectors
+
+    # --- Updates ---
+    def sync_knowledge(self, playbooks: Dict[str, str], techniques: Dict[str, Dict[str, Any]], signature: str) -> bool:
+        """
+        Rebuilds the knowledge segment if `signature` ("<playbooks hash>[:<ATT&CK digest>]")
+        changed. A signature without a digest (download failed) also matches an index built
+        from the same playbooks plus a snapshot, so such a process does not downgrade it.
+        Returns True if it was rebuilt.
+        """
+        with self._lock, self._file_lock:
+            self._refresh()
+            current = self.manifest.get("knowledge_signature") or ""
+            if self.manifest.get("knowledge") and (current == signature or current.startswith(signature + ":")):
+                return False
+            entries, texts = [], []
+            for technique_id, playbook in playbooks.items():
+                entries.append(_entry("playbook", technique_id, f"Playbook {technique_id}", playbook))
+                texts.append(playbook)
+            for technique_id, technique in techniques.items():
+                text = f"{technique['name']}. {technique['description']}"
+                entries.append(_entry("technique", technique_id, technique["name"], text))
+                texts.append(f"{technique_id} {text} {' '.join(technique.get('tactics', []))}")
+            vectors = self._embed(texts)
+            self._new_generation("knowledge", lambda path: _write_rows(path, vectors, entries))
+            self.manifest["knowledge_signature"] = signature
+            self._save_manifest()
+            self._cleanup()
+            return True
+
+    def add_reports(self, reports: Iterable[Dict[str, Any]]) -> int:
+        """
+        Appends triage reports ({fingerprint, description, mitre_ids, report, finished_at});
+        fingerprints already indexed are skipped. Returns the number added.
+        """
+        with self._lock, self._file_lock:
+            self._refresh()
+            known = {m["ref"] for m in self.segments["reports"].meta}
+            entries, texts = [], []
+            watermark = self.manifest.get("reports_watermark", 0.0)
+            for r in reports:
+                watermark = max(watermark, r["finished_at"])
+                if r["fingerprint"] in known or not r.get("report"):
+                    continue
+                known.add(r["fingerprint"])
+                title = f"{r['description']} ({', '.join(r['mitre_ids']) or 'no MITRE ID'})"
+                entry = _entry("report", r["fingerprint"], title, r["report"])
+                entry["mitre_ids"] = r["mitre_ids"]
+                entries.append(entry)
+                texts.append(f"{r['description']} {r['report']}")
+            if entries:
+                vectors = self._embed(texts)
+                if not self.manifest.get("reports"):
+                    self._new_generation("reports", lambda path: None)
+                self.segments["reports"].append(vectors, entries)
+            self.manifest["reports_watermark"] = watermark
+            self._save_manifest()
+            return len(entries)
+
+    def sync_reports(self, store) -> int:
+        """Indexes reports the triage store finished since the last sync (see triage_store.py)."""
+        return self.add_reports(store.reports_since(self.manifest.get("reports_watermark", 0.0)))
+
+    # --- Search ---
+    def search_batch(self, queries: Sequence[str], k: int = 5, kinds: Optional[Sequence[str]] = None) -> List[List[Dict[str, Any]]]:
+        """Top-k entries for each query, best first, each with its cosine `score`."""
+        if k < 1 or not self.manifest.get("dim"):
+            return [[] for _ in queries]
+        q = self.embedder.embed(list(queries))
+        scores, metas = [], []
+        with self._lock:
+            for segment in self.segments.values():
+                if not len(segment):
+                    continue
+                s = q @ np.asarray(segment.matrix).T
+                if kinds:
+                    s[:, ~np.isin(segment.kinds, list(kinds))] = -np.inf
+                scores.append(s)
+                metas.extend(segment.meta)
+        if not scores:
+            return [[] for _ in queries]
+        scores = np.hstack(scores)
+        k = min(k, scores.shape[1])
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([{**metas[i], "score": round(float(row[i]), 4)} for i in top if np.isfinite(row[i])])
+        return results
+
+    def search(self, query: str, k: int = 5, kinds: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        return self.search_batch([query], k, kinds)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "embedder": self.embedder.name,
+            "dim": self.manifest.get("dim"),
+            **{name: len(segment) for name, segment in self.segments.items()},
+        }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the local vector index (built by mitre_server.py).")
+    parser.add_argument("query")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--kinds", default="", help="Comma-separated: playbook,technique,report")
+    args = parser.parse_args()
+
+    index = VectorIndex()
+    started = time.perf_counter()
+    hits = index.search(args.query, args.k, [k for k in args.kinds.split(",") if k] or None)
+    print(f"[*] {index.stats()} — {(time.perf_counter() - started) * 1000:.1f} ms")
+    for hit in hits:
+        print(f"  {hit['score']:.3f}  [{hit['kind']}] {hit['ref']}: {hit['title']}")
@@ -2,17 +2,73 @@
 import sys
 import os
 import json
+import time
 import requests
 from mcp.server.fastmcp import FastMCP
 import urllib3
 
+from tracing import Tracer, traced_tool
+from metrics import MetricsRegistry, metered_tool, start_metrics_server
+from mcp_transport import run_server
+from alert_model import loads, dumps
+from resilience import UpstreamUnavailable, bind_metrics, get_upstream, is_transient
+
 # Disable SSL warnings for lab environment
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Initialize the server
 mcp = FastMCP("Wazuh-Local-Mock")
 
+# Spans for tool calls join the client's trace via the request _meta (see tracing.py)
+tracer = Tracer("wazuh-server")
+
+# Tool latency and Wazuh API timings (get_metrics tool, or HTTP if WAZUH_METRICS_PORT is set)
+metrics = MetricsRegistry("wazuh-server")
+
+# Wazuh API calls go through one rate limiter / retry policy / circuit breaker (see resilience.py)
+wazuh_api = get_upstream("wazuh")
+bind_metrics(metrics)
+
+# Last good API answer per tool and arguments: served, marked stale, while the API is unreachable
+_last_good = {}
+
+def _wazuh_request(method: str, url: str, operation: str, **kwargs) -> requests.Response:
+    """One Wazuh API request; transient failures are retried with backoff, each attempt is timed."""
+    def attempt():
+        with metrics.time_upstream("wazuh", operation):
+            response = requests.request(method, url, verify=False, timeout=wazuh_api.timeout, **kwargs)
+            response.raise_for_status()
+            return response
+    return wazuh_api.call(attempt)
+
+def _remember(key: str, data) -> None:
+    _last_good[key] = (time.time(), data)
+
+def _stale(key: str, error: Exception):
+    """
+    The last good answer for `key` marked as stale, or None if there is none. Only outages
+    (connection errors, timeouts, 5xx) fall back: auth and client errors (4xx) are surfaced.
+    """
+    if not (isinstance(error, UpstreamUnavailable) or is_transient(error)):
+        return None
+    entry = _last_good.get(key)
+    metrics.record_lookup("wazuh_last_good", entry is not None)
+    if entry is None:
+        return None
+    cached_at, data = entry
+    sys.stderr.write(f"[SERVER LOG] Wazuh API unavailable ({error}); serving the answer from {time.time() - cached_at:.0f}s ago\n")
+    return json.dumps({**data, "stale": True, "cached_at": cached_at, "stale_reason": str(error)})
+
+# Mock alert source. Overridable so several server instances (e.g. parallel evaluation
+# workers) can each serve their own injected scenario.
+ALERT_FILE = os.getenv("WAZUH_ALERT_FILE", "alert.json")
+
+# Append-only JSONL spool filled by replay_alerts.py (sustained-load testing)
+ALERT_STREAM_FILE = os.getenv("ALERT_STREAM_FILE", "alert_stream.jsonl")
+
 @mcp.tool()
+@metered_tool(metrics)
+@traced_tool(tracer)
 def get_latest_alerts() -> str:
     """
     Retrieves the latest high-severity alerts from the SIEM.
@@ -20,14 +76,56 @@ def get_latest_alerts() -> str:
     """
     sys.stderr.write("\n[SERVER LOG] MCP Client just called get_latest_alerts!\n") # Debug log to stderr
     try:
-        with open('alert.json', 'r') as f:
-            data = json.load(f)
-            # Return as a stringified JSON list to be safe for MCP transport
-            return json.dumps([data]) 
+        with tracer.span("alerts.read_mock", file=ALERT_FILE), open(ALERT_FILE, 'rb') as f:
+            data = loads(f.read())
+            # Return as a stringified JSON list to be safe for MCP transport (compact, see alert_model.py)
+            return dumps([data])
     except FileNotFoundError:
         return "[]"
 
 @mcp.tool()
+@metered_tool(metrics)
+@traced_tool(tracer)
+def get_alert_stream(cursor: int = 0, limit: int = 100) -> str:
+    """
+    Reads new alerts from the alert stream spool, oldest first.
+    Pass the returned next_cursor back in to continue where the last call stopped.
+    
+    Args:
+        cursor: Byte offset returned by the previous call (0 to start from the beginning)
+        limit: Maximum number of alerts to return (default: 100)
+    
+    Returns:
+        JSON string {"alerts": [...], "next_cursor": int, "eof": bool}
+    """
+    with tracer.span("alerts.read_stream", cursor=cursor, limit=limit) as span:
+        try:
+            size = os.path.getsize(ALERT_STREAM_FILE)
+        except OSError:
+            return dumps({"alerts": [], "next_cursor": 0, "eof": True})
+        if cursor > size:
+            cursor = 0  # Spool was truncated or replaced: start over
+        
+        alerts = []
+        with open(ALERT_STREAM_FILE, "rb") as f:
+            f.seek(cursor)
+            while len(alerts) < limit:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # EOF, or a line the replayer has not finished writing
+                cursor += len(line)
+                if line.strip():
+                    try:
+                        alerts.append(loads(line))
+                    except ValueError:
+                        continue
+        if span is not None:
+            span.set(returned=len(alerts))
+        return dumps({"alerts": alerts, "next_cursor": cursor, "eof": cursor >= size})
+
+@mcp.tool()
+@metered_tool(metrics)
+@traced_tool(tracer)
 def get_real_wazuh_alerts(limit: int = 10) -> str:
     """
     Fetches real security alerts from the Wazuh Manager API.
@@ -46,20 +144,22 @@ def get_real_wazuh_alerts(limit: int = 10) -> str:
     wazuh_port = os.getenv("WAZUH_API_PORT", "55000")
     wazuh_user = os.getenv("WAZUH_API_USER", "wazuh-wui")
     wazuh_pass = os.getenv("WAZUH_API_PASSWORD", "MyS3cr37P450r.*-")
+    # "http" for the local mock API used by load_test.py
+    wazuh_scheme = os.getenv("WAZUH_API_SCHEME", "https")
     
-    base_url = f"https://{wazuh_host}:{wazuh_port}"
+    base_url = f"{wazuh_scheme}://{wazuh_host}:{wazuh_port}"
     
     try:
         # Step 1: Authenticate and get JWT token
         sys.stderr.write(f"[SERVER LOG] Authenticating to {base_url}...\n")
-        auth_response = requests.post(
-            f"{base_url}/security/user/authenticate",
-            auth=(wazuh_user, wazuh_pass),
-            verify=False,
-            timeout=10
-        )
-        auth_response.raise_for_status()
-        token = auth_response.json()['data']['token']
+        with tracer.span("wazuh.authenticate", url=base_url):
+            auth_response = _wazuh_request(
+                "POST",
+                f"{base_url}/security/user/authenticate",
+                "authenticate",
+                auth=(wazuh_user, wazuh_pass)
+            )
+            token = auth_response.json()['data']['token']
         
         # Step 2: Fetch alerts
         sys.stderr.write("[SERVER LOG] Fetching alerts...\n")
@@ -68,25 +168,29 @@ def get_real_wazuh_alerts(limit: int = 10) -> str:
             "Content-Type": "application/json"
         }
         
-        alerts_response = requests.get(
-            f"{base_url}/alerts",
-            headers=headers,
-            params={
-                "limit": limit,
-                "sort": "-timestamp",
-                "select": "rule.id,rule.description,rule.level,rule.mitre,agent.name,timestamp,data"
-            },
-            verify=False,
-            timeout=10
-        )
-        alerts_response.raise_for_status()
+        with tracer.span("wazuh.fetch_alerts", limit=limit):
+            alerts_response = _wazuh_request(
+                "GET",
+                f"{base_url}/alerts",
+                "alerts",
+                headers=headers,
+                params={
+                    "limit": limit,
+                    "sort": "-timestamp",
+                    "select": "rule.id,rule.description,rule.level,rule.mitre,agent.name,timestamp,data"
+                }
+            )
         
         alerts_data = alerts_response.json()
         sys.stderr.write(f"[SERVER LOG] Successfully fetched {len(alerts_data.get('data', {}).get('affected_items', []))} alerts\n")
+        _remember(f"alerts:{limit}", alerts_data)
         
         return json.dumps(alerts_data)
         
-    except requests.exceptions.RequestException as e:
+    except (UpstreamUnavailable, requests.exceptions.RequestException) as e:
+        stale = _stale(f"alerts:{limit}", e)
+        if stale is not None:
+            return stale
         error_msg = f"Failed to connect to Wazuh API: {str(e)}"
         sys.stderr.write(f"[SERVER ERROR] {error_msg}\n")
         return json.dumps({
@@ -99,6 +203,8 @@ def get_real_wazuh_alerts(limit: int = 10) -> str:
         return json.dumps({"error": error_msg})
 
 @mcp.tool()
+@metered_tool(metrics)
+@traced_tool(tracer)
 def get_wazuh_agents() -> str:
     """
     Lists all registered Wazuh agents and their status.
@@ -113,40 +219,62 @@ def get_wazuh_agents() -> str:
     wazuh_port = os.getenv("WAZUH_API_PORT", "55000")
     wazuh_user = os.getenv("WAZUH_API_USER", "wazuh-wui")
     wazuh_pass = os.getenv("WAZUH_API_PASSWORD", "MyS3cr37P450r.*-")
+    # "http" for the local mock API used by load_test.py
+    wazuh_scheme = os.getenv("WAZUH_API_SCHEME", "https")
     
-    base_url = f"https://{wazuh_host}:{wazuh_port}"
+    base_url = f"{wazuh_scheme}://{wazuh_host}:{wazuh_port}"
     
     try:
         # Authenticate
-        auth_response = requests.post(
-            f"{base_url}/security/user/authenticate",
-            auth=(wazuh_user, wazuh_pass),
-            verify=False,
-            timeout=10
-        )
-        auth_response.raise_for_status()
-        token = auth_response.json()['data']['token']
+        with tracer.span("wazuh.authenticate", url=base_url):
+            auth_response = _wazuh_request(
+                "POST",
+                f"{base_url}/security/user/authenticate",
+                "authenticate",
+                auth=(wazuh_user, wazuh_pass)
+            )
+            token = auth_response.json()['data']['token']
         
         # Get agents
         headers = {"Authorization": f"Bearer {token}"}
-        agents_response = requests.get(
-            f"{base_url}/agents",
-            headers=headers,
-            params={"select": "id,name,ip,status,os.name,os.version"},
-            verify=False,
-            timeout=10
-        )
-        agents_response.raise_for_status()
+        with tracer.span("wazuh.fetch_agents"):
+            agents_response = _wazuh_request(
+                "GET",
+                f"{base_url}/agents",
+                "agents",
+                headers=headers,
+                params={"select": "id,name,ip,status,os.name,os.version"}
+            )
         
         agents_data = agents_response.json()
         sys.stderr.write(f"[SERVER LOG] Found {agents_data.get('data', {}).get('total_affected_items', 0)} registered agents\n")
+        _remember("agents", agents_data)
         
         return json.dumps(agents_data)
         
+    except (UpstreamUnavailable, requests.exceptions.RequestException) as e:
+        stale = _stale("agents", e)
+        if stale is not None:
+            return stale
+        error_msg = f"Failed to fetch agents: {str(e)}"
+        sys.stderr.write(f"[SERVER ERROR] {error_msg}\n")
+        return json.dumps({"error": error_msg})
     except Exception as e:
         error_msg = f"Failed to fetch agents: {str(e)}"
         sys.stderr.write(f"[SERVER ERROR] {error_msg}\n")
         return json.dumps({"error": error_msg})
 
+@mcp.tool()
+def get_metrics() -> str:
+    """
+    Returns this server's metrics in the Prometheus text format: per-tool call counts,
+    error counts and latency histograms, Wazuh API request timings, retries and the
+    API's circuit breaker state.
+    """
+    return metrics.render()
+
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    if os.getenv("WAZUH_METRICS_PORT"):
+        start_metrics_server(metrics, int(os.getenv("WAZUH_METRICS_PORT")))
+    # stdio by default; --transport streamable-http serves every client from this one process
+    run_server(mcp, "wazuh")
\ No newline at end of file